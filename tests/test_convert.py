@@ -2,12 +2,14 @@
 Unit tests for loading a simple POSCAR
 """
 import os
+import subprocess
+import sys
 
 import pytest
 
 from vestacrystparser.parser import VestaFile
 from vestacrystparser.convert import vesta_from_structure, vesta_from_poscar, \
-    Structure
+    vesta_frames_from_xdatcar, vesta_frames_from_vasprun, Structure
 # TODO: Skip if cannot find pymatgen.
 
 from test_parser import compare_vesta_strings, DATA_DIR
@@ -58,3 +60,191 @@ def test_vesta_from_poscar(poscar_filename, sample_vestafile):
     # TITLE *is* included in POSCAR, so this one should work.
     assert compare_vesta_strings(
         str(converted_file), str(sample_vestafile), prec=6)
+
+
+def test_vesta_from_poscar_vasp4(tmp_path, poscar_filename, sample_vestafile):
+    # Strip the element symbols, so they must come from the POTCAR.
+    with open(poscar_filename) as f:
+        lines = f.readlines()
+    del lines[5]
+    lines[0] = "hBN\n"
+    with open(tmp_path / "POSCAR", "w") as f:
+        f.writelines(lines)
+    with open(tmp_path / "POTCAR", "w") as f:
+        f.write("   TITEL  = PAW_PBE B 06Sep2000\n"
+                "   TITEL  = PAW_PBE N 08Apr2002\n")
+    converted_file = vesta_from_poscar(str(tmp_path / "POSCAR"))
+    for (sec1, sec2) in zip(converted_file, sample_vestafile):
+        if sec1.header != "TITLE":
+            assert compare_vesta_strings(str(sec1), str(sec2), prec=6)
+
+
+def test_vesta_from_poscar_without_numpy(poscar_filename, sample_vestafile):
+    # Run in a fresh interpreter, so numpy isn't already imported.
+    code = f"""
+import sys
+sys.modules["numpy"] = None
+from vestacrystparser.convert import vesta_from_poscar, vesta_from_chgcar
+print(vesta_from_poscar({poscar_filename!r}), end="")
+for name in ["vestacrystparser.volumetric", "vestacrystparser.trajectory",
+             "argparse"]:
+    assert name not in sys.modules, name
+try:
+    vesta_from_chgcar("CHGCAR")
+except ImportError:
+    pass
+else:
+    raise AssertionError("Expected ImportError")
+"""
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True,
+                            cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert compare_vesta_strings(result.stdout, str(sample_vestafile),
+                                 prec=6)
+
+
+XDATCAR = """hBN
+1.0
+2.5 0.0 0.0
+-1.25 2.1650635 0.0
+0.0 0.0 15.0
+B N
+1 1
+Direct configuration=     1
+0.33333 0.66667 0.5
+0.66667 0.33333 0.5
+Direct configuration=     2
+0.34 0.66 0.5
+0.66 0.34 0.5
+Direct configuration=     3
+0.35 0.65 0.5
+0.65 0.35 0.5
+"""
+
+
+def test_vesta_frames_from_xdatcar(tmp_path):
+    fname = tmp_path / "XDATCAR"
+    with open(fname, "w") as f:
+        f.write(XDATCAR)
+    frames = list(vesta_frames_from_xdatcar(
+        str(fname), output=str(tmp_path / "frame_{}.vesta")))
+    assert len(frames) == 3
+    assert [site[3] for site in frames[1].get_structure()] == [0.34, 0.66]
+    assert frames[2]["STRUC"].data[0][4:7] == [0.35, 0.65, 0.5]
+    assert len(frames[0].bonds) == 1
+    # Sections other than STRUC are shared.
+    sections = [frame._phases[0]._sections for frame in frames]
+    assert sections[1]["SBOND"] is sections[2]["SBOND"]
+    assert sections[1]["CELLP"] is sections[2]["CELLP"]
+    assert sections[1]["DLATM"] is sections[2]["DLATM"]
+    assert sections[1]["STRUC"] is not sections[2]["STRUC"]
+    assert VestaFile(str(tmp_path / "frame_3.vesta"))["STRUC"].data[0][4] \
+        == 0.35
+    # Stride, and a template.
+    template = VestaFile(str(tmp_path / "frame_1.vesta"))
+    template.set_site_color(1, 255, 0, 0)
+    frames = list(vesta_frames_from_xdatcar(str(fname), template, stride=2))
+    assert [frame["STRUC"].data[0][4] for frame in frames] == [0.33333, 0.35]
+    assert frames[1]["SITET"].data[0][3:6] == [255, 0, 0]
+    assert template["STRUC"].data[0][4] == 0.33333
+    with pytest.raises(ValueError):
+        next(vesta_frames_from_xdatcar(str(fname), VestaFile()))
+
+
+def test_vesta_frames_from_xdatcar_variable_cell(tmp_path):
+    # Each frame has its own header.
+    frames = XDATCAR.split("Direct configuration=     2\n")
+    text = frames[0] + XDATCAR[:XDATCAR.index("Direct")].replace(
+        "15.0", "16.0") + "Direct configuration=     2\n" + frames[1]
+    fname = tmp_path / "XDATCAR"
+    with open(fname, "w") as f:
+        f.write(text[:text.index("Direct configuration=     3")])
+    frames = list(vesta_frames_from_xdatcar(str(fname)))
+    assert len(frames) == 2
+    assert frames[0].get_cell()[2] == pytest.approx(15)
+    assert frames[1].get_cell()[2] == pytest.approx(16)
+    assert frames[1]["STRUC"].data[0][4] == 0.34
+
+
+def vasprun_text(nsteps=3):
+    """A minimal vasprun.xml for hBN, moving B along x each step."""
+    steps = []
+    for i in range(nsteps):
+        steps.append(f"""
+ <calculation>
+  <scstep><energy><i name="e_fr_energy">-1.0</i></energy></scstep>
+  <structure>
+   <crystal>
+    <varray name="basis">
+     <v> 2.5 0.0 0.0 </v>
+     <v> -1.25 2.1650635 0.0 </v>
+     <v> 0.0 0.0 {15.0 + i} </v>
+    </varray>
+    <i name="volume"> 81.2 </i>
+   </crystal>
+   <varray name="positions">
+    <v> {0.3 + 0.01 * i} 0.66667 0.5 </v>
+    <v> 0.66667 0.33333 0.5 </v>
+   </varray>
+  </structure>
+  <varray name="forces">
+   <v> {0.1 * (i + 1)} 0.0 0.0 </v>
+   <v> 0.0 0.0 0.0 </v>
+  </varray>
+  <eigenvalues><array><set><r> 1.0 1.0 </r><r> 2.0 1.0 </r></set></array>
+  </eigenvalues>
+ </calculation>""")
+    return f"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<modeling>
+ <incar>
+  <i type="string" name="SYSTEM">hBN relax</i>
+ </incar>
+ <atominfo>
+  <atoms>2</atoms>
+  <array name="atoms">
+   <dimension dim="1">ion</dimension>
+   <set>
+    <rc><c>B </c><c>   1</c></rc>
+    <rc><c>N </c><c>   2</c></rc>
+   </set>
+  </array>
+ </atominfo>{"".join(steps)}
+</modeling>
+"""
+
+
+def test_vesta_frames_from_vasprun(tmp_path):
+    fname = tmp_path / "vasprun.xml"
+    with open(fname, "w") as f:
+        f.write(vasprun_text())
+    frames = list(vesta_frames_from_vasprun(str(fname), forces=True,
+                                            force_scale=10))
+    assert len(frames) == 3
+    assert frames[0].title == "hBN relax"
+    assert [frame["STRUC"].data[0][4] for frame in frames] == \
+        pytest.approx([0.3, 0.31, 0.32])
+    assert [frame.get_cell()[2] for frame in frames] == \
+        pytest.approx([15, 16, 17])
+    # Force on B only, along a, with 1 Angstrom per 0.1 eV/Angstrom.
+    assert frames[1].nvectors == 1
+    # (Stored as the length along each lattice vector.)
+    assert frames[1]["VECTR"].data[0][1:4] == pytest.approx([2, 0, 0])
+    assert frames[1]["VECTR"].data[1][0] == 1
+    # Selected steps only, without forces.
+    frames = list(vesta_frames_from_vasprun(str(fname), steps=[2, 0]))
+    assert [frame["STRUC"].data[0][4] for frame in frames] == \
+        pytest.approx([0.3, 0.32])
+    assert frames[0].nvectors == 0
+    frames = list(vesta_frames_from_vasprun(str(fname),
+                                            steps=slice(1, None, 5)))
+    assert len(frames) == 1
+    # Reading stops after the last step asked for, so a truncated file
+    # (from a running calculation) is fine.
+    text = vasprun_text()
+    with open(fname, "w") as f:
+        f.write(text[:text.rindex("<calculation>")])
+    frames = list(vesta_frames_from_vasprun(str(fname), steps=slice(0, 2)))
+    assert len(frames) == 2
+    with pytest.raises(ValueError):
+        next(vesta_frames_from_vasprun(str(fname), steps=[-1]))
@@ -0,0 +1,145 @@
+"""
+Unit tests for batch conversion from the command line
+"""
+import json
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from vestacrystparser import convert
+from vestacrystparser.convert import find_inputs, batch_convert, output_name
+from vestacrystparser.parser import VestaFile
+from vestacrystparser.vasp import is_compressed
+
+from test_parser import DATA_DIR
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A directory of structures, one of which is broken."""
+    db = tmp_path / "db"
+    for name in ["a", "b", "c"]:
+        (db / name).mkdir(parents=True)
+    shutil.copy(os.path.join(DATA_DIR, "POSCAR_hBN.vasp"), db / "a" / "POSCAR")
+    shutil.copy(os.path.join(DATA_DIR, "CHGCAR_PbSe.vasp.gz"),
+                db / "b" / "CHGCAR.gz")
+    (db / "c" / "POSCAR").write_text("Not a POSCAR\n")
+    (db / "c" / "notes.txt").write_text("Not an input\n")
+    return db
+
+
+def test_find_inputs(database, monkeypatch):
+    monkeypatch.chdir(database.parent)
+    expected = [(os.path.join("db", "a", "POSCAR"),
+                 os.path.join("a", "POSCAR")),
+                (os.path.join("db", "b", "CHGCAR.gz"),
+                 os.path.join("b", "CHGCAR.gz")),
+                (os.path.join("db", "c", "POSCAR"),
+                 os.path.join("c", "POSCAR"))]
+    assert find_inputs(["db"]) == expected
+    assert find_inputs([os.path.join("db", "*", "POSCAR")]) == \
+        [expected[0], expected[2]]
+    # Duplicates are dropped.
+    assert find_inputs(["db", os.path.join("db", "a", "POSCAR")]) == expected
+    assert find_inputs(["db"], patterns=["CHGCAR*"]) == [expected[1]]
+    # Files derived from the inputs aren't inputs themselves.
+    for name in ["CHGCAR_preview2.vasp", "CHGCAR_mag.vasp",
+                 "CHGCAR_total.vasp", "CHGCAR_magnetization.vasp",
+                 "CHGCAR.uncompressed", "CHGCAR.gz.vstats.json"]:
+        (database / "b" / name).write_text("")
+    (database / "b" / "CHGCAR_2.vasp").write_text("")
+    assert find_inputs([os.path.join("db", "b")]) == \
+        [(os.path.join("db", "b", "CHGCAR.gz"), "CHGCAR.gz"),
+         (os.path.join("db", "b", "CHGCAR_2.vasp"), "CHGCAR_2.vasp")]
+    (database.parent / "list.txt").write_text(
+        os.path.join("db", "b", "CHGCAR.gz") + "\n\n")
+    assert find_inputs(["@list.txt"]) == \
+        [(os.path.join("db", "b", "CHGCAR.gz"),
+          os.path.join("db", "b", "CHGCAR.gz"))]
+    assert output_name("db/b/CHGCAR.gz", "b/CHGCAR.gz", "out") == \
+        os.path.join("out", "b", "CHGCAR.vesta")
+    assert output_name("POSCAR", "POSCAR") == "POSCAR.vesta"
+
+
+def test_batch_convert(database, tmp_path):
+    out = tmp_path / "out"
+    inputs = find_inputs([str(database)])
+    manifest = batch_convert(inputs, output_dir=str(out), jobs=2)
+    assert manifest["counts"] == {"converted": 2, "skipped": 0, "error": 1}
+    with open(out / "manifest.json") as f:
+        assert json.load(f) == manifest
+    entry = manifest["files"][str(database / "c" / "POSCAR")]
+    assert entry["status"] == "error"
+    assert entry["error"]
+    entry = manifest["files"][str(database / "b" / "CHGCAR.gz")]
+    assert entry["output"] == str(out / "b" / "CHGCAR.vesta")
+    assert entry["seconds"] > 0
+    assert VestaFile(str(out / "a" / "POSCAR.vesta")).title == '"B1 N1"'
+    # The volumetric data is relative to the VESTA file, and uncompressed
+    # so VESTA can read it.
+    vfile = VestaFile(entry["output"])
+    path = vfile["IMPORT_DENSITY"].data[0][1]
+    assert path == "CHGCAR"
+    assert not is_compressed(os.path.join(out, "b", path))
+    # Up-to-date outputs are skipped, but failures are retried.
+    manifest = batch_convert(inputs, output_dir=str(out), jobs=1)
+    assert manifest["counts"] == {"converted": 0, "skipped": 2, "error": 1}
+    # Resuming keeps the earlier results, and doesn't retry failures.
+    with patch("vestacrystparser.convert._convert_file") as mock_convert:
+        manifest = batch_convert(inputs, output_dir=str(out), jobs=1,
+                                 resume=True)
+    mock_convert.assert_not_called()
+    assert manifest["counts"] == {"converted": 0, "skipped": 2, "error": 1}
+    # Changed inputs are converted again.
+    mtime = os.path.getmtime(out / "a" / "POSCAR.vesta")
+    os.utime(database / "a" / "POSCAR", (mtime + 10, mtime + 10))
+    manifest = batch_convert(inputs, output_dir=str(out), jobs=1,
+                             resume=True)
+    assert manifest["counts"] == {"converted": 1, "skipped": 1, "error": 1}
+    manifest = batch_convert(inputs, output_dir=str(out), jobs=1, force=True)
+    assert manifest["counts"] == {"converted": 2, "skipped": 0, "error": 1}
+    assert not list(out.rglob("*.tmp"))
+    manifest = batch_convert(inputs, output_dir=str(tmp_path / "raw"),
+                             jobs=1, decompress=False)
+    vfile = VestaFile(str(tmp_path / "raw" / "b" / "CHGCAR.vesta"))
+    assert vfile["IMPORT_DENSITY"].data[0][1] == \
+        os.path.join(os.pardir, os.pardir, "db", "b", "CHGCAR.gz")
+    assert not os.path.exists(tmp_path / "raw" / "b" / "CHGCAR")
+
+
+def test_batch_convert_in_place(database, tmp_path):
+    inputs = find_inputs([str(database)])
+    manifest = batch_convert(inputs, jobs=1,
+                             manifest_path=str(tmp_path / "manifest.json"))
+    assert manifest["counts"] == {"converted": 2, "skipped": 0, "error": 1}
+    assert is_compressed(database / "b" / "CHGCAR.gz")
+    assert not is_compressed(database / "b" / "CHGCAR")
+    # The uncompressed copy isn't an input itself.
+    assert find_inputs([str(database)]) == inputs
+
+
+def test_batch_convert_collision(database, tmp_path):
+    inputs = [(str(database / "a" / "POSCAR"), "POSCAR"),
+              (str(database / "c" / "POSCAR"), "POSCAR")]
+    manifest = batch_convert(inputs, output_dir=str(tmp_path / "out"),
+                             jobs=1)
+    assert manifest["counts"] == {"converted": 1, "skipped": 0, "error": 1}
+    assert "collides" in manifest["files"][inputs[1][0]]["error"]
+
+
+def test_cli(database, monkeypatch, capsys):
+    monkeypatch.chdir(database)
+    with patch("sys.argv", ["vestacrystparser.convert", "a", "b",
+                            "-j", "1", "-m", "log.json"]):
+        convert.main()
+    assert os.path.exists(os.path.join("a", "POSCAR.vesta"))
+    assert os.path.exists(os.path.join("b", "CHGCAR.vesta"))
+    assert "2 converted, 0 skipped, 0 failed" in capsys.readouterr().out
+    with open("log.json") as f:
+        assert json.load(f)["counts"]["converted"] == 2
+    # Failures give a non-zero exit status.
+    with patch("sys.argv", ["vestacrystparser.convert", "."]), \
+            pytest.raises(SystemExit):
+        convert.main()
@@ -1,12 +1,19 @@
 """
 Unit tests for loading a simple CHGCAR
 """
+import gzip
 import os
+import shutil
 
+import numpy as np
 import pytest
 
+from vestacrystparser import convert
 from vestacrystparser.parser import VestaFile
-from vestacrystparser.convert import vesta_from_chgcar, Chgcar
+from vestacrystparser.convert import vesta_from_chgcar, \
+    vesta_from_volumetric, decompress_volumetric_data, set_volumetric_levels, import_density_stats, \
+    Chgcar
+from vestacrystparser.vasp import read_poscar, read_grid_shape
 # TODO: Skip if cannot find pymatgen.
 
 from test_parser import compare_vesta_strings, DATA_DIR
@@ -48,3 +55,221 @@ def test_vesta_from_chgcar(chgcar_filename, sample_vestafile):
             assert compare_vesta_strings(str(sec1), str(sec2), prec=2)
         else:
             assert compare_vesta_strings(str(sec1), str(sec2), prec=6)
+
+
+def test_vesta_from_volumetric(chgcar_filename, sample_vestafile):
+    chg = Chgcar.from_file(chgcar_filename)
+    converted_file = vesta_from_volumetric(chg, chgcar_filename)
+    converted_file.title = chg.poscar.comment
+    # Should match the native reader.
+    native_file = vesta_from_chgcar(chgcar_filename)
+    assert compare_vesta_strings(str(converted_file), str(native_file),
+                                 prec=10)
+    for (sec1, sec2) in zip(converted_file, sample_vestafile):
+        if sec1.header == "ISURF":
+            assert compare_vesta_strings(str(sec1), str(sec2), prec=2)
+        elif sec1.header != "IMPORT_DENSITY":
+            assert compare_vesta_strings(str(sec1), str(sec2), prec=6)
+
+
+def test_vesta_from_chgcar_cache(tmp_path, chgcar_filename, monkeypatch):
+    fname = str(tmp_path / "CHGCAR.gz")
+    shutil.copy(chgcar_filename, fname)
+    expected = str(vesta_from_chgcar(fname))
+    assert not os.path.exists(fname + ".vstats.json")
+    assert str(vesta_from_chgcar(fname, cache=True)) == expected
+    assert os.path.exists(fname + ".vstats.json")
+
+    # The grid shouldn't be read again.
+    def fail(*args, **kwargs):
+        raise AssertionError("Grid was read despite the cache.")
+    monkeypatch.setattr(convert, "grid_stats", fail)
+    assert str(vesta_from_chgcar(fname, cache=True)) == expected
+
+
+def test_vesta_from_volumetric_cache(tmp_path, chgcar_filename):
+    fname = str(tmp_path / "CHGCAR.gz")
+    shutil.copy(chgcar_filename, fname)
+    chg = Chgcar.from_file(fname)
+    expected = str(vesta_from_volumetric(chg, fname))
+    assert str(vesta_from_volumetric(chg, fname, cache=True)) == expected
+    assert os.path.exists(fname + ".vstats.json")
+    assert str(vesta_from_volumetric(chg, fname, cache=True)) == expected
+    # Data not from fname doesn't use or replace its cache.
+    chg.data["total"] = chg.data["total"][::2] * 2
+    other = vesta_from_volumetric(chg, fname)
+    with open(fname + ".vstats.json") as f:
+        text = f.read()
+    assert str(vesta_from_volumetric(chg, fname, cache=True)) == str(other)
+    with open(fname + ".vstats.json") as f:
+        assert f.read() == text
+    assert compare_vesta_strings(str(vesta_from_chgcar(fname, cache=True)),
+                                 str(vesta_from_chgcar(fname)), prec=10)
+
+
+def test_vesta_from_chgcar_levels(chgcar_filename):
+    vfile = vesta_from_chgcar(chgcar_filename, percentile=[50, 90],
+                              volume_fraction=0.05)
+    levels = [row[2] for row in vfile["ISURF"].data[:-1]]
+    assert len(levels) == 3
+    assert levels[0] < levels[1] < levels[2]
+    # Compare against the full data.
+    chg = Chgcar.from_file(chgcar_filename)
+    absrho = abs(chg.data["total"]) / chg.structure.volume * convert.A2B
+    assert levels[1] == pytest.approx(np.percentile(absrho, 90), rel=0.04)
+    assert levels[2] == pytest.approx(np.percentile(absrho, 95), rel=0.04)
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+def test_vesta_from_chgcar_workers(tmp_path, chgcar_filename, compressed):
+    if compressed:
+        fname = chgcar_filename
+    else:
+        fname = str(tmp_path / "CHGCAR")
+        with gzip.open(chgcar_filename, "rb") as fin, \
+                open(fname, "wb") as fout:
+            shutil.copyfileobj(fin, fout)
+    expected = vesta_from_chgcar(fname)
+    converted = vesta_from_chgcar(fname, workers=2)
+    assert compare_vesta_strings(str(converted), str(expected), prec=10)
+
+
+def test_vesta_from_chgcar_uncompressed(tmp_path, chgcar_filename):
+    fname = str(tmp_path / "CHGCAR.gz")
+    shutil.copy(chgcar_filename, fname)
+    vfile = vesta_from_chgcar(fname, uncompressed=True)
+    assert vfile["IMPORT_DENSITY"].data[0][1] == str(tmp_path / "CHGCAR")
+    # Not made until asked for.
+    assert not os.path.exists(tmp_path / "CHGCAR")
+    assert decompress_volumetric_data(vfile) == [str(tmp_path / "CHGCAR")]
+    with gzip.open(chgcar_filename, "rt") as f:
+        assert (tmp_path / "CHGCAR").read_text() == f.read()
+    # Already up to date.
+    assert decompress_volumetric_data(vfile) == []
+    # Uncompressed files stay as they are.
+    vfile = vesta_from_chgcar(str(tmp_path / "CHGCAR"), uncompressed=True)
+    assert vfile["IMPORT_DENSITY"].data[0][1] == str(tmp_path / "CHGCAR")
+    # Relative paths
+    vfile = vesta_from_chgcar(fname, uncompressed=True)
+    vfile["IMPORT_DENSITY"].data[0][1] = "CHGCAR"
+    os.remove(tmp_path / "CHGCAR")
+    assert decompress_volumetric_data(vfile, tmp_path) == \
+        [os.path.join(tmp_path, "CHGCAR")]
+
+
+def test_decompress_volumetric_data_no_suffix(tmp_path, chgcar_filename,
+                                              caplog):
+    # Recognised as compressed by its content alone.
+    fname = str(tmp_path / "CHGCAR")
+    shutil.copy(chgcar_filename, fname)
+    vfile = vesta_from_chgcar(fname, uncompressed=True)
+    assert vfile["IMPORT_DENSITY"].data[0][1] == fname + ".uncompressed"
+    assert decompress_volumetric_data(vfile) == [fname + ".uncompressed"]
+    with gzip.open(chgcar_filename, "rt") as f:
+        assert (tmp_path / "CHGCAR.uncompressed").read_text() == f.read()
+    assert decompress_volumetric_data(vfile) == []
+    # Referring to the compressed file itself can't be fixed.
+    vfile = vesta_from_chgcar(fname)
+    assert decompress_volumetric_data(vfile) == []
+    assert "compressed" in caplog.text
+
+
+def test_vesta_from_chgcar_preview(tmp_path, chgcar_filename):
+    fname = str(tmp_path / "CHGCAR.gz")
+    shutil.copy(chgcar_filename, fname)
+    full = vesta_from_chgcar(fname)
+    vfile = vesta_from_chgcar(fname, preview=4)
+    preview = str(tmp_path / "CHGCAR_preview4.vasp")
+    assert vfile["IMPORT_DENSITY"].data[0][1] == preview
+    assert os.path.exists(preview)
+    # Levels are still from the full data.
+    assert str(vfile["ISURF"]) == str(full["ISURF"])
+    # Can swap back.
+    vfile.add_volumetric_data(fname, mode="replace")
+    assert str(vfile) == str(full)
+
+
+def write_chgcar(fname, grid, lattice_c=2.0):
+    """Write a minimal CHGCAR with the given grid (indexed [z, y, x])."""
+    with open(fname, "w") as f:
+        f.write(f"Test\n1.0\n2 0 0\n0 2 0\n0 0 {lattice_c}\nH\n1\nDirect\n"
+                "0 0 0\n\n")
+        f.write(" ".join(str(x) for x in grid.shape[::-1]) + "\n")
+        values = grid.reshape(-1)
+        for i in range(0, len(values), 5):
+            f.write(" ".join(f"{x: .11E}" for x in values[i:i+5]) + "\n")
+
+
+def test_set_volumetric_levels(tmp_path):
+    rng = np.random.default_rng(5)
+    grids = [rng.normal(size=(6, 4, 5)) for _ in range(3)]
+    for i, grid in enumerate(grids):
+        write_chgcar(tmp_path / f"CHGCAR{i}", grid)
+    vfile = vesta_from_chgcar(str(tmp_path / "CHGCAR0"))
+    vfile["IMPORT_DENSITY"].data[0][1] = "CHGCAR0"
+    vfile.add_volumetric_data("CHGCAR1", factor=0.5, mode="subtract")
+    vfile.add_volumetric_data("CHGCAR2", factor=2, mode="divide")
+    stats = set_volumetric_levels(vfile, directory=tmp_path,
+                                  percentile=[50, 90, 99])
+    scale = convert.A2B / 8
+    expected = (grids[0] - 0.5 * grids[1]) * scale / (2 * grids[2] * scale)
+    assert stats.count == expected.size
+    assert stats.mean == pytest.approx(np.abs(expected).mean())
+    assert stats.std == pytest.approx(np.abs(expected).std())
+    assert vfile["SECTP"].data[0][1:3] == \
+        pytest.approx([expected.min(), expected.max()])
+    assert len(vfile["ISURF"].data) == 4
+    # Fewer levels deletes isosurfaces.
+    vfile.edit_isosurface(1, r=0)
+    set_volumetric_levels(vfile, directory=tmp_path)
+    assert len(vfile["ISURF"].data) == 2
+    assert vfile["ISURF"].data[0][2] == \
+        pytest.approx(np.abs(expected).mean() + 2 * np.abs(expected).std())
+    assert vfile["ISURF"].data[0][3] == 0, "Isosurface style was not kept."
+    # Mismatched grids
+    write_chgcar(tmp_path / "CHGCAR2", grids[2][:3])
+    with pytest.raises(ValueError):
+        import_density_stats(vfile, directory=tmp_path)
+
+
+def test_vesta_from_spin_chgcar(tmp_path):
+    rng = np.random.default_rng(6)
+    total = rng.normal(size=(6, 4, 5))
+    mag = rng.normal(size=(6, 4, 5))
+    fname = tmp_path / "CHGCAR"
+    write_chgcar(fname, total)
+    with open(fname, "a") as f:
+        # Augmentation occupancies, then the magnetization block.
+        f.write("augmentation occupancies 1 1\n 0.1\n")
+        f.write(" ".join(str(x) for x in mag.shape[::-1]) + "\n")
+        values = mag.reshape(-1)
+        for i in range(0, len(values), 5):
+            f.write(" ".join(f"{x: .11E}" for x in values[i:i+5]) + "\n")
+    scale = convert.A2B / 8
+    vtotal, vmag = convert.vesta_from_spin_chgcar(str(fname))
+    assert vmag["IMPORT_DENSITY"].data[0][1] == \
+        str(tmp_path / "CHGCAR_mag.vasp")
+    # The magnetization file is a CHGCAR in its own right.
+    with open(tmp_path / "CHGCAR_mag.vasp") as f:
+        read_poscar(f)
+        assert read_grid_shape(f) == (5, 4, 6)
+        written = np.array(f.read().split(), dtype=float)
+    assert written == pytest.approx(mag.reshape(-1))
+    level = (np.abs(mag).mean() + 2 * np.abs(mag).std()) * scale
+    rows = vmag["ISURF"].data[:-1]
+    assert [row[2] for row in rows] == pytest.approx([level] * 2)
+    assert [row[1] for row in rows] == [1, 2]
+    assert [row[3:6] for row in rows] == [[255, 255, 0], [0, 255, 255]]
+    assert vtotal["ISURF"].data[0][2] == pytest.approx(
+        (np.abs(total).mean() + 2 * np.abs(total).std()) * scale)
+    # Spin channels.
+    up, down = convert.vesta_from_spin_chgcar(str(fname), output="spin")
+    for vfile, grid in [(up, (total + mag) / 2), (down, (total - mag) / 2)]:
+        grid = grid * scale
+        assert vfile["ISURF"].data[0][2] == pytest.approx(
+            np.abs(grid).mean() + 2 * np.abs(grid).std())
+        assert vfile["SECTP"].data[0][1:3] == \
+            pytest.approx([grid.min(), grid.max()])
+    assert down["IMPORT_DENSITY"].data[1][0] == "-0.500000"
+    with pytest.raises(ValueError):
+        convert.vesta_from_spin_chgcar(str(tmp_path / "CHGCAR_mag.vasp"))
@@ -0,0 +1,147 @@
+"""
+Unit tests for reading Gaussian cube and XSF volumetric files
+"""
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+from vestacrystparser.convert import vesta_from_cube, vesta_from_xsf
+from vestacrystparser.cube import read_cube_header, BOHR
+from vestacrystparser.xsf import read_xsf_header
+from vestacrystparser.volumetric import GridFile, combined_stats
+
+
+def write_cube(fname, grid, norbitals=1):
+    """Write a cube file for water, with grid indexed [x, y, z] (and
+    orbital last if norbitals > 1)."""
+    nx, ny, nz = grid.shape[:3]
+    natoms = 3 if norbitals == 1 else -3
+    with open(fname, "w") as f:
+        f.write("Water\nDensity\n")
+        f.write(f"{natoms:5d} -1.0 -1.0 -1.0\n")
+        f.write(f"{nx:5d} 0.5 0.0 0.0\n{ny:5d} 0.0 0.5 0.0\n"
+                f"{nz:5d} 0.0 0.0 0.5\n")
+        f.write("8 8.0 0.0 0.0 0.0\n1 1.0 1.0 0.0 0.0\n1 1.0 0.0 1.0 0.0\n")
+        if norbitals > 1:
+            f.write(f"{norbitals} " + " ".join(
+                str(i + 1) for i in range(norbitals)) + "\n")
+        # Third axis fastest, with a new line for each row.
+        for row in grid.reshape(nx * ny, -1):
+            for i in range(0, len(row), 6):
+                f.write(" ".join(f"{x: .5E}" for x in row[i:i+6]) + "\n")
+
+
+def test_vesta_from_cube(tmp_path):
+    grid = np.random.default_rng(7).normal(size=(4, 5, 8))
+    fname = str(tmp_path / "water.cube")
+    write_cube(fname, grid)
+    with open(fname) as f:
+        header = read_cube_header(f)
+        assert f.readline().split()[0] == f"{grid[0, 0, 0]:.5E}"
+    pos = header.structure
+    assert header.shape == (4, 5, 8)
+    assert pos.species == ["O", "H", "H"]
+    assert pos.abc == pytest.approx((2 * BOHR, 2.5 * BOHR, 4 * BOHR))
+    # Relative to the origin of the grid.
+    assert pos.frac_coords[0] == pytest.approx([0.5, 0.4, 0.25])
+    assert pos.frac_coords[1] == pytest.approx([1, 0.4, 0.25])
+    vfile = vesta_from_cube(fname)
+    assert vfile.title == "Water"
+    assert vfile["IMPORT_DENSITY"].data[0][1] == fname
+    level = np.abs(grid).mean() + 2 * np.abs(grid).std()
+    assert vfile["ISURF"].data[0][2] == pytest.approx(level, rel=1e-4)
+    assert vfile["SECTP"].data[0][1:3] == \
+        pytest.approx([grid.min(), grid.max()], rel=1e-4)
+    # Compressed
+    with open(fname, "rb") as fin, gzip.open(fname + ".gz", "wb") as fout:
+        fout.write(fin.read())
+    vfile = vesta_from_cube(fname + ".gz", uncompressed=True)
+    assert vfile["IMPORT_DENSITY"].data[0][1] == fname
+    assert vfile["ISURF"].data[0][2] == pytest.approx(level, rel=1e-4)
+
+
+def test_cube_orbitals(tmp_path):
+    grid = np.random.default_rng(8).normal(size=(3, 4, 5, 2))
+    fname = str(tmp_path / "orbitals.cube")
+    write_cube(fname, grid, norbitals=2)
+    with GridFile(fname) as cube:
+        assert cube.shape == (3, 4, 5)
+        values = np.concatenate(list(cube.chunks(chunk_size=7)))
+    assert values == pytest.approx(grid[..., 0].reshape(-1), rel=1e-4)
+
+
+XSF_CRYSTAL = """# Comment
+CRYSTAL
+PRIMVEC
+ 3.0 0.0 0.0
+ 0.0 3.0 0.0
+ 0.0 0.0 4.0
+PRIMCOORD
+ 2 1
+ Na 0.0 0.0 0.0
+ 17 1.5 1.5 2.0
+BEGIN_BLOCK_DATAGRID_3D
+ density
+ BEGIN_DATAGRID_3D_rho
+ {shape}
+ 0.0 0.0 0.0
+ 3.0 0.0 0.0
+ 0.0 3.0 0.0
+ 0.0 0.0 4.0
+"""
+
+
+def test_vesta_from_xsf(tmp_path):
+    # A periodic general grid; the last point along each axis repeats the
+    # first.
+    grid = np.random.default_rng(9).normal(size=(6, 4, 5))
+    periodic = np.pad(grid, ((0, 1), (0, 1), (0, 1)), mode="wrap")
+    fname = str(tmp_path / "NaCl.xsf")
+    with open(fname, "w") as f:
+        f.write(XSF_CRYSTAL.format(shape="6 5 7"))
+        values = periodic.reshape(-1)
+        for i in range(0, len(values), 6):
+            f.write(" ".join(f"{x: .6E}" for x in values[i:i+6]) + "\n")
+        f.write(" END_DATAGRID_3D\nEND_BLOCK_DATAGRID_3D\n")
+    with open(fname) as f:
+        header = read_xsf_header(f)
+    assert header.periodic
+    assert header.shape == (6, 5, 7)
+    assert header.structure.species == ["Na", "Cl"]
+    assert np.array(header.structure.frac_coords) == pytest.approx(
+        np.array([[0, 0, 0], [0.5, 0.5, 0.5]]))
+    vfile = vesta_from_xsf(fname)
+    assert vfile.title == "density"
+    level = np.abs(grid).mean() + 2 * np.abs(grid).std()
+    assert vfile["ISURF"].data[0][2] == pytest.approx(level, rel=1e-5)
+    # The XSF grid combines with itself.
+    stats = combined_stats([("+", 1, fname), ("+", 1, fname)])
+    assert stats.shape == (5, 4, 6)
+    assert stats.mean == pytest.approx(2 * np.abs(grid).mean(), rel=1e-5)
+
+
+def test_xsf_molecule():
+    text = """MOLECULE
+ATOMS
+ 8 1.0 1.0 1.0
+ H 2.0 1.0 1.0
+BEGIN_BLOCK_DATAGRID_3D
+ water
+ DATAGRID_3D_UNKNOWN
+ 2 2 2
+ 1.0 0.0 0.0
+ 2.0 0.0 0.0
+ 0.0 2.0 0.0
+ 0.0 0.0 2.0
+ 1 2 3 4 5 6 7 8
+"""
+    f = io.StringIO(text)
+    header = read_xsf_header(f)
+    assert not header.periodic
+    assert header.structure.species == ["O", "H"]
+    assert header.structure.abc == pytest.approx((2, 2, 2))
+    assert np.array(header.structure.frac_coords) == pytest.approx(
+        np.array([[0, 0.5, 0.5], [0.5, 0.5, 0.5]]))
+    assert f.readline().split()[0] == "1"
@@ -1,5 +1,6 @@
 import os
 import math
+import random
 
 import pytest
 
@@ -119,6 +120,9 @@ def test_set_site_color(sample_vestafile):
         "Site colors changed when called out-of-range index"
     # I don't *expect* any side-effects from this function.
     # Dunno how to easily test that, though.
+    sample_vestafile._phases[0].remove("SITET")
+    with pytest.raises(TypeError):
+        sample_vestafile.set_site_color(1, 11, 22, 33)
 
 
 def test_set_atom_color(sample_vestafile):
@@ -633,6 +637,38 @@ def test_add_site(sample_vestafile):
         "Adding atom of unspecified element did not change ATOMT properly."
 
 
+def test_add_sites():
+    rng = random.Random(4)
+    sites = [(rng.choice(["Si", "O", "H", "Fe", "C"]), f"X{i}",
+              rng.random(), rng.random(), rng.random()) for i in range(60)]
+    sites[3] = sites[3] + (0.1, 0.2, 0.3, 0.5, 1.0, 0.02)
+    for cell in [(9, 10, 11, 90, 90, 90), (6, 7, 8, 70, 100, 115)]:
+        expected = VestaFile()
+        expected.set_cell(*cell)
+        for site in sites:
+            expected.add_site(*site, add_bonds=True)
+        vfile = VestaFile()
+        vfile.set_cell(*cell)
+        assert vfile.add_sites(sites, add_bonds=True) == list(range(1, 61))
+        assert str(vfile) == str(expected)
+    # Without bonds, onto existing sites.
+    assert vfile.add_sites([("Cu", "Cu", 0, 0, 0)]) == [61]
+    assert vfile.nsites == 61
+    with pytest.raises(ValueError):
+        vfile.add_sites([("Cu", "Cu", 0, 0)])
+
+
+def test_set_site_coordinates(sample_vestafile):
+    sample_vestafile.add_site('Cu', 'Cu2', 0.5, 0.5, 0.5)
+    sample_vestafile.set_site_coordinates([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+    assert [site[3:6] for site in sample_vestafile.get_structure()] == \
+        [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
+    # The site lookup tables see the new positions.
+    assert sample_vestafile.find_sites_in_sphere(0.4, 0.5, 0.6, 0.1) == [2]
+    with pytest.raises(ValueError):
+        sample_vestafile.set_site_coordinates([[0, 0, 0]])
+
+
 def test_add_bond(sample_vestafile):
     expected_sbond = """SBOND
     1 Cu Cu 0.00000 2.5000 0 1 1 0 1 0.250 2.000 127 127 127
@@ -875,6 +911,52 @@ def test_find_sites(sample_vestafile):
         xmin=0, xmax=0.5, zmin=0.1, zmax=1) == []
 
 
+def test_site_lookup_tables(sample_vestafile):
+    # Lookups stay current as sites are added.
+    sample_vestafile.find_sites()
+    sample_vestafile.add_site('Au', 'Au1', 0.5, 0.5, 0.5)
+    sample_vestafile.add_site('Cu', 'Cu2', 0.25, 0.25, 0.25)
+    assert sample_vestafile.find_sites('Cu') == [1, 3]
+    assert sample_vestafile.find_sites(['Au', 'Cu']) == [1, 2, 3]
+    assert sample_vestafile.find_sites('Au', xmax=0.4) == []
+    sample_vestafile.set_atom_color('Cu', 1, 2, 3)
+    assert [row[3:6] for row in sample_vestafile["SITET"].data[:-1]] == \
+        [[1, 2, 3], [254, 178, 56], [1, 2, 3]]
+    # Direct edits to the sections are picked up, whatever is looked up.
+    sample_vestafile["STRUC"].data[2][1] = 'Cu'
+    assert sample_vestafile.find_sites('Cu') == [1, 2, 3]
+    assert sample_vestafile.find_sites('Au') == []
+    sample_vestafile["STRUC"].data[2][1] = 'Au'
+    assert sample_vestafile.find_sites('Au') == [2]
+    # Including coordinates, for the spatial grid.
+    assert sample_vestafile.find_sites(xmin=0.8) == []
+    sample_vestafile["STRUC"].data[0][4:7] = [0.9, 0.9, 0.9]
+    assert sample_vestafile.find_sites(xmin=0.8) == [1]
+    sample_vestafile["STRUC"].data[0][4] = 0.1
+    assert sample_vestafile.find_sites(xmin=0.8) == []
+    # And element symbols in ATOMT.
+    sample_vestafile["ATOMT"].data[0][1] = 'Ag'
+    sample_vestafile.set_atom_color('Ag', 4, 5, 6)
+    assert sample_vestafile["ATOMT"].data[0][3:6] == [4, 5, 6]
+    # And rows added to the sections.
+    row = [4, 'Cu', 'Cu4', 1.0, 0.75, 0.75, 0.75, '1a', 1]
+    sample_vestafile["STRUC"].data.insert(-1, row)
+    assert sample_vestafile.find_sites('Cu', xmin=0.7) == [4]
+    sample_vestafile["STRUC"].data[-2][1] = 'O'
+    assert sample_vestafile.find_sites('Cu', xmin=0.7) == []
+    del sample_vestafile["STRUC"].data[-2]
+    sample_vestafile["SITET"].data = [
+        [1, 'Cu1', 1.28, 0, 0, 0, 0, 0, 0, 204, 0],
+        [0, 0, 0, 0, 0, 0]]
+    sample_vestafile.set_site_color(1, 9, 8, 7)
+    assert sample_vestafile["SITET"].data[0][3:6] == [9, 8, 7]
+    # Copies have their own lookup tables.
+    sample2 = sample_vestafile.copy()
+    sample2.add_site('Ag', 'Ag1', 0.1, 0.1, 0.1)
+    assert sample2.find_sites('Ag') == [4]
+    assert sample_vestafile.find_sites('Ag') == []
+
+
 def test_set_title(sample_vestafile):
     expected_title = """TITLE
 Foobar
@@ -1045,3 +1127,206 @@ def test_set_volumetric_interpolation_factor(sample_vestafile, caplog):
     assert "IMPORT_DENSITY" not in sample_vestafile
     assert caplog.records[-1].levelname == "WARNING", \
         "Setting interpolation factor in absence of IMPORT_DENSITY did not raise a warning."
+
+
+def test_set_site_colors(sample_vestafile):
+    sample_vestafile.add_site('Cu', 'Cu2', 0.5, 0.5, 0.5)
+    sample_vestafile.add_site('Cu', 'Cu3', 0.25, 0.25, 0.25)
+    sample_vestafile.set_site_colors([3, 1], [[10, 20, 30], [40, 50, 60]])
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[40, 50, 60], [34, 71, 220], [10, 20, 30]]
+    # All sites at once
+    sample_vestafile.set_site_colors(None, [[1, 1, 1]] * 3)
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[1, 1, 1]] * 3
+    # Errors
+    with pytest.raises(ValueError):
+        sample_vestafile.set_site_colors([1, 2], [[0, 0, 0]])
+    with pytest.raises(IndexError):
+        sample_vestafile.set_site_colors([4], [[0, 0, 0]])
+    # Nothing changed by the failed calls.
+    with pytest.raises(ValueError):
+        sample_vestafile.set_site_colors([1, 2], [[0, 0, 0], [0, 0]])
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[1, 1, 1]] * 3
+
+
+def test_color_sites_by(sample_vestafile):
+    sample_vestafile.add_site('Cu', 'Cu2', 0.5, 0.5, 0.5)
+    sample_vestafile.add_site('Cu', 'Cu3', 0.25, 0.25, 0.25)
+    # Default blue-white-red, with range from the data.
+    sample_vestafile.color_sites_by([-1.0, 0.0, 2.0])
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[0, 0, 255], [170, 170, 255], [255, 0, 0]]
+    # Explicit range, with clipping, and NaN left alone.
+    sample_vestafile.color_sites_by([-1.0, float('nan'), 5.0],
+                                    colormap="Gray scale", vmin=0, vmax=1)
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[0, 0, 0], [170, 170, 255], [255, 255, 255]]
+    # Custom stops and a subset of sites.
+    sample_vestafile.color_sites_by([0.5], colormap=[(0, 0, 0), (100, 200, 0)],
+                                    vmin=0, vmax=1, indices=[2])
+    assert sample_vestafile["SITET"].data[1][3:6] == [50, 100, 0]
+    # Callable with float components, like matplotlib colormaps.
+    sample_vestafile.color_sites_by([0, 1, 2],
+                                    colormap=lambda t: (t, 0.0, 1 - t, 1.0))
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[0, 0, 255], [128, 0, 128], [255, 0, 0]]
+    with pytest.raises(ValueError):
+        sample_vestafile.color_sites_by([1, 2])
+
+
+def test_color_sites_by_numpy(sample_vestafile):
+    np = pytest.importorskip("numpy")
+    sample_vestafile.add_site('Cu', 'Cu2', 0.5, 0.5, 0.5)
+    sample_vestafile.add_site('Cu', 'Cu3', 0.25, 0.25, 0.25)
+    # numpy float32 components are 0-1, like Python floats.
+    sample_vestafile.color_sites_by(
+        np.array([0, 1, 2]),
+        colormap=lambda t: np.array([t, 0, 1 - t, 1], dtype=np.float32))
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[0, 0, 255], [128, 0, 128], [255, 0, 0]]
+    # numpy integers are 0-255.
+    sample_vestafile.color_sites_by(
+        [0, 1, 2], colormap=lambda t: np.array([200, 100, 0]))
+    colors = [row[3:6] for row in sample_vestafile["SITET"].data[:-1]]
+    assert colors == [[200, 100, 0]] * 3
+
+
+@pytest.fixture
+def random_vestafile() -> VestaFile:
+    """Triclinic cell with many randomly placed sites."""
+    import random
+    rng = random.Random(1234)
+    vfile = VestaFile()
+    vfile.set_cell(5.0, 6.0, 7.0, 80.0, 95.0, 110.0)
+    for i in range(300):
+        element = rng.choice(['Cu', 'O'])
+        coords = [rng.uniform(-0.2, 1.2) for _ in range(3)]
+        vfile.add_site(element, element + str(i), *coords)
+    return vfile
+
+
+def test_find_sites_box(random_vestafile):
+    structure = random_vestafile.get_structure()
+    box = (0.1, 0.4, -0.1, 0.3, 0.5, 1.1)
+    expected = [site[0] for site in structure
+                if box[0] <= site[3] <= box[1] and box[2] <= site[4] <= box[3]
+                and box[4] <= site[5] <= box[5]]
+    assert random_vestafile.find_sites(None, *box) == expected
+    expected_O = [i for i in expected if structure[i-1][1] == 'O']
+    assert random_vestafile.find_sites('O', *box) == expected_O
+    # Adding a site after the grid is built
+    random_vestafile.add_site('O', 'Onew', 0.2, 0.2, 0.6)
+    assert random_vestafile.find_sites(None, *box) == expected + [301]
+
+
+def test_find_sites_in_sphere(random_vestafile):
+    cell = random_vestafile.get_cell_matrix()
+    structure = random_vestafile.get_structure()
+    centre = [0.95, 0.1, 0.5]
+    radius = 2.5
+
+    def near(site):
+        for i in range(-3, 4):
+            for j in range(-3, 4):
+                for k in range(-3, 4):
+                    f = [site[3] - centre[0] + i, site[4] - centre[1] + j,
+                         site[5] - centre[2] + k]
+                    cart = [sum(f[a] * cell[a][b] for a in range(3))
+                            for b in range(3)]
+                    if math.sqrt(sum(x**2 for x in cart)) <= radius:
+                        return True
+        return False
+    expected = [site[0] for site in structure if near(site)]
+    assert len(expected) > 0
+    assert random_vestafile.find_sites_in_sphere(*centre, radius) == expected
+    expected_Cu = [i for i in expected if structure[i-1][1] == 'Cu']
+    assert random_vestafile.find_sites_in_sphere(
+        *centre, radius, elements='Cu') == expected_Cu
+    # A sphere bigger than the cell catches everything.
+    assert random_vestafile.find_sites_in_sphere(0, 0, 0, 20) == \
+        list(range(1, 301))
+    with pytest.raises(ValueError):
+        random_vestafile.find_sites_in_sphere(0, 0, 0, -1)
+
+
+def test_find_sites_in_slab(random_vestafile):
+    cell = random_vestafile.get_cell_matrix()
+    inverse = vestacrystparser.parser.invert_matrix(cell)
+    structure = random_vestafile.get_structure()
+    for hkl, dmin, dmax in [((0, 0, 1), 1.0, 2.0), ((1, -1, 2), 0.5, 0.9),
+                            ((2, 1, 0), -0.3, 0.2)]:
+        gnorm = math.sqrt(sum(sum(hkl[i] * inverse[j][i] for i in range(3))**2
+                              for j in range(3)))
+        expected = []
+        for site in structure:
+            s = sum(m * x for m, x in zip(hkl, site[3:6]))
+            if math.ceil(dmin * gnorm - s) <= math.floor(dmax * gnorm - s):
+                expected.append(site[0])
+        assert len(expected) > 0
+        assert random_vestafile.find_sites_in_slab(*hkl, dmin, dmax) == \
+            expected, f"Slab {hkl} failed."
+    with pytest.raises(ValueError):
+        random_vestafile.find_sites_in_slab(0, 0, 0, 0, 1)
+    with pytest.raises(ValueError):
+        random_vestafile.find_sites_in_slab(0.5, 0, 0, 0, 1)
+
+
+def test_delete_sites(random_vestafile):
+    # Build the lookup tables first, so they must be updated.
+    random_vestafile.find_sites()
+    random_vestafile.delete_sites(lambda site: site[3] < 0.5)
+    structure = random_vestafile.get_structure()
+    assert all(site[3] >= 0.5 for site in structure)
+    assert [site[0] for site in structure] == \
+        list(range(1, len(structure) + 1))
+    assert random_vestafile.find_sites(None, -1, 2, -1, 2, -1, 2) == \
+        [site[0] for site in structure]
+    expected = [site[0] for site in structure if site[1] == 'Cu']
+    assert random_vestafile.find_sites('Cu', -1, 2, -1, 2, -1, 2) == expected
+
+
+def test_sites_view(sample_vestafile):
+    sample_vestafile.add_site('Au', 'Au1', 0.5, 0.25, 0.125)
+    sites = sample_vestafile.sites
+    assert len(sites) == 2
+    site = sites[1]
+    assert isinstance(site, vestacrystparser.parser.Site)
+    assert (site.index, site.element, site.label) == (2, 'Au', 'Au1')
+    assert site.coords == (0.5, 0.25, 0.125)
+    assert site.occupancy == 1.0
+    # Sequence behaviour matches get_structure.
+    assert site[1] == 'Au' and site[3:] == [0.5, 0.25, 0.125]
+    assert list(site) == sample_vestafile.get_structure()[1]
+    assert sites[-1] == sample_vestafile.get_structure()[1]
+    assert [s.label for s in sites] == ['Cu', 'Au1']
+    assert sites.copy() == sample_vestafile.get_structure()
+    # Views are live, copies are not.
+    snapshot = site.copy()
+    sample_vestafile["STRUC"].data[2][4] = 0.75
+    assert site.x == 0.75
+    assert snapshot[3] == 0.5
+    # Views are read-only.
+    with pytest.raises(AttributeError):
+        site.x = 0.1
+    with pytest.raises(IndexError):
+        sites[2]
+
+
+def test_bonds_view(sample_vestafile):
+    sample_vestafile.add_bond('Cu', 'Cu', max_length=2.5)
+    sample_vestafile.add_bond('Cu', 'O', search_mode=2, style=5)
+    bonds = sample_vestafile.bonds
+    assert len(bonds) == 2
+    assert bonds[1].A2 == 'XX' and bonds[1].search_mode == 2 and \
+        bonds[1].style == 5
+    assert bonds[0]["max_length"] == 2.5
+    assert bonds.copy() == sample_vestafile.get_bonds()
+    assert [dict(b) for b in bonds] == sample_vestafile.get_bonds()
+    # Usable as keyword arguments.
+    sample_vestafile.add_bond(**bonds[0])
+    assert len(bonds) == 3
+    assert bonds[2].copy() == bonds[0].copy()
+    with pytest.raises(KeyError):
+        bonds[0]["foo"]
@@ -387,4 +387,228 @@ def test_set_phase_orientation_basic(sample_vestafile):
         "LORIENT didn't handle [110] orientation."
     assert compare_vesta_strings(str(sample_vestafile["LMATRIX"]), expected_lmatrix, prec=6), \
         "LMATRIX didn't handle [110] orientation."
-    
\ No newline at end of file
+
+
+def test_set_phase_orientation_dependents(sample_vestafile):
+    # Phase 3 is oriented relative to phase 2, so follows its changes.
+    sample_vestafile.copy_phase(2)
+    assert sample_vestafile.nphases == 3
+    sample_vestafile.set_current_phase(3)
+    sample_vestafile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                           [1, 0, 0], [0, 0, 1],
+                                           False, False, 2)
+    sample_vestafile.set_current_phase(2)
+    sample_vestafile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                           [0, 1, 0], [0, 0, 1],
+                                           False, False, 0)
+    expected_lmatrix = """LMATRIX
+ 0.000000 -1.000000  0.000000  0.000000
+ 1.000000  0.000000  0.000000  0.000000
+ 0.000000  0.000000  1.000000  0.000000
+ 0.000000  0.000000  0.000000  1.000000
+ 0.000000  0.000000  0.000000"""
+    assert compare_vesta_strings(str(sample_vestafile["LMATRIX", 2]),
+                                 expected_lmatrix, prec=6)
+    # Phase 3's LMATRIX is composed with the inverse of phase 2's.
+    expected_lmatrix = """LMATRIX
+ 0.000000  1.000000  0.000000  0.000000
+-1.000000  0.000000  0.000000  0.000000
+ 0.000000  0.000000  1.000000  0.000000
+ 0.000000  0.000000  0.000000  1.000000
+ 0.000000  0.000000  0.000000"""
+    assert compare_vesta_strings(str(sample_vestafile["LMATRIX", 3]),
+                                 expected_lmatrix, prec=6), \
+        "Dependent phase was not re-oriented."
+    # Phase 1 does not depend on phase 2, so is untouched.
+    assert sample_vestafile["LMATRIX", 1].data[0][:4] == [1, 0, 0, 0]
+
+
+def test_batch_update(sample_vestafile):
+    sample_vestafile.copy_phase(2)
+    reference = sample_vestafile.copy()
+    # Unbatched
+    for vfile in [reference]:
+        vfile.set_current_phase(3)
+        vfile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                    [1, 1, 0], [0, 0, 1],
+                                    False, False, 2)
+        vfile.set_current_phase(2)
+        vfile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                    [0, 1, 0], [1, 0, 0],
+                                    False, False, 0)
+    # Batched
+    with sample_vestafile.batch_update():
+        sample_vestafile.set_current_phase(3)
+        sample_vestafile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                               [1, 1, 0], [0, 0, 1],
+                                               False, False, 2)
+        sample_vestafile.set_current_phase(2)
+        with sample_vestafile.batch_update():
+            sample_vestafile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                                   [0, 1, 0], [1, 0, 0],
+                                                   False, False, 0)
+        # Nested batch defers to the outer one.
+        assert sample_vestafile["LMATRIX", 2].data[0][:4] == [1, 0, 0, 0]
+    assert compare_vesta_strings(str(sample_vestafile), str(reference),
+                                 prec=6), \
+        "Batched orientation changes differ from unbatched ones."
+
+
+def test_lazy_phases(sample_vesta_filename):
+    vfile = VestaFile(sample_vesta_filename)
+    # Global sections are parsed, phases are not.
+    assert not any(phase.is_parsed for phase in vfile._phases)
+    assert vfile["ATOMT"].data[0][1] == "Cu"
+    assert len(vfile) == 89, "Wrong number of sections counted."
+    assert not any(phase.is_parsed for phase in vfile._phases)
+    # Touching a phase parses only that phase.
+    assert vfile["TITLE", 2].data[0][0] == "Phase Two"
+    assert [phase.is_parsed for phase in vfile._phases] == [False, True]
+    vfile.set_current_phase(1)
+    assert vfile._phases[0].is_parsed
+    # Output is unchanged.
+    with open(sample_vesta_filename) as f:
+        assert compare_vesta_strings(str(VestaFile(sample_vesta_filename)),
+                                     f.read())
+
+
+def test_orientation_lazy_phases(sample_vestafile, sample_vesta_filename,
+                                tmp_path):
+    # Phase 4 oriented relative to phase 3.
+    sample_vestafile.extend_phases([sample_vesta_filename])
+    sample_vestafile.set_current_phase(4)
+    sample_vestafile.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                           [0, 1, 0], [0, 0, 1],
+                                           False, False, 3)
+    sample_vestafile.save(str(tmp_path / "four.vesta"))
+    vfile = VestaFile(str(tmp_path / "four.vesta"))
+    for v in [vfile, sample_vestafile]:
+        v.set_current_phase(3)
+        v.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                [1, 1, 0], [0, 0, 1],
+                                False, False, 0)
+    # Only the changed phase and the one depending on it are parsed.
+    assert [phase.is_parsed for phase in vfile._phases] == \
+        [False, False, True, True]
+    assert compare_vesta_strings(str(vfile["LMATRIX", 4]),
+                                 str(sample_vestafile["LMATRIX", 4]), prec=6)
+
+
+def test_import_phases_selected(sample_vestafile, sample_vesta_filename):
+    sample_vestafile.import_phases(sample_vesta_filename, [2])
+    assert sample_vestafile.nphases == 3
+    assert sample_vestafile["TITLE", 3].data[0][0] == "Phase Two"
+    assert len(sample_vestafile) == 89 + 24
+    sample_vestafile.import_phases(sample_vestafile, [-1, 1])
+    assert sample_vestafile.nphases == 5
+    assert sample_vestafile["TITLE", 4].data[0][0] == "Phase Two"
+    assert sample_vestafile["TITLE", 5].data[0][0] == "New structure"
+    # Unused phases of the source aren't parsed.
+    source = VestaFile(sample_vesta_filename)
+    sample_vestafile.import_phases(source, [1])
+    assert not source._phases[1].is_parsed
+    with pytest.raises(IndexError):
+        sample_vestafile.import_phases(source, [3])
+    with pytest.raises(IndexError):
+        sample_vestafile.import_phases(source, [0])
+    assert sample_vestafile.nphases == 6
+
+
+def test_extend_phases(sample_vestafile, sample_vesta_filename,
+                       sample_vestafile_onephase):
+    source = VestaFile(sample_vesta_filename)
+    # Orient source's phase 2 relative to its phase 1.
+    source.set_current_phase(2)
+    source.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                 [0, 1, 0], [0, 0, 1],
+                                 False, False, 1)
+    sample_vestafile.extend_phases([source, sample_vesta_filename,
+                                    sample_vestafile_onephase._phases[0],
+                                    sample_vestafile_onephase])
+    assert sample_vestafile.nphases == 2 + 2 + 2 + 1 + 1
+    assert [sample_vestafile["TITLE", i].data[0][0] for i in range(1, 9)] \
+        == ["New structure", "Phase Two"] * 3 \
+        + [sample_vestafile_onephase.title] * 2
+    # Orientation is relative to the copy of source's phase 1.
+    assert sample_vestafile["LORIENT", 4].data[0][0] == 2
+    assert compare_vesta_strings(str(sample_vestafile["LMATRIX", 4]),
+                                 str(source["LMATRIX", 2]), prec=6)
+    # Sections are copied on write.
+    sample_vestafile.set_current_phase(3)
+    sample_vestafile.title = "Changed"
+    assert source["TITLE", 1].data[0][0] == "New structure"
+    sample_vestafile_onephase.title = "Also changed"
+    assert sample_vestafile["TITLE", 7].data[0][0] != "Also changed"
+    assert sample_vestafile["TITLE", 8].data[0][0] != "Also changed"
+
+
+def test_extend_phases_unparsed(sample_vestafile, sample_vesta_filename,
+                                tmp_path):
+    source = VestaFile(sample_vesta_filename)
+    source.set_current_phase(2)
+    source.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                 [0, 1, 0], [0, 0, 1],
+                                 False, False, 1)
+    source.save(str(tmp_path / "oriented.vesta"))
+    source = VestaFile(str(tmp_path / "oriented.vesta"))
+    sample_vestafile.extend_phases([source, source])
+    # Appended phases are only parsed when used.
+    assert not any(phase.is_parsed for phase in sample_vestafile._phases[2:])
+    assert not any(phase.is_parsed for phase in source._phases)
+    # Orientations are still relative to the copies of source's phase 1.
+    assert sample_vestafile["LORIENT", 4].data[0][0] == 2
+    assert sample_vestafile["LORIENT", 6].data[0][0] == 4
+    assert compare_vesta_strings(str(sample_vestafile["LMATRIX", 6]),
+                                 str(source["LMATRIX", 2]), prec=6)
+    assert source["LORIENT", 2].data[0][0] == 0
+
+
+def test_extend_phases_stays_lazy(sample_vesta_filename):
+    vfile = VestaFile(sample_vesta_filename)
+    source = VestaFile(sample_vesta_filename)
+    source.set_current_phase(2)
+    source.set_phase_orientation([1, 0, 0], [0, 0, 1],
+                                 [0, 1, 0], [0, 0, 1],
+                                 False, False, 1)
+    vfile.extend_phases([source, source._phases[1]])
+    # Parsed phases are copied as parsed, but nothing else is parsed.
+    assert [phase.is_parsed for phase in vfile._phases] == \
+        [False, False, True, True, True]
+    # LMATRIX is still valid, so still shared.
+    assert "LMATRIX" in vfile._phases[3]._shared
+    assert vfile["LORIENT", 4].data[0][0] == 2
+    assert compare_vesta_strings(str(vfile["LMATRIX", 4]),
+                                 str(source["LMATRIX", 2]), prec=6)
+
+
+def test_extend_phases_atom_types(sample_vestafile):
+    other = VestaFile()
+    other.add_site("Au", "Au1", 0, 0, 0)
+    other.add_site("O", "O1", 0.5, 0.5, 0.5)
+    sample_vestafile.extend_phases([other] * 3)
+    assert sample_vestafile.nphases == 5
+    symbols = [row[1] for row in sample_vestafile["ATOMT"].data[:-1]]
+    assert symbols == ["Cu", "Au", "O"]
+    assert [row[0] for row in sample_vestafile["ATOMT"].data[:-1]] == [1, 2, 3]
+    assert sample_vestafile["STRUC", 5].data[0][1] == "Au"
+
+
+def test_extend_phases_structure(sample_vestafile):
+    pymatgen = pytest.importorskip("pymatgen.core")
+    stru = pymatgen.Structure(pymatgen.Lattice.cubic(4.0), ["Na", "Cl"],
+                              [[0, 0, 0], [0.5, 0.5, 0.5]])
+    sample_vestafile.extend_phases([stru, stru])
+    assert sample_vestafile.nphases == 4
+    sample_vestafile.set_current_phase(4)
+    assert sample_vestafile.nsites == 2
+    assert [row[1] for row in sample_vestafile["ATOMT"].data[:-1]] \
+        == ["Cu", "Na", "Cl"]
+
+
+def test_new_phase_is_independent():
+    vfile = VestaFile()
+    vfile.new_phase()
+    vfile.title = "Changed"
+    vfile.set_current_phase(2)
+    assert vfile.title == "New structure"
+    assert VestaFile().title == "New structure"
@@ -6,7 +6,7 @@ import math
 
 import pytest
 
-from vestacrystparser.parser import VestaFile
+from vestacrystparser.parser import VestaFile, VestaSection
 
 from test_parser import compare_vesta_strings, DATA_DIR
 
@@ -274,6 +274,59 @@ def test_set_vector_to_site(sample_vestafile):
         "Failed to attach a vector to a site."
 
 
+def test_attach_vectors(sample_vestafile):
+    # Attach to many sites at once, interleaved with single attachments.
+    sample_vestafile.attach_vectors(2, [5, 6, 7])
+    sample_vestafile.set_vector_to_site(1, 8)
+    sample_vestafile.attach_vectors(4, range(9, 12))
+    sample_vestafile.remove_vector_from_site(2, 6)
+    sample_vestafile.attach_vectors(2, [12])
+    expected_vectr = """VECTR
+   1    0.40825    0.40825    0.40825 0
+    1   0    0    0    0
+    8   0    0    0    0
+ 0 0 0 0 0
+   2    0.40825    0.40825   -1.22474 0
+    2   0    0    0    0
+    5   0    0    0    0
+    7   0    0    0    0
+   12   0    0    0    0
+ 0 0 0 0 0
+   3   -0.40825    1.22474   -0.40825 0
+    3   0    0    0    0
+ 0 0 0 0 0
+   4    1.22474   -0.40825   -0.40825 0
+    4   0    0    0    0
+    9   0    0    0    0
+   10   0    0    0    0
+   11   0    0    0    0
+ 0 0 0 0 0
+ 0 0 0 0 0"""
+    assert compare_vesta_strings(str(sample_vestafile["VECTR"]),
+                                 expected_vectr), \
+        "Failed to attach vectors to many sites."
+    # New vector types can be attached to straight away.
+    sample_vestafile.add_vector_type(1, 0, 0, coord_type="modulus")
+    sample_vestafile.attach_vectors(5, [1, 2])
+    assert sample_vestafile["VECTR"].data[-5:] == [
+        [5, 1, 0, 0, 0], [1, 0, 0, 0, 0], [2, 0, 0, 0, 0], [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0]]
+    # Direct edits to VECTR are picked up.
+    sample_vestafile["VECTR"].data[1:2] = []
+    sample_vestafile["VECTR"].data.insert(1, [20, 0, 0, 0, 0])
+    sample_vestafile.attach_vectors(2, [13])
+    assert sample_vestafile["VECTR"].data[4:10] == [
+        [2, 0.40825, 0.40825, -1.22474, 0], [2, 0, 0, 0, 0],
+        [5, 0, 0, 0, 0], [7, 0, 0, 0, 0], [12, 0, 0, 0, 0], [13, 0, 0, 0, 0]]
+    # Invalid inputs leave VECTR alone.
+    before = str(sample_vestafile["VECTR"])
+    with pytest.raises(IndexError):
+        sample_vestafile.attach_vectors(6, [1])
+    with pytest.raises(IndexError):
+        sample_vestafile.attach_vectors(1, [1, 0])
+    assert str(sample_vestafile["VECTR"]) == before
+
+
 def test_remove_vector_from_site(sample_vestafile):
     expected_vectr = """VECTR
    1    0.40825    0.40825    0.40825 0
@@ -416,3 +469,137 @@ def test_delete_bond(sample_vestafile):
   0 0 0 0"""
     assert compare_vesta_strings(str(sample_vestafile["SBOND"]), expected_sbond), \
         "Failed to delete bond -1."
+
+
+def test_delete_sites(sample_vestafile):
+    # Delete Dy2 and the last two O's. Vector 2 is attached to site 2.
+    assert sample_vestafile.delete_sites([2, 21, -1]) == [2, 21, 22]
+    assert sample_vestafile.nsites == 19
+    structure = sample_vestafile.get_structure()
+    assert [site[0] for site in structure] == list(range(1, 20))
+    assert [site[2] for site in structure[:3]] == ['Dy1', 'Dy3', 'Dy4']
+    assert structure[-1][2] == 'O12'
+    assert len(sample_vestafile["STRUC"].data) == 2 * 19 + 1
+    theri = sample_vestafile["THERI"].data
+    assert [row[0:2] for row in theri[:3]] == [[1, 'Dy1'], [2, 'Dy3'],
+                                                [3, 'Dy4']]
+    assert theri[-1] == [0, 0, 0]
+    sitet = sample_vestafile["SITET"].data
+    assert [row[0:2] for row in sitet[:3]] == [[1, 'Dy1'], [2, 'Dy3'],
+                                                [3, 'Dy4']]
+    assert len(sitet) == 20
+    expected_vectr = """VECTR
+   1    0.40825    0.40825    0.40825 0
+    1   0    0    0    0
+ 0 0 0 0 0
+   2    0.40825    0.40825   -1.22474 0
+ 0 0 0 0 0
+   3   -0.40825    1.22474   -0.40825 0
+    2   0    0    0    0
+ 0 0 0 0 0
+   4    1.22474   -0.40825   -0.40825 0
+    3   0    0    0    0
+ 0 0 0 0 0
+ 0 0 0 0 0"""
+    assert compare_vesta_strings(str(sample_vestafile["VECTR"]),
+                                 expected_vectr)
+    # Hidden atoms are renumbered. All but the Dy sites were hidden, with
+    # O12 (at the corner) drawn 8 times.
+    assert sample_vestafile["DLATM"].data == [list(range(3, 26)) + [-1]]
+    # Lookups see the new numbering.
+    assert sample_vestafile.find_sites('Dy') == [1, 2, 3]
+    assert sample_vestafile.find_sites('Ti', xmax=0.5) == [7]
+
+
+def test_delete_sites_thermal(sample_vestafile):
+    therm = VestaSection("THERM")
+    for i, site in enumerate(sample_vestafile.get_structure(), start=1):
+        therm.data.append([i, site[2]] + [0.01 * i] * 6)
+    therm.data.append([0] * 8)
+    sample_vestafile._phases[0].append(therm, before="SITET")
+    sample_vestafile.delete_sites([1, 3])
+    rows = sample_vestafile["THERM"].data
+    assert len(rows) == 21
+    assert [row[0:3] for row in rows[:2]] == [[1, 'Dy2', 0.02],
+                                              [2, 'Dy4', 0.04]]
+    assert rows[-2][0:3] == [20, 'O14', 0.22]
+    assert rows[-1] == [0] * 8
+
+
+def test_delete_sites_hidden(sample_vestafile):
+    # Hide O12, drawn at each corner, and O13.
+    sample_vestafile["DLATM"].data = [[19, 20, 26, 27, -1]]
+    sample_vestafile.delete_sites([1, 9])
+    assert sample_vestafile["DLATM"].data == [[17, 18, 24, 25, -1]]
+    # Deleting a hidden site drops its atoms.
+    sample_vestafile.delete_sites(18)
+    assert sample_vestafile["DLATM"].data == [[17, -1]]
+    # With bonds beyond the boundary, the drawn atoms aren't known.
+    sample_vestafile.add_bond('Ti', 'O', boundary_mode=2)
+    sample_vestafile["DLATM"].data = [[1, -1]]
+    sample_vestafile.delete_sites(1)
+    assert sample_vestafile["DLATM"].data == [[-1]]
+
+
+def test_delete_sites_predicate(sample_vestafile):
+    assert sample_vestafile.delete_sites(lambda site: site[1] == 'O') == \
+        list(range(9, 23))
+    assert sample_vestafile.nsites == 8
+    assert sample_vestafile.find_sites('O') == []
+    # Nothing to delete.
+    assert sample_vestafile.delete_sites(lambda site: False) == []
+    # Errors
+    with pytest.raises(IndexError):
+        sample_vestafile.delete_sites(0)
+    with pytest.raises(IndexError):
+        sample_vestafile.delete_sites([1, 9])
+    assert sample_vestafile.nsites == 8
+
+
+def test_set_site_vectors(sample_vestafile):
+    nsites = sample_vestafile.nsites
+    # Moments along +-z on the Dy sites, a slightly noisy copy, and nothing
+    # on the other sites.
+    moments = [[0, 0, 0]] * nsites
+    moments[0] = [0, 0, 1]
+    moments[1] = [0, 0, -1]
+    moments[2] = [0, 0, 1.00001]
+    moments[3] = [0, 0, float('nan')]
+    types = sample_vestafile.set_site_vectors(moments, coord_type="modulus",
+                                              radius=0.2, g=255)
+    assert types == [5, 6, 5] + [0] * (nsites - 3)
+    assert sample_vestafile.nvectors == 6
+    assert sample_vestafile["VECTT"].data[4] == [5, 0.2, 255, 255, 0, 1]
+    assert sample_vestafile["VECTR"].data[-8:] == [
+        [5, 0.0, 0.0, 1.0, 0], [1, 0, 0, 0, 0], [3, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+        [6, 0.0, 0.0, -1.0, 0], [2, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0],
+        [0, 0, 0, 0, 0]]
+    # Subset of sites, in Cartesian coordinates.
+    types = sample_vestafile.set_site_vectors([[0, 0, 2], [0, 0, 2]],
+                                              indices=[9, 10])
+    assert types == [7, 7]
+    with pytest.raises(ValueError):
+        sample_vestafile.set_site_vectors([[0, 0, 1]])
+    with pytest.raises(ValueError):
+        sample_vestafile.set_site_vectors(moments, tol=0)
+
+
+def test_set_site_vectors_reuses_types(sample_vestafile):
+    nvectors = sample_vestafile.nvectors
+    moments = [[0, 0, 1], [0, 0, -1]]
+    types = sample_vestafile.set_site_vectors(moments, coord_type="uvw",
+                                              indices=[1, 2])
+    assert types == [nvectors + 1, nvectors + 2]
+    # Same vectors and formatting, on other sites: no new types.
+    assert sample_vestafile.set_site_vectors(
+        moments, coord_type="uvw", indices=[3, 4]) == types
+    assert sample_vestafile.nvectors == nvectors + 2
+    start, end = sample_vestafile._find_vector_block(types[0])
+    assert [row[0] for row in
+            sample_vestafile["VECTR"].data[start + 1:end]] == [1, 3]
+    # Different formatting makes a new type.
+    assert sample_vestafile.set_site_vectors(
+        moments[:1], coord_type="uvw", indices=[5], radius=0.2) \
+        == [nvectors + 3]
@@ -0,0 +1,141 @@
+"""
+Unit tests for the LAMMPS dump and extended XYZ trajectory readers
+"""
+import io
+
+import pytest
+
+from vestacrystparser.convert import vesta_frames_from_lammps, \
+    vesta_frames_from_extxyz
+from vestacrystparser.trajectory import iter_lammps_dump, iter_extxyz
+
+
+LAMMPS_DUMP = """ITEM: TIMESTEP
+0
+ITEM: NUMBER OF ATOMS
+2
+ITEM: BOX BOUNDS pp pp pp
+0.0 4.0
+0.0 4.0
+1.0 5.0
+ITEM: ATOMS id type x y z q vx vy vz
+2 2 2.0 2.0 3.0 -1.0 0.0 0.0 0.0
+1 1 0.0 0.0 1.0 1.0 0.5 0.0 0.0
+ITEM: TIMESTEP
+100
+ITEM: NUMBER OF ATOMS
+2
+ITEM: BOX BOUNDS pp pp pp
+0.0 4.0
+0.0 4.0
+1.0 5.0
+ITEM: ATOMS id type x y z q vx vy vz
+1 1 0.4 0.0 1.0 0.5 0.5 0.0 0.0
+2 2 2.0 2.0 3.0 -0.5 0.0 0.0 0.0
+"""
+
+
+def test_iter_lammps_dump():
+    frames = list(iter_lammps_dump(io.StringIO(LAMMPS_DUMP), ["Na", "Cl"]))
+    assert [timestep for timestep, _, _ in frames] == [0, 100]
+    _, pos, properties = frames[0]
+    # Sorted by id, relative to the box origin.
+    assert pos.species == ["Na", "Cl"]
+    assert pos.frac_coords == [[0, 0, 0], [0.5, 0.5, 0.5]]
+    assert pos.abc == pytest.approx((4, 4, 4))
+    assert properties["q"] == [1.0, -1.0]
+    assert properties["type"] == [1, 2]
+    frames = list(iter_lammps_dump(io.StringIO(LAMMPS_DUMP), {1: "Na",
+                                                              2: "Cl"},
+                                   stride=2))
+    assert len(frames) == 1
+    with pytest.raises(ValueError):
+        next(iter_lammps_dump(io.StringIO(LAMMPS_DUMP)))
+    # dump_modify units yes, time yes
+    text = "ITEM: UNITS\nmetal\nITEM: TIME\n0.5\n" + LAMMPS_DUMP
+    frames = list(iter_lammps_dump(io.StringIO(text), ["Na", "Cl"]))
+    assert [timestep for timestep, _, _ in frames] == [0, 100]
+
+
+def test_lammps_triclinic():
+    text = """ITEM: TIMESTEP
+0
+ITEM: NUMBER OF ATOMS
+1
+ITEM: BOX BOUNDS xy xz yz pp pp pp
+0.0 6.0 2.0
+0.0 4.0 0.0
+0.0 4.0 0.0
+ITEM: ATOMS element xs ys zs
+Si 0.5 0.5 0.5
+"""
+    _, pos, _ = next(iter_lammps_dump(io.StringIO(text)))
+    assert pos.lattice == [[4, 0, 0], [2, 4, 0], [0, 0, 4]]
+    assert pos.species == ["Si"]
+    assert pos.frac_coords == [[0.5, 0.5, 0.5]]
+
+
+def test_vesta_frames_from_lammps(tmp_path):
+    fname = tmp_path / "dump.lammpstrj"
+    with open(fname, "w") as f:
+        f.write(LAMMPS_DUMP)
+    frames = list(vesta_frames_from_lammps(
+        str(fname), ["Na", "Cl"], color_by="q", vmin=-1, vmax=1,
+        vectors=("vx", "vy", "vz"), vector_scale=2,
+        output=str(tmp_path / "{}.vesta")))
+    assert len(frames) == 2
+    assert frames[1]["STRUC"].data[0][4:7] == pytest.approx([0.1, 0, 0])
+    # Coloured from blue (q=-1) to red (q=1).
+    assert frames[0]["SITET"].data[0][3:6] == [255, 0, 0]
+    assert frames[1]["SITET"].data[1][3:6] != frames[0]["SITET"].data[1][3:6]
+    # Vector of length 1 along a, on the Na site only.
+    assert frames[0].nvectors == 1
+    assert frames[0]["VECTR"].data[0][1:4] == pytest.approx([1, 0, 0])
+    assert (tmp_path / "100.vesta").exists()
+    # Hidden objects, untouched, are still shared between frames.
+    sections = [frame._phases[0]._sections for frame in frames]
+    assert sections[0]["DLATM"] is sections[1]["DLATM"]
+    assert sections[0]["DLPLY"] is sections[1]["DLPLY"]
+
+
+def test_iter_extxyz():
+    text = """2
+Lattice="4.0 0.0 0.0 0.0 4.0 0.0 0.0 0.0 4.0" Properties=species:S:1:pos:R:3:forces:R:3:fixed:L:1 energy=-3.5 pbc="T T T"
+Na 0.0 0.0 0.0 0.1 0.0 0.0 T
+Cl 2.0 2.0 2.0 -0.1 0.0 0.0 F
+3
+water
+O 0.0 0.0 0.0
+H 0.96 0.0 0.0
+H -0.24 0.93 0.0
+"""
+    frames = list(iter_extxyz(io.StringIO(text)))
+    assert len(frames) == 2
+    number, pos, properties = frames[0]
+    assert number == 0
+    assert pos.species == ["Na", "Cl"]
+    assert pos.frac_coords == [[0, 0, 0], [0.5, 0.5, 0.5]]
+    assert properties["forces"] == [[0.1, 0, 0], [-0.1, 0, 0]]
+    assert properties["fixed"] == [True, False]
+    # Plain XYZ gets a box around the atoms.
+    number, pos, properties = frames[1]
+    assert number == 1
+    assert pos.title == "water"
+    assert pos.abc == pytest.approx((11.2, 10.93, 10))
+    assert properties == {}
+    assert len(list(iter_extxyz(io.StringIO(text), stride=2))) == 1
+
+
+def test_vesta_frames_from_extxyz(tmp_path):
+    fname = tmp_path / "md.xyz"
+    with open(fname, "w") as f:
+        for x in [0.0, 0.4]:
+            f.write('2\nLattice="4 0 0 0 4 0 0 0 4" '
+                    'Properties=species:S:1:pos:R:3:forces:R:3\n'
+                    f'Na {x} 0 0 1 0 0\nCl 2 2 2 0 0 0\n')
+    frames = list(vesta_frames_from_extxyz(str(fname), vectors="forces"))
+    assert [frame["STRUC"].data[0][4] for frame in frames] == \
+        pytest.approx([0, 0.1])
+    assert frames[1].nvectors == 1
+    with pytest.raises(KeyError):
+        next(vesta_frames_from_extxyz(str(fname), color_by="charges"))
@@ -1,7 +1,10 @@
+import io
+
 import pytest
 
 from vestacrystparser.utilities import invert_matrix, matmul, transpose, \
-    vector_dot, vector_cross, unit_vector, parallel_vectors
+    vector_dot, vector_cross, unit_vector, parallel_vectors, \
+    cartesian_to_fractional, RecordedLines
 
 from utils import compare_matrices
 
@@ -58,3 +61,17 @@ def test_parallel_vectors():
     assert parallel_vectors([1, 1, 0], [2, 2, 0]) is True
     assert parallel_vectors([0, 0, 1], [0, 0, -1]) is True
     assert parallel_vectors([1, 0, 1], [1, 1, 0]) is False
+
+
+def test_cartesian_to_fractional():
+    lattice = [[2, 0, 0], [1, 2, 0], [0, 0, 4]]
+    coords = [[0, 0, 0], [1.5, 1, 2], [3, 2, 4]]
+    assert compare_matrices(cartesian_to_fractional(coords, lattice),
+                            [[0, 0, 0], [0.5, 0.5, 0.5], [1, 1, 1]])
+
+
+def test_recorded_lines():
+    lines = RecordedLines(io.StringIO("a\nb\nc\n"))
+    assert lines.readline() == "a\n"
+    assert lines.readline() == "b\n"
+    assert lines.lines == ["a\n", "b\n"]
@@ -0,0 +1,118 @@
+"""
+Unit tests for the native VASP readers
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+import pytest
+
+from vestacrystparser.vasp import open_text, read_poscar, read_grid_shape, \
+    is_compressed, uncompressed_name, compressed_source, decompress_file, \
+    read_potcar_species
+
+from test_parser import DATA_DIR
+
+
+@pytest.fixture
+def chgcar_filename() -> str:
+    return os.path.join(DATA_DIR, "CHGCAR_PbSe.vasp.gz")
+
+
+def test_read_poscar_chgcar(chgcar_filename):
+    with open_text(chgcar_filename) as f:
+        pos = read_poscar(f)
+        assert read_grid_shape(f) == (48, 48, 252)
+        # Left at the start of the data.
+        assert f.readline().split()[0] == "-.10817525054E+03"
+    assert pos.title == "PbSe"
+    assert pos.species == ["Pb", "Se"]
+    assert pos.frac_coords == [[0.5, 0.5, 0], [0, 0, 0]]
+    assert pos.abc == pytest.approx((4.226199, 4.226199, 21.678814))
+    assert pos.angles == pytest.approx((90, 90, 90))
+    assert pos.volume == pytest.approx(4.226199**2 * 21.678814)
+
+
+def test_read_poscar_cartesian():
+    text = """Test
+-64.0
+2 0 0
+0 2 0
+0 0 2
+Fe_pv O
+1 1
+Selective dynamics
+Cartesian
+0 0 0 T T T
+2 2 1 F F F
+"""
+    pos = read_poscar(io.StringIO(text))
+    # Volume 64 means scaling by 2.
+    assert pos.lattice == [[4, 0, 0], [0, 4, 0], [0, 0, 4]]
+    assert pos.species == ["Fe", "O"]
+    assert pos.frac_coords == [pytest.approx([0, 0, 0]),
+                               pytest.approx([1, 1, 0.5])]
+
+
+def test_read_poscar_vasp4():
+    text = """Ga As
+5.65
+0 0.5 0.5
+0.5 0 0.5
+0.5 0.5 0
+1 1
+Direct
+0 0 0
+0.25 0.25 0.25
+velocities follow
+"""
+    f = io.StringIO(text)
+    pos = read_poscar(f)
+    assert pos.species == ["Ga", "As"]
+    assert pos.frac_coords == [[0, 0, 0], [0.25, 0.25, 0.25]]
+    assert pos.lattice[0] == [0, 2.825, 2.825]
+    # Left after the coordinates.
+    assert f.readline() == "velocities follow\n"
+    # Explicit symbols take priority.
+    pos = read_poscar(io.StringIO(text), species=["Al", "P"])
+    assert pos.species == ["Al", "P"]
+    # No symbols anywhere.
+    with pytest.raises(ValueError):
+        read_poscar(io.StringIO("Gallium arsenide" + text[5:]))
+
+
+def test_read_potcar_species(tmp_path):
+    with gzip.open(tmp_path / "POTCAR.gz", "wt") as f:
+        f.write("  PAW_PBE Fe_pv 06Sep2000\n"
+                "   TITEL  = PAW_PBE Fe_pv 06Sep2000\n"
+                "  End of Dataset\n   TITEL  = PAW O 08Apr2002\n")
+    assert read_potcar_species(str(tmp_path / "POTCAR.gz")) == ["Fe", "O"]
+
+
+@pytest.mark.parametrize("module,suffix", [(gzip, ".gz"), (bz2, ".bz2"),
+                                           (lzma, ".xz"), (None, "")])
+def test_compressed(tmp_path, module, suffix):
+    text = "Hello\nworld\n"
+    # Compression is recognised by content, not name.
+    fname = str(tmp_path / "file")
+    if module is None:
+        with open(fname, "w") as f:
+            f.write(text)
+    else:
+        with module.open(fname, "wt") as f:
+            f.write(text)
+    assert is_compressed(fname) == (module is not None)
+    with open_text(fname) as f:
+        assert f.read() == text
+    if module is not None:
+        assert uncompressed_name(fname) == fname + ".uncompressed"
+        assert compressed_source(fname + ".uncompressed") == fname
+        os.rename(fname, fname + suffix)
+        assert uncompressed_name(fname + suffix) == fname
+        assert compressed_source(fname) == fname + suffix
+        assert decompress_file(fname + suffix) == fname
+        with open(fname) as f:
+            assert f.read() == text
+    assert compressed_source(fname + ".uncompressed") is None
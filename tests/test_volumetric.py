@@ -71,6 +71,18 @@ def test_add_isosurface(sample_vestafile):
   0   0   0   0"""
     assert compare_vesta_strings(str(sample_vestafile["ISURF"]), expected_isurf, prec=1e-6), \
         "Adding custom isosurface didn't work as expected"
+    # Several levels at once
+    sample_vestafile.add_isosurface([0.2, 0.3], mode=1)
+    expected_isurf = """ISURF
+  1   0  0.0321249 255 255   0 127 255
+  2   0  0.1234000 255 255   0 127 255
+  3   2  0.5432100 100 110 120 150  80
+  4   1  0.2000000 255 255   0 127 255
+  5   1  0.3000000 255 255   0 127 255
+  0   0   0   0"""
+    assert compare_vesta_strings(str(sample_vestafile["ISURF"]),
+                                 expected_isurf, prec=1e-6), \
+        "Adding multiple isosurfaces didn't work as expected"
 
 
 def test_delete_isosurface(sample_vestafile):
@@ -0,0 +1,213 @@
+"""
+Unit tests for streaming volumetric statistics
+"""
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+
+from vestacrystparser.volumetric import VolumetricStats, iter_grid_chunks, \
+    grid_stats, array_stats, LogHistogram, read_stats_cache, \
+    write_stats_cache, parallel_grid_stats, parallel_stream_stats, \
+    write_preview
+from vestacrystparser.vasp import open_text, read_poscar, read_grid_shape
+
+
+@pytest.fixture
+def values() -> np.ndarray:
+    rng = np.random.default_rng(42)
+    return rng.normal(1.0, 3.0, 1003)
+
+
+def grid_text(values, per_line=5) -> str:
+    lines = []
+    for i in range(0, len(values), per_line):
+        lines.append(" ".join(f"{x: .11E}" for x in values[i:i+per_line]))
+    return "\n".join(lines) + "\nafter\n"
+
+
+def test_stats_update(values):
+    stats = VolumetricStats()
+    for i in range(0, len(values), 100):
+        stats.update(values[i:i+100])
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(np.abs(values).mean())
+    assert stats.std == pytest.approx(np.abs(values).std())
+    assert stats.min == values.min()
+    assert stats.max == values.max()
+    assert stats.isosurface_level(2) == \
+        pytest.approx(np.abs(values).mean() + 2 * np.abs(values).std())
+
+
+def test_stats_merge_and_scale(values):
+    first = VolumetricStats()
+    first.update(values[:10])
+    second = VolumetricStats()
+    second.update(values[10:])
+    first.merge(second)
+    first.merge(VolumetricStats())
+    assert first.std == pytest.approx(np.abs(values).std())
+    scaled = first.scaled(-0.5)
+    assert scaled.mean == pytest.approx(np.abs(values).mean() / 2)
+    assert scaled.std == pytest.approx(np.abs(values).std() / 2)
+    assert scaled.min == pytest.approx(-0.5 * values.max())
+    assert scaled.max == pytest.approx(-0.5 * values.min())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 2**20])
+def test_iter_grid_chunks(values, chunk_size):
+    f = io.StringIO(grid_text(values))
+    chunks = list(iter_grid_chunks(f, len(values), chunk_size))
+    assert np.allclose(np.concatenate(chunks), values)
+    assert f.readline() == "after\n"
+
+
+def test_grid_stats_truncated(values):
+    f = io.StringIO(grid_text(values[:500]))
+    with pytest.raises(ValueError):
+        grid_stats(f, len(values) + 100)
+
+
+def test_array_stats(values):
+    grid = values[:1000].reshape(10, 10, 10)
+    stats = array_stats(grid, chunk_size=33)
+    assert stats.count == 1000
+    assert stats.mean == pytest.approx(np.abs(grid).mean())
+    assert stats.std == pytest.approx(np.abs(grid).std())
+    assert stats.min == grid.min()
+    # Non-contiguous arrays work too.
+    stats = array_stats(grid.transpose(), chunk_size=33)
+    assert stats.std == pytest.approx(np.abs(grid).std())
+
+
+def test_histogram(values):
+    stats = VolumetricStats()
+    stats.update(values[:500])
+    other = VolumetricStats()
+    other.update(values[500:])
+    other.update([0.0, np.nan])
+    stats.merge(other)
+    hist = stats.histogram
+    assert hist.count == len(values) + 1
+    # Zero goes in the underflow bin.
+    assert hist.counts[0] == 1
+    # Each value is in the right bin.
+    edges = 10.0 ** (LogHistogram.LOG_MIN
+                     + np.arange(LogHistogram.NBINS - 1)
+                     / LogHistogram.PER_DECADE)
+    expected = np.histogram(np.abs(values), np.concatenate([[0], edges,
+                                                            [np.inf]]))[0]
+    assert np.array_equal(hist.counts, expected + np.eye(len(expected),
+                                                         dtype=int)[0])
+
+
+def test_stats_dict_roundtrip(values):
+    stats = VolumetricStats()
+    stats.update(values)
+    stats.shape = (17, 59, 1)
+    new = VolumetricStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+    assert new.to_dict() == stats.to_dict()
+    assert new.shape == (17, 59, 1)
+    assert np.array_equal(new.histogram.counts, stats.histogram.counts)
+
+
+def test_stats_cache(tmp_path, values):
+    fname = tmp_path / "CHGCAR"
+    fname.write_text("data")
+    assert read_stats_cache(fname) is None
+    stats = VolumetricStats()
+    stats.update(values)
+    write_stats_cache(fname, {"total": stats})
+    cached = read_stats_cache(fname)
+    assert cached["total"].to_dict() == stats.to_dict()
+    assert sorted(os.listdir(tmp_path)) == ["CHGCAR", "CHGCAR.vstats.json"]
+    # Changing the file invalidates the cache.
+    fname.write_text("other")
+    assert read_stats_cache(fname) is None
+
+
+@pytest.mark.parametrize("percentile", [0, 1, 25, 50, 90, 99.9, 100])
+def test_percentile_level(percentile):
+    # Need enough values to fill the histogram well.
+    values = np.random.default_rng(7).normal(1.0, 3.0, 200000)
+    stats = VolumetricStats()
+    for i in range(0, len(values), 30000):
+        stats.update(values[i:i+30000])
+    expected = np.percentile(np.abs(values), percentile)
+    # Within the width of a histogram bin.
+    tolerance = 10 ** (1 / LogHistogram.PER_DECADE) - 1
+    assert stats.percentile_level(percentile) == \
+        pytest.approx(expected, rel=tolerance)
+    assert stats.volume_fraction_level(1 - percentile / 100) == \
+        pytest.approx(stats.percentile_level(percentile))
+    # Scaling carries through.
+    assert stats.scaled(-3).percentile_level(percentile) == \
+        pytest.approx(3 * stats.percentile_level(percentile))
+    with pytest.raises(ValueError):
+        stats.percentile_level(101)
+
+
+@pytest.mark.parametrize("count", [1000, 1003])
+def test_parallel_grid_stats(tmp_path, values, count):
+    fname = tmp_path / "grid"
+    text = "header\n" + grid_text(values[:count])
+    fname.write_text(text)
+    expected = grid_stats(io.StringIO(grid_text(values[:count])), count)
+    stats = parallel_grid_stats(fname, len("header\n"), count, workers=2,
+                                chunk_size=64)
+    assert stats.count == count
+    assert stats.mean == pytest.approx(expected.mean)
+    assert stats.std == pytest.approx(expected.std)
+    assert stats.max == expected.max
+    assert np.array_equal(stats.histogram.counts, expected.histogram.counts)
+    stats = parallel_stream_stats(io.StringIO(grid_text(values[:count])),
+                                  count, workers=2, chunk_size=64)
+    assert stats.std == pytest.approx(expected.std)
+    # Ragged lines can't be split.
+    fname.write_text("header\n1 2 3\n4 5\n6 7 8\n9\n")
+    with pytest.raises(ValueError):
+        parallel_grid_stats(fname, len("header\n"), 9, workers=2, chunk_size=3)
+
+
+def load_grid(fname) -> np.ndarray:
+    with open_text(fname) as f:
+        read_poscar(f)
+        shape = read_grid_shape(f)
+        values = np.concatenate(list(iter_grid_chunks(f, np.prod(shape))))
+    return values.reshape(shape[::-1])
+
+
+@pytest.mark.parametrize("factor", [2, 3, 4])
+def test_write_preview(tmp_path, factor):
+    fname = str(tmp_path / "CHGCAR")
+    rng = np.random.default_rng(3)
+    shape = (12, 24, 36)
+    grid = rng.normal(size=shape[::-1])
+    with open(fname, "w") as f:
+        f.write("Test\n1.0\n1 0 0\n0 1 0\n0 0 2\nH\n1\nDirect\n0 0 0\n\n")
+        f.write(" ".join(str(x) for x in shape) + "\n")
+        f.write(grid_text(grid.reshape(-1), per_line=5).replace("after\n", ""))
+    # Stride
+    preview = write_preview(fname, factor, "stride")
+    assert preview == fname + f"_preview{factor}.vasp"
+    assert np.allclose(load_grid(preview), grid[::factor, ::factor, ::factor])
+    with open(preview) as f:
+        assert read_poscar(f).title == "Test"
+    # Average: compare to a periodic box filter.
+    half = factor // 2
+    weights = np.ones(2 * half + 1)
+    if factor % 2 == 0:
+        weights[[0, -1]] = 0.5
+    weights /= factor
+    expected = grid
+    for axis in range(3):
+        expected = sum(w * np.roll(expected, -o, axis=axis)
+                       for o, w in zip(range(-half, half + 1), weights))
+    preview = write_preview(fname, factor, destination=fname + "_avg")
+    averaged = load_grid(preview)
+    assert np.allclose(averaged, expected[::factor, ::factor, ::factor])
+    assert averaged.mean() == pytest.approx(grid.mean())
+    with pytest.raises(ValueError):
+        write_preview(fname, 5)
@@ -3,56 +3,432 @@
 """Create VESTA files from structural data files (POSCAR, etc.).
 """
 
-import numpy as np
+import fnmatch
+import glob
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Callable, Iterator, Union
 
-from pymatgen.core import Structure
-from pymatgen.io.vasp.inputs import Poscar
-from pymatgen.io.common import VolumetricData
-from pymatgen.io.vasp.outputs import Chgcar
+try:
+    from pymatgen.core import Structure
+    from pymatgen.io.vasp.inputs import Poscar
+    from pymatgen.io.common import VolumetricData
+    from pymatgen.io.vasp.outputs import Chgcar
+except ImportError:
+    # pymatgen is optional. Only some functions need it.
+    Structure = Poscar = VolumetricData = Chgcar = None
 
 from vestacrystparser.parser import VestaFile
+from vestacrystparser.utilities import cartesian_to_fractional
+from vestacrystparser.vasp import open_text, read_poscar, read_grid_shape, \
+    PoscarData, is_compressed, read_volumetric_header, uncompressed_name, \
+    decompress_file, compressed_source, COMPRESSED_SUFFIXES, \
+    UNCOMPRESSED_SUFFIX, read_potcar_species, iter_xdatcar, iter_vasprun
+try:
+    from vestacrystparser.volumetric import VolumetricStats, grid_stats, \
+        array_stats, read_stats_cache, write_stats_cache, \
+        parallel_grid_stats, parallel_stream_stats, write_preview, \
+        preview_name, combined_stats, A2B, spin_stats, derived_name, \
+        GridFile, grid_format
+except ImportError:
+    # numpy is optional. Only the volumetric functions need it.
+    VolumetricStats = grid_stats = array_stats = read_stats_cache = \
+        write_stats_cache = parallel_grid_stats = parallel_stream_stats = \
+        write_preview = preview_name = combined_stats = A2B = spin_stats = \
+        derived_name = GridFile = grid_format = None
 
+logger = logging.getLogger(__name__)
 
-def vesta_from_structure(stru: Structure) -> VestaFile:
-    """Return a VestaFile from pymatgen.core.Structure"""
-    # TODO Convert numpy floats to regular floats.
+
+def _require_pymatgen():
+    """Raise ImportError if pymatgen is not installed."""
+    if Structure is None:
+        raise ImportError("This function requires pymatgen. "
+                          "Install with "
+                          "pip install vestacrystparser[pymatgen]")
+
+
+def _require_numpy():
+    """Raise ImportError if numpy is not installed."""
+    if VolumetricStats is None:
+        raise ImportError("This function requires numpy. Install with "
+                          "pip install vestacrystparser[volumetric]")
+
+
+def _vesta_from_sites(abc: list[float], angles: list[float],
+                      species: list[str], frac_coords: list[list[float]]) \
+        -> VestaFile:
+    """Return a VestaFile with the given cell and sites, and default bonds.
+
+    Args:
+        abc: Lattice vector lengths (Angstrom).
+        angles: Lattice angles (degrees).
+        species: Element symbol of each site.
+        frac_coords: Fractional coordinates of each site.
+    """
     # Initialise an empty Vesta file
     vfile = VestaFile()
     # Set the lattice parameters.
-    vfile.set_cell(*stru.lattice.abc, *stru.lattice.angles)
+    vfile.set_cell(*abc, *angles)
     # Add the sites
     counts = {}
-    for site in stru:
-        element = site.specie.symbol
+    sites = []
+    for element, coords in zip(species, frac_coords):
         # When loading POSCAR, site labels in VESTA are numbered.
         if element in counts:
             counts[element] += 1
         else:
             counts[element] = 1
-        vfile.add_site(element, element+str(counts[element]),
-                       *site.frac_coords,
-                       add_bonds=True)
+        sites.append((element, element+str(counts[element]), *coords))
+    vfile.add_sites(sites, add_bonds=True)
     # Sort SBOND
     vfile.sort_bonds()
     # Done
     return vfile
 
 
-def vesta_from_poscar(fname: str) -> VestaFile:
-    """Return a VestaFile from a POSCAR file at fname"""
-    # Load the POSCAR
-    pos = Poscar.from_file(fname)
-    # Create a VestaFile from the structure
-    vfile = vesta_from_structure(pos.structure)
-    # Set the title
-    vfile.title = pos.comment
+def vesta_from_structure(stru: "Structure") -> VestaFile:
+    """Return a VestaFile from pymatgen.core.Structure"""
+    # TODO Convert numpy floats to regular floats.
+    return _vesta_from_sites(stru.lattice.abc, stru.lattice.angles,
+                             [site.specie.symbol for site in stru],
+                             [site.frac_coords for site in stru])
+
+
+def _vesta_from_poscar_data(pos: PoscarData) -> VestaFile:
+    """Return a VestaFile from a natively-read POSCAR."""
+    vfile = _vesta_from_sites(pos.abc, pos.angles, pos.species,
+                              pos.frac_coords)
+    vfile.title = pos.title
     return vfile
 
+
+def _read_poscar_file(fname: str) -> PoscarData:
+    """Read a POSCAR natively, taking element symbols from a POTCAR in the
+    same directory if needed."""
+    with open_text(fname) as f:
+        try:
+            return read_poscar(f)
+        except ValueError:
+            potcar = os.path.join(os.path.dirname(fname), "POTCAR")
+            if not os.path.exists(potcar):
+                raise
+    with open_text(fname) as f:
+        return read_poscar(f, read_potcar_species(potcar))
+
+
+def vesta_from_poscar(fname: str) -> VestaFile:
+    """Return a VestaFile from a POSCAR (or CONTCAR) file at fname.
+
+    The file is read natively (compressed or not), so pymatgen is not
+    needed. See :func:`vestacrystparser.vasp.read_poscar` for the formats
+    supported. VASP 4 files without element symbols in the comment line take
+    them from a POTCAR next to the file, if there is one.
+    If the file still can't be read, falls back to pymatgen, if installed.
+    """
+    try:
+        pos = _read_poscar_file(fname)
+    except ValueError:
+        if Poscar is None:
+            raise
+        # Load the POSCAR
+        pos = Poscar.from_file(fname)
+        # Create a VestaFile from the structure
+        vfile = vesta_from_structure(pos.structure)
+        # Set the title
+        vfile.title = pos.comment
+        return vfile
+    return _vesta_from_poscar_data(pos)
+
+
+def vesta_frames_from_xdatcar(fname: str,
+                              template: Union[VestaFile, str, None] = None,
+                              stride: int = 1,
+                              output: Union[str, None] = None) \
+        -> Iterator[VestaFile]:
+    """Yield a VestaFile for each frame of a VASP XDATCAR.
+
+    The XDATCAR is read one frame at a time (compressed or not), so long
+    trajectories never need to fit in memory.
+
+    The first frame is converted as in :func:`vesta_from_poscar` (or taken
+    from `template`), and every frame shares all of its sections except
+    :ref:`STRUC` (and :ref:`CELLP` for variable-cell runs), which are
+    copied only when accessed (see :meth:`VestaFile.copy`), so making a
+    frame is cheap. The template is copied when the first frame is read, so
+    it must be fully styled before iterating; changing it afterwards does
+    not affect the frames. To restyle every frame, change the frames
+    themselves.
+
+    Args:
+        fname: Filename of the XDATCAR.
+        template: VestaFile (or path to VESTA file) to base every frame on,
+            with the same sites in the same order as the XDATCAR. Not
+            modified. Style it before iterating.
+        stride: Only convert every `stride`-th frame, starting with the
+            first.
+        output: If given, write each frame as it is made, to this filename
+            formatted with the configuration number, e.g.
+            "frames/frame_{:06d}.vesta".
+
+    Yields:
+        A VestaFile for each frame.
+
+    Raises:
+        ValueError: `template` has a different number of sites.
+    """
+    with open_text(fname) as f:
+        yield from _vesta_frames(
+            ((number, pos, {}) for number, pos in iter_xdatcar(f, stride)),
+            template, output)
+
+
+def _vesta_frames(frames: Iterator[tuple[int, PoscarData, dict[str, list]]],
+                  template: Union[VestaFile, str, None] = None,
+                  output: Union[str, None] = None,
+                  vectors: Union[str, tuple[str, str, str], None] = None,
+                  vector_scale: float = 1.0,
+                  color_by: Union[str, None] = None,
+                  colormap: Union[str, list, Callable] = "B-W-R",
+                  vmin: Union[float, None] = None,
+                  vmax: Union[float, None] = None) -> Iterator[VestaFile]:
+    """Yield a VestaFile for each (number, structure, per-atom properties)
+    of a trajectory, sharing sections with the first.
+
+    See :func:`vesta_frames_from_lammps` for the arguments.
+    """
+    if isinstance(template, (str, os.PathLike)):
+        template = VestaFile(template)
+    base = None
+    for number, pos, properties in frames:
+        cell = [*pos.abc, *pos.angles]
+        if base is None:
+            if template is None:
+                base = _vesta_from_poscar_data(pos)
+            else:
+                if template.nsites != len(pos):
+                    raise ValueError(
+                        f"Template has {template.nsites} sites, but "
+                        f"the trajectory has {len(pos)}.")
+                base = template.copy(shared=True)
+            base_cell = base.get_cell()
+        frame = base.copy(shared=True)
+        frame.set_site_coordinates(pos.frac_coords)
+        if cell != base_cell:
+            frame.set_cell(*cell)
+        if vectors is not None:
+            if isinstance(vectors, str):
+                values = properties[vectors]
+            else:
+                values = zip(*(properties[name] for name in vectors))
+            # In lattice vector notation, which doesn't depend on how the
+            # cell is oriented.
+            frame.set_site_vectors(
+                cartesian_to_fractional(
+                    [[x * vector_scale for x in v] for v in values],
+                    pos.lattice),
+                coord_type="uvw")
+        if color_by is not None:
+            frame.color_sites_by(properties[color_by], colormap, vmin, vmax)
+        if output is not None:
+            frame.save(output.format(number))
+        yield frame
+
+
+def vesta_frames_from_vasprun(fname: str,
+                              steps: Union[slice, list[int], None] = None,
+                              forces: bool = False,
+                              force_scale: float = 1.0,
+                              template: Union[VestaFile, str, None] = None,
+                              output: Union[str, None] = None) \
+        -> Iterator[VestaFile]:
+    """Yield a VestaFile for each ionic step of a vasprun.xml.
+
+    The XML is parsed incrementally, keeping only the structures (see
+    :func:`vestacrystparser.vasp.iter_vasprun`), so huge files with
+    eigenvalues and DOS are fine, and pymatgen is not needed.
+    Frames share sections as in :func:`vesta_frames_from_xdatcar`.
+
+    Args:
+        fname: Filename of the vasprun.xml (may be compressed).
+        steps: Which ionic steps (0-based) to convert. Either a slice (with
+            non-negative bounds, e.g. ``slice(0, None, 10)``) or a list of
+            step indices. Defaults to all.
+        forces: Attach the force on each atom as a vector (one vector type
+            per distinct force).
+        force_scale: Length of the vectors (Angstrom) per eV/Angstrom of
+            force.
+        template: VestaFile (or path to VESTA file) to base every frame on,
+            as in :func:`vesta_frames_from_xdatcar`.
+        output: If given, write each frame as it is made, to this filename
+            formatted with the step index, e.g. "relax/step_{:04d}.vesta".
+
+    Yields:
+        A VestaFile for each step.
+    """
+    with open_text(fname) as f:
+        frames = iter_vasprun(f, steps, forces)
+        yield from _vesta_frames(
+            ((step, pos, {"forces": values}) for step, pos, values in frames),
+            template, output, "forces" if forces else None, force_scale)
+
+
+def vesta_frames_from_lammps(fname: str,
+                             type_map: Union[dict[int, str], list[str], None]
+                             = None,
+                             template: Union[VestaFile, str, None] = None,
+                             stride: int = 1,
+                             color_by: Union[str, None] = None,
+                             colormap: Union[str, list, Callable] = "B-W-R",
+                             vmin: Union[float, None] = None,
+                             vmax: Union[float, None] = None,
+                             vectors: Union[tuple[str, str, str], None] = None,
+                             vector_scale: float = 1.0,
+                             output: Union[str, None] = None) \
+        -> Iterator[VestaFile]:
+    """Yield a VestaFile for each frame of a LAMMPS text dump file.
+
+    The dump is read one frame at a time (compressed or not), see
+    :func:`vestacrystparser.trajectory.iter_lammps_dump`. The first frame is
+    converted with :meth:`VestaFile.add_sites` (or taken from `template`),
+    and frames share sections as in :func:`vesta_frames_from_xdatcar`.
+
+    Args:
+        fname: Filename of the dump.
+        type_map: Element symbol of each atom type, as a dict from type or a
+            list (type 1 first). Not needed if the dump has an element
+            column.
+        template: VestaFile (or path to VESTA file) to base every frame on,
+            with the same atoms, sorted by id.
+        stride: Only convert every `stride`-th frame, starting with the
+            first.
+        color_by: Per-atom column to colour sites by (e.g. "q"), with
+            :meth:`VestaFile.color_sites_by`.
+        colormap: Colour map for `color_by`.
+        vmin, vmax: Values at either end of the colour map. Default to the
+            range of each frame, so set them for consistent colours across
+            frames.
+        vectors: Names of three per-atom columns of Cartesian components to
+            attach as vectors, e.g. ("vx", "vy", "vz").
+        vector_scale: Length of vectors (Angstrom) per unit of the columns.
+        output: If given, write each frame as it is made, to this filename
+            formatted with the timestep, e.g. "frames/{:08d}.vesta".
+
+    Yields:
+        A VestaFile for each frame.
+
+    Raises:
+        ValueError: `template` has a different number of sites, or the
+            dump is malformed.
+        KeyError: A column asked for is not in the dump.
+    """
+    from vestacrystparser.trajectory import iter_lammps_dump
+    with open_text(fname) as f:
+        yield from _vesta_frames(iter_lammps_dump(f, type_map, stride),
+                                 template, output, vectors, vector_scale,
+                                 color_by, colormap, vmin, vmax)
+
+
+def vesta_frames_from_extxyz(fname: str,
+                             template: Union[VestaFile, str, None] = None,
+                             stride: int = 1,
+                             color_by: Union[str, None] = None,
+                             colormap: Union[str, list, Callable] = "B-W-R",
+                             vmin: Union[float, None] = None,
+                             vmax: Union[float, None] = None,
+                             vectors: Union[str, tuple[str, str, str], None]
+                             = None,
+                             vector_scale: float = 1.0,
+                             output: Union[str, None] = None) \
+        -> Iterator[VestaFile]:
+    """Yield a VestaFile for each frame of an extended XYZ file.
+
+    The file is read one frame at a time (compressed or not), see
+    :func:`vestacrystparser.trajectory.iter_extxyz`. Frames share sections
+    as in :func:`vesta_frames_from_xdatcar`.
+
+    Args:
+        fname: Filename of the extended XYZ file.
+        template: VestaFile (or path to VESTA file) to base every frame on,
+            with the same atoms in the same order.
+        stride: Only convert every `stride`-th frame, starting with the
+            first.
+        color_by: Per-atom property to colour sites by (e.g. "charges").
+        colormap: Colour map for `color_by`.
+        vmin, vmax: Values at either end of the colour map, as in
+            :func:`vesta_frames_from_lammps`.
+        vectors: Per-atom property with three components to attach as
+            vectors (e.g. "forces"), or names of three single-component
+            properties.
+        vector_scale: Length of vectors (Angstrom) per unit of the property.
+        output: If given, write each frame as it is made, to this filename
+            formatted with the frame number (from 0).
+
+    Yields:
+        A VestaFile for each frame.
+
+    Raises:
+        ValueError: `template` has a different number of sites, or the
+            file is malformed.
+        KeyError: A property asked for is not in the file.
+    """
+    from vestacrystparser.trajectory import iter_extxyz
+    with open_text(fname) as f:
+        yield from _vesta_frames(iter_extxyz(f, stride), template, output,
+                                 vectors, vector_scale, color_by, colormap,
+                                 vmin, vmax)
+
+
 # Volumetric data
 
 
-def vesta_from_volumetric(volu: VolumetricData, fname: str, n: float = 2,
-                          chgcar_like: bool = True) -> VestaFile:
+def _isosurface_levels(stats: VolumetricStats, n: float = 2,
+                       percentile: Union[float, list[float], None] = None,
+                       volume_fraction: Union[float, list[float], None] = None
+                       ) -> list[float]:
+    """Return the isosurface levels requested of the converters.
+
+    Levels are taken at each `percentile` of |rho| and each `volume_fraction`
+    enclosed. If neither are given, uses mean + `n` standard deviations.
+    """
+    levels = []
+    if percentile is not None:
+        if not isinstance(percentile, (list, tuple)):
+            percentile = [percentile]
+        levels += [stats.percentile_level(p) for p in percentile]
+    if volume_fraction is not None:
+        if not isinstance(volume_fraction, (list, tuple)):
+            volume_fraction = [volume_fraction]
+        levels += [stats.volume_fraction_level(f) for f in volume_fraction]
+    if not levels:
+        levels = [stats.isosurface_level(n)]
+    return levels
+
+
+def _add_volumetric_levels(vfile: VestaFile, fname: str,
+                           stats: VolumetricStats, n: float = 2,
+                           percentile: Union[float, list[float], None] = None,
+                           volume_fraction: Union[float, list[float], None]
+                           = None):
+    """Add volumetric data to a VestaFile, with isosurfaces and saturation
+    levels from the statistics of the data (already in VESTA's units)."""
+    vfile.add_volumetric_data(fname)
+    vfile.add_isosurface(_isosurface_levels(stats, n, percentile,
+                                            volume_fraction))
+    vfile.set_section_saturation_levels(stats.min, stats.max)
+
+
+def vesta_from_volumetric(volu: "VolumetricData", fname: str, n: float = 2,
+                          chgcar_like: bool = True,
+                          cache: bool = False,
+                          percentile: Union[float, list[float], None] = None,
+                          volume_fraction: Union[float, list[float], None]
+                          = None) -> VestaFile:
     """Return a VestaFile from pymatgen VolumetricData
 
     Assumes the Volumetric data is in units of Angstrom, not Bohr.
@@ -60,63 +436,808 @@ def vesta_from_volumetric(volu: VolumetricData, fname: str, n: float = 2,
     Isosurface level is determined by (Vesta Manual section 16.7)
 
     .. math::
-        d(iso) = \\langle \\vert \\rho \\vert \\rangle + n \\times \\sigma(\\vert \\rho \\vert)
+        d(iso) = \\langle \\vert \\rho \\vert \\rangle
+        + n \\times \\sigma(\\vert \\rho \\vert)
+
+    Alternatively, isosurface levels can be set by `percentile` of
+    :math:`\\vert \\rho \\vert`, or by the fraction of the volume they
+    enclose (`volume_fraction`).
+    These are estimated from a histogram gathered in the same pass as the
+    other statistics (accurate to a few percent).
+    Several levels may be given, making an isosurface for each.
 
     Args:
         volu: VolumetricData object, with structure and volumetric data
         fname: Filename where the volumetric data lives.
         n: Parameter for setting the default isosurface level.
         chgcar_like: If True, divides out the volume.
+        percentile: Percentile(s) (0-100) of |rho| to put isosurfaces at.
+        volume_fraction: Fraction(s) (0-1) of the volume for isosurfaces to
+            enclose.
+        cache: If True, read the statistics of the data from a cache file
+            next to `fname` (see
+            :func:`vestacrystparser.volumetric.read_stats_cache`) if it is
+            up to date, otherwise compute them and write the cache.
+            Only use this if `volu` was read, unmodified, from `fname`.
+            A cache for a grid of a different shape to `volu` is ignored
+            and left as it is.
     """
     # Get the structural component
     vfile = vesta_from_structure(volu.structure)
     # Determine the isosurface level
     # See Section 16.7 of the VESTA Manual
     # Convert to Bohr and divide out volume: Section 17.4.3
-    a2b = 0.148185  # Angstom^3 to Bohr^3
+    # The statistics are taken of the data as-is, a chunk at a time, then
+    # scaled, to avoid making full-size copies of the grid.
     if chgcar_like:
-        data = volu.data["total"] / volu.structure.volume * a2b
+        factor = A2B / volu.structure.volume
     else:
-        data = volu.data["total"] * a2b
-    absrho = np.abs(data)
-    level = absrho.mean() + n * absrho.std()
+        factor = A2B
+    shape = tuple(volu.data["total"].shape)
+    stats = _cached_stats(fname) if cache else None
+    if stats is not None and tuple(stats.shape or ()) != shape:
+        # Not the data of fname, so the cache isn't for it.
+        logger.warning(f"{fname} has a grid of a different shape to the "
+                       "data given, so its statistics cache is not used.")
+        stats = None
+        cache = False
+    if stats is None:
+        stats = array_stats(volu.data["total"])
+        stats.shape = shape
+        if cache:
+            write_stats_cache(fname, {"total": stats})
+    stats = stats.scaled(factor)
     # Set volumetric data
-    vfile.add_volumetric_data(fname)
-    vfile.add_isosurface(level)
-    vfile.set_section_saturation_levels(data.min(), data.max())
+    _add_volumetric_levels(vfile, fname, stats, n, percentile,
+                           volume_fraction)
     return vfile
 
 
-def vesta_from_chgcar(fname: str, n: float = 2) -> VestaFile:
+def _cached_stats(fname: str) -> Union[VolumetricStats, None]:
+    """Return cached statistics of the total data in fname, if available."""
+    blocks = read_stats_cache(fname)
+    if blocks is None:
+        return None
+    return blocks.get("total")
+
+
+def _read_grid_stats(fname: str, f, count: int,
+                     workers: Union[int, None] = None) -> VolumetricStats:
+    """Statistics of the block of `count` grid values at the position of
+    `f` (opened from `fname`), maybe in parallel."""
+    if workers is None or workers == 1:
+        return grid_stats(f, count)
+    if is_compressed(fname):
+        return parallel_stream_stats(f, count, workers)
+    offset = read_volumetric_header(fname)[2]
+    try:
+        return parallel_grid_stats(fname, offset, count, workers)
+    except ValueError as e:
+        logger.warning(f"Cannot split {fname} between workers ({e}). "
+                       "Reading serially.")
+        return grid_stats(f, count)
+
+
+def vesta_from_chgcar(fname: str, n: float = 2,
+                      cache: bool = False,
+                      percentile: Union[float, list[float], None] = None,
+                      volume_fraction: Union[float, list[float], None] = None,
+                      workers: Union[int, None] = None,
+                      uncompressed: bool = False,
+                      preview: Union[int, None] = None,
+                      preview_method: str = "average") -> VestaFile:
     """Return a VestaFile from VASP CHGCAR.
 
     Isosurface level is determined by (Vesta Manual section 16.7)
 
     .. math::
-        d(iso) = \\langle \\vert \\rho \\vert \\rangle + n \\times \\sigma(\\vert \\rho \\vert)
+        d(iso) = \\langle \\vert \\rho \\vert \\rangle
+        + n \\times \\sigma(\\vert \\rho \\vert)
 
     A caution, though. It would appear that VESTA uses a slightly strange
     method of calculating the standard deviation.
     As such, the isosurface level set by this method may be off by an amount
     (e.g. 5%).
 
+    Alternatively, isosurface levels can be set by `percentile` of
+    :math:`\\vert \\rho \\vert`, or by the fraction of the volume they
+    enclose (`volume_fraction`).
+    These are estimated from a histogram gathered in the same pass as the
+    other statistics (accurate to a few percent).
+    Several levels may be given, making an isosurface for each.
+
+    This reads the file directly (compressed or not), streaming the grid
+    in chunks to compute the statistics, so the grid is never held in memory
+    and pymatgen is not needed.
+    Only the first (total density) block of data is read.
+    Works similarly for other VASP volumetric files, like PARCHG.
+
     Args:
         fname: Filename of the CHGCAR
         n: Parameter for setting the default isosurface level.
+        percentile: Percentile(s) (0-100) of |rho| to put isosurfaces at.
+        volume_fraction: Fraction(s) (0-1) of the volume for isosurfaces to
+            enclose.
+        cache: If True, read the statistics of the grid from a cache file
+            next to `fname` (see
+            :func:`vestacrystparser.volumetric.read_stats_cache`) if it is
+            up to date, so the grid is not read at all. Otherwise compute
+            them and write the cache.
+        workers: If more than 1, compute the statistics with this many
+            processes, for large grids. Uncompressed files are split into
+            byte ranges which each process reads directly. For compressed
+            files, this process decompresses and the others parse.
+        uncompressed: If True and the file is compressed (which VESTA can't
+            read), IMPORT_DENSITY refers to an uncompressed copy (e.g.
+            CHGCAR rather than CHGCAR.gz). The copy is not made here; call
+            :func:`decompress_volumetric_data` when it is needed.
+        preview: If set, write a copy of the data with resolution reduced by
+            this factor along each axis, next to the original, and refer to
+            it in IMPORT_DENSITY instead. Much faster for VESTA to open.
+            The isosurface and saturation levels are still from the full
+            data. Swap the original back in with
+            ``vfile.add_volumetric_data(fname, mode="replace")``.
+            See :func:`vestacrystparser.volumetric.write_preview`.
+        preview_method: "average" or "stride"; how to reduce the resolution.
     """
-    # Load file
-    chg = Chgcar.from_file(fname)
-    # Parse file into VESTA format
-    vfile = vesta_from_volumetric(chg, fname, n=n)
-    # Add title
-    vfile.title = chg.poscar.comment
+    _require_numpy()
+    stats = _cached_stats(fname) if cache else None
+    with open_text(fname) as f:
+        pos = read_poscar(f)
+        if stats is None:
+            shape = read_grid_shape(f)
+            stats = _read_grid_stats(fname, f, shape[0] * shape[1] * shape[2],
+                                     workers)
+            stats.shape = shape
+            if cache:
+                write_stats_cache(fname, {"total": stats})
+    vfile = _vesta_from_poscar_data(pos)
+    if preview is not None:
+        density_fname = preview_name(fname, preview)
+        # Don't re-write an up-to-date preview.
+        if not os.path.exists(density_fname) or \
+                os.path.getmtime(density_fname) < os.path.getmtime(fname):
+            write_preview(fname, preview, preview_method, density_fname)
+    elif uncompressed and is_compressed(fname):
+        density_fname = uncompressed_name(fname)
+    else:
+        density_fname = fname
+    # Convert to Bohr and divide out volume: Section 17.4.3
+    _add_volumetric_levels(vfile, density_fname,
+                           stats.scaled(A2B / pos.volume), n,
+                           percentile, volume_fraction)
+    return vfile
+
+
+def _vesta_from_grid_file(fname: str, n: float = 2,
+                          percentile: Union[float, list[float], None] = None,
+                          volume_fraction: Union[float, list[float], None]
+                          = None,
+                          cache: bool = False,
+                          uncompressed: bool = False) -> VestaFile:
+    """Return a VestaFile from a volumetric data file read by
+    :class:`vestacrystparser.volumetric.GridFile`, streaming the grid."""
+    _require_numpy()
+    stats = _cached_stats(fname) if cache else None
+    with GridFile(fname) as grid:
+        pos = grid.structure
+        scale = grid.scale
+        if stats is None:
+            stats = VolumetricStats()
+            for chunk in grid.chunks():
+                stats.update(chunk)
+            stats.shape = grid.shape
+            if cache:
+                write_stats_cache(fname, {"total": stats})
+    vfile = _vesta_from_poscar_data(pos)
+    if uncompressed and is_compressed(fname):
+        fname = uncompressed_name(fname)
+    _add_volumetric_levels(vfile, fname, stats.scaled(scale), n,
+                           percentile, volume_fraction)
     return vfile
 
 
+def vesta_from_cube(fname: str, n: float = 2,
+                    percentile: Union[float, list[float], None] = None,
+                    volume_fraction: Union[float, list[float], None] = None,
+                    cache: bool = False,
+                    uncompressed: bool = False) -> VestaFile:
+    """Return a VestaFile from a Gaussian cube file.
+
+    The file is read directly (compressed or not), streaming the grid to
+    compute the statistics, so the grid is never held in memory and pymatgen
+    is not needed. Isosurface levels are chosen as in
+    :func:`vesta_from_chgcar`. Values are used as they are in the file
+    (normally Bohr^-3, as VESTA expects).
+
+    The cell is the extent of the grid, and the atoms are placed relative
+    to its origin. For files with several molecular orbitals, the first is
+    used for the levels.
+
+    Args:
+        fname: Filename of the cube file.
+        n: Parameter for setting the default isosurface level.
+        percentile: Percentile(s) (0-100) of |rho| to put isosurfaces at.
+        volume_fraction: Fraction(s) (0-1) of the volume for isosurfaces to
+            enclose.
+        cache: Read and write cached statistics, as in
+            :func:`vesta_from_chgcar`.
+        uncompressed: Refer to an uncompressed copy of a compressed file, as
+            in :func:`vesta_from_chgcar`.
+    """
+    return _vesta_from_grid_file(fname, n, percentile, volume_fraction,
+                                 cache, uncompressed)
+
+
+def vesta_from_xsf(fname: str, n: float = 2,
+                   percentile: Union[float, list[float], None] = None,
+                   volume_fraction: Union[float, list[float], None] = None,
+                   cache: bool = False,
+                   uncompressed: bool = False) -> VestaFile:
+    """Return a VestaFile from an XCrySDen XSF file with a 3D data grid.
+
+    The file is read directly (compressed or not), streaming the grid to
+    compute the statistics, so the grid is never held in memory and pymatgen
+    is not needed. Isosurface levels are chosen as in
+    :func:`vesta_from_chgcar`, from the first 3D data grid. Values are used
+    as they are in the file.
+
+    For crystals, the cell is the primitive cell, and the grid points
+    repeating the first along each axis are left out of the statistics.
+    For molecules, the cell is the extent of the grid.
+
+    Args:
+        fname: Filename of the XSF file.
+        n: Parameter for setting the default isosurface level.
+        percentile: Percentile(s) (0-100) of |rho| to put isosurfaces at.
+        volume_fraction: Fraction(s) (0-1) of the volume for isosurfaces to
+            enclose.
+        cache: Read and write cached statistics, as in
+            :func:`vesta_from_chgcar`.
+        uncompressed: Refer to an uncompressed copy of a compressed file, as
+            in :func:`vesta_from_chgcar`.
+    """
+    return _vesta_from_grid_file(fname, n, percentile, volume_fraction,
+                                 cache, uncompressed)
+
+
+def decompress_volumetric_data(vfile: VestaFile,
+                               directory: str = ".") -> list[str]:
+    """Make uncompressed copies of volumetric data VESTA needs.
+
+    For each IMPORT_DENSITY file (in every phase) which does not exist but
+    has a compressed version next to it (.gz, .bz2 or .xz, or, for
+    "<name>.uncompressed", a compressed "<name>"), or is out of date with
+    it, writes the uncompressed file.
+
+    Args:
+        vfile: VestaFile referring to the volumetric data.
+        directory: Directory relative paths are relative to (i.e. where the
+            VESTA file is or will be saved).
+
+    Returns:
+        Paths of the files written.
+    """
+    written = []
+    for phase in range(1, vfile.nphases + 1):
+        if ("IMPORT_DENSITY", phase) not in vfile:
+            continue
+        for row in vfile["IMPORT_DENSITY", phase].data:
+            path = os.path.join(directory, row[1])
+            source = compressed_source(path)
+            if source is not None:
+                if not os.path.exists(path) or \
+                        os.path.getmtime(path) < os.path.getmtime(source):
+                    decompress_file(source, path)
+                    written.append(path)
+            elif os.path.exists(path) and is_compressed(path):
+                logger.warning(f"{path} is compressed, so VESTA can't "
+                               "read it.")
+    return written
+
+
+def vesta_from_spin_chgcar(fname: str, n: float = 2,
+                           output: str = "magnetization",
+                           percentile: Union[float, list[float], None] = None,
+                           volume_fraction: Union[float, list[float], None]
+                           = None,
+                           magnetization_fname: Union[str, None] = None) \
+        -> tuple[VestaFile, VestaFile]:
+    """Return a pair of VestaFiles from a spin-polarised VASP CHGCAR.
+
+    The file is read once, collecting the statistics of both the total and
+    the magnetization densities. As VESTA only reads the first (total)
+    block, the magnetization block is written to a separate file
+    (`magnetization_fname`), which the VESTA files refer to.
+
+    Isosurface levels are chosen as in :func:`vesta_from_chgcar`.
+
+    Args:
+        fname: Filename of the CHGCAR.
+        n: Parameter for setting the default isosurface level.
+        output: Which pair of VestaFiles to make.
+
+            - "magnetization": the total density, and the magnetization
+              density with two isosurfaces, yellow for positive and cyan
+              for negative.
+            - "spin": the spin up and spin down densities, made by adding
+              and subtracting half the magnetization to half the total
+              density in IMPORT_DENSITY.
+
+        percentile: Percentile(s) (0-100) of |rho| to put isosurfaces at.
+        volume_fraction: Fraction(s) (0-1) of the volume for isosurfaces to
+            enclose.
+        magnetization_fname: Where to write the magnetization density.
+            Defaults to e.g. CHGCAR_mag.vasp next to `fname`.
+
+    Returns:
+        Pair of VestaFiles, as set by `output`.
+
+    Raises:
+        ValueError: File is not spin-polarised, or unknown `output`.
+    """
+    if output not in ["magnetization", "spin"]:
+        raise ValueError(f"Unknown output {output}. "
+                         "Use 'magnetization' or 'spin'.")
+    _require_numpy()
+    if magnetization_fname is None:
+        magnetization_fname = derived_name(fname, "mag")
+    with open_text(fname) as f:
+        pos = read_poscar(f)
+    stats = spin_stats(fname, magnetization_fname,
+                       spin_channels=(output == "spin"))
+    # Convert to Bohr and divide out volume: Section 17.4.3
+    stats = {key: value.scaled(A2B / pos.volume)
+             for key, value in stats.items()}
+    first = _vesta_from_poscar_data(pos)
+    second = first.copy()
+    if output == "magnetization":
+        _add_volumetric_levels(first, fname, stats["total"], n,
+                               percentile, volume_fraction)
+        second.add_volumetric_data(magnetization_fname)
+        levels = _isosurface_levels(stats["magnetization"], n, percentile,
+                                    volume_fraction)
+        second.add_isosurface(levels, mode=1)
+        second.add_isosurface(levels, mode=2, r=0, g=255, b=255)
+        second.set_section_saturation_levels(stats["magnetization"].min,
+                                             stats["magnetization"].max)
+    else:
+        for vfile, key, mode in [(first, "up", "add"),
+                                 (second, "down", "subtract")]:
+            vfile.add_volumetric_data(fname, factor=0.5)
+            vfile.add_volumetric_data(magnetization_fname, factor=0.5,
+                                      mode=mode)
+            vfile.add_isosurface(_isosurface_levels(
+                stats[key], n, percentile, volume_fraction))
+            vfile.set_section_saturation_levels(stats[key].min,
+                                                stats[key].max)
+    return first, second
+
+
+def _parse_import_density(vfile: VestaFile, directory: str = ".",
+                          phase: Union[int, None] = None) \
+        -> list[tuple[str, float, str]]:
+    """Read IMPORT_DENSITY into (operation, factor, path) entries."""
+    entries = []
+    for row in vfile["IMPORT_DENSITY", phase or vfile.current_phase].data:
+        token = row[0]
+        if token[0] in "x/":
+            op, token = token[0], token[1:]
+        else:
+            op = "+"
+        entries.append((op, float(token), os.path.join(directory, row[1])))
+    return entries
+
+
+def import_density_stats(vfile: VestaFile, directory: str = ".",
+                         phase: Union[int, None] = None) -> VolumetricStats:
+    """Statistics of the volumetric data VESTA will load for a phase.
+
+    Evaluates the combination of all IMPORT_DENSITY entries (added,
+    subtracted, multiplied or divided, with their factors), streaming all
+    the files together a chunk at a time, such as for charge density
+    differences.
+    Supports VASP volumetric files (e.g. CHGCAR), optionally compressed.
+
+    Args:
+        vfile: VestaFile with volumetric data.
+        directory: Directory relative paths are relative to (i.e. where the
+            VESTA file is or will be saved).
+        phase: 1-based index of phase. Defaults to current phase.
+
+    Returns:
+        Statistics of the combined data, in VESTA's units.
+
+    Related sections: :ref:`IMPORT_DENSITY`
+    """
+    _require_numpy()
+    return combined_stats(_parse_import_density(vfile, directory, phase))
+
+
+def set_volumetric_levels(vfile: VestaFile, n: float = 2,
+                          percentile: Union[float, list[float], None] = None,
+                          volume_fraction: Union[float, list[float], None]
+                          = None,
+                          directory: str = ".") -> VolumetricStats:
+    """Set isosurface and saturation levels from the combined volumetric data.
+
+    Uses :func:`import_density_stats` on the current phase, then chooses
+    levels as in :func:`vesta_from_chgcar`.
+    Existing isosurfaces keep their style and get the new levels in turn;
+    extra levels make new isosurfaces and surplus isosurfaces are deleted.
+
+    Args:
+        vfile: VestaFile with volumetric data. Modified in place.
+        n: Parameter for setting the default isosurface level.
+        percentile: Percentile(s) (0-100) of |rho| to put isosurfaces at.
+        volume_fraction: Fraction(s) (0-1) of the volume for isosurfaces to
+            enclose.
+        directory: Directory relative paths are relative to.
+
+    Returns:
+        Statistics of the combined data.
+
+    Related sections: :ref:`IMPORT_DENSITY`, :ref:`ISURF`, :ref:`SECTP`
+    """
+    stats = import_density_stats(vfile, directory)
+    levels = _isosurface_levels(stats, n, percentile, volume_fraction)
+    existing = len(vfile["ISURF"].data) - 1
+    for i, level in enumerate(levels[:existing]):
+        vfile.edit_isosurface(i + 1, level=level)
+    for _ in range(existing - len(levels)):
+        vfile.delete_isosurface(-1)
+    if len(levels) > existing:
+        vfile.add_isosurface(levels[existing:])
+    vfile.set_section_saturation_levels(stats.min, stats.max)
+    return stats
+
+
+# Batch conversion, for the command line.
+
+# Files found when searching directories.
+DEFAULT_PATTERNS = ["POSCAR*", "CONTCAR*", "CHGCAR*", "PARCHG*", "*.vasp"]
+# Files never converted (our own outputs and caches).
+_EXCLUDED_SUFFIXES = (".vesta", ".json", ".tmp", UNCOMPRESSED_SUFFIX)
+# Volumetric files written next to the inputs, named by derived_name (e.g.
+# CHGCAR_preview2.vasp, CHGCAR_mag.vasp).
+_DERIVED_NAME = re.compile(r"_(preview\d+|mag|magnetization|total)\.vasp$")
+# Names of VASP volumetric files; other files are read as POSCARs.
+_VOLUMETRIC_PREFIXES = ("CHG", "PARCHG", "LOCPOT", "ELFCAR", "AECCAR")
+# Seconds between saving the manifest during a batch.
+MANIFEST_INTERVAL = 10.0
+MANIFEST_VERSION = 1
+
+
+def find_inputs(paths: list[str],
+                patterns: Union[list[str], None] = None) \
+        -> list[tuple[str, str]]:
+    """Find the files to convert from command line arguments.
+
+    Each argument may be a file, a glob (e.g. ``db/*/POSCAR``), a directory
+    (searched recursively for files matching `patterns`) or ``@list.txt``,
+    a text file listing one file per line.
+    Files written by this module (VESTA files, caches, previews, and
+    uncompressed or magnetization copies) are skipped, as are files next
+    to a compressed version of themselves.
+
+    Args:
+        paths: The arguments.
+        patterns: fnmatch patterns of file names to find in directories.
+            Default :data:`DEFAULT_PATTERNS`.
+
+    Returns:
+        Unique (filename, relative name) pairs, in order. The relative name
+        is relative to the searched directory or the fixed part of the glob
+        (or the current directory for listed files), for placing outputs.
+    """
+    if patterns is None:
+        patterns = DEFAULT_PATTERNS
+    found = {}
+
+    def add(fname: str, root: Union[str, None]):
+        if fname.endswith(_EXCLUDED_SUFFIXES) or \
+                _DERIVED_NAME.search(os.path.basename(fname)) or \
+                compressed_source(fname) is not None:
+            return
+        if root is None:
+            rel = os.path.relpath(fname)
+            if os.path.isabs(fname) or rel.startswith(os.pardir):
+                rel = os.path.basename(fname)
+        else:
+            rel = os.path.relpath(fname, root)
+        found.setdefault(os.path.normpath(fname), rel)
+
+    def walk(directory: str):
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if any(fnmatch.fnmatch(name, p) for p in patterns):
+                    add(os.path.join(dirpath, name), directory)
+
+    for path in paths:
+        if path.startswith("@"):
+            with open(path[1:]) as f:
+                for line in f:
+                    if line.strip():
+                        add(line.strip(), None)
+        elif glob.has_magic(path):
+            # Relative to the directories before the first wildcard.
+            parts = path.split(os.sep)
+            fixed = list(itertools.takewhile(
+                lambda part: not glob.has_magic(part), parts))
+            root = os.sep.join(fixed) or os.curdir
+            for match in sorted(glob.glob(path, recursive=True)):
+                if os.path.isdir(match):
+                    walk(match)
+                else:
+                    add(match, root)
+        elif os.path.isdir(path):
+            walk(path)
+        else:
+            add(path, None)
+    return list(found.items())
+
+
+def output_name(fname: str, rel: str,
+                output_dir: Union[str, None] = None) -> str:
+    """Name of the VESTA file made from `fname` by :func:`batch_convert`.
+
+    e.g. CHGCAR.gz becomes CHGCAR.vesta, next to the input or at `rel`
+    within `output_dir`.
+    """
+    if output_dir is not None:
+        fname = os.path.join(output_dir, rel)
+    if fname.endswith(COMPRESSED_SUFFIXES):
+        fname = uncompressed_name(fname)
+    return fname + ".vesta"
+
+
+def _up_to_date(fname: str, output: str) -> bool:
+    """Whether output exists and is newer than fname."""
+    return os.path.exists(output) and \
+        os.path.getmtime(output) >= os.path.getmtime(fname)
+
+
+def _convert_file(fname: str, output: str, decompress: bool = True) \
+        -> tuple[float, Union[str, None]]:
+    """Convert one file, for :func:`batch_convert`.
+
+    Volumetric files (by name) are converted with :func:`vesta_from_chgcar`
+    (or the cube or XSF equivalents), with IMPORT_DENSITY relative to the
+    output. If `decompress`, compressed volumetric data (which VESTA can't
+    read) is decompressed next to the output, and IMPORT_DENSITY refers to
+    that instead. Other files are read as POSCARs. The output is written to
+    a temporary file then renamed, so an interrupted conversion never
+    leaves a partial file which looks up to date.
+
+    Returns:
+        Time taken (seconds), and the error message if it failed.
+    """
+    start = time.perf_counter()
+    try:
+        name = os.path.basename(fname)
+        # Without numpy, only POSCARs can be converted.
+        volumetric = grid_format(fname) if grid_format is not None \
+            else "vasp"
+        if volumetric == "cube":
+            vfile = vesta_from_cube(fname)
+        elif volumetric == "xsf":
+            vfile = vesta_from_xsf(fname)
+        elif name.startswith(_VOLUMETRIC_PREFIXES):
+            vfile = vesta_from_chgcar(fname)
+        else:
+            vfile = vesta_from_poscar(fname)
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if "IMPORT_DENSITY" in vfile:
+            for row in vfile["IMPORT_DENSITY"].data:
+                if decompress and is_compressed(row[1]):
+                    density = os.path.join(
+                        directory, os.path.basename(uncompressed_name(row[1])))
+                    row[1] = decompress_file(row[1], density)
+                row[1] = os.path.relpath(row[1], directory or os.curdir)
+        vfile.save(output + ".tmp")
+        os.replace(output + ".tmp", output)
+    except Exception as e:
+        return time.perf_counter() - start, f"{type(e).__name__}: {e}"
+    return time.perf_counter() - start, None
+
+
+def _run_tasks(tasks: Iterator[tuple[str, str]], jobs: int,
+               decompress: bool = True) \
+        -> Iterator[tuple[str, str, float, Union[str, None]]]:
+    """Convert (input, output) pairs, yielding results as they finish.
+
+    With more than one job, conversions run in a process pool, with only a
+    few tasks queued at once so huge batches don't fill memory.
+    """
+    if jobs == 1:
+        for fname, output in tasks:
+            yield (fname, output) + _convert_file(fname, output, decompress)
+        return
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        pending = {}
+        while True:
+            for fname, output in itertools.islice(
+                    tasks, 2 * jobs - len(pending)):
+                future = executor.submit(_convert_file, fname, output,
+                                         decompress)
+                pending[future] = fname, output
+            if not pending:
+                return
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future) + future.result()
+
+
+def _write_manifest(manifest_path: str, manifest: dict):
+    """Write the manifest, with counts of each status, atomically."""
+    counts = {"converted": 0, "skipped": 0, "error": 0}
+    for entry in manifest["files"].values():
+        counts[entry["status"]] += 1
+    manifest["counts"] = counts
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def batch_convert(inputs: list[tuple[str, str]],
+                  output_dir: Union[str, None] = None,
+                  jobs: Union[int, None] = None,
+                  force: bool = False,
+                  manifest_path: Union[str, None] = None,
+                  resume: bool = False,
+                  decompress: bool = True) -> dict:
+    """Convert many POSCAR and volumetric (CHGCAR etc.) files to VESTA files.
+
+    Outputs are named by :func:`output_name`. Like make, files whose output
+    is newer than the input are skipped, so re-running an interrupted batch
+    carries on where it left off.
+
+    The manifest (JSON) records, for each input, the output, the status
+    ("converted", "skipped" or "error"), the time taken, any error message
+    and the modification time of the input. It is saved every
+    :data:`MANIFEST_INTERVAL` seconds and at the end (including on
+    interruption).
+
+    Args:
+        inputs: (filename, relative name) pairs, as from :func:`find_inputs`.
+        output_dir: Directory to write outputs in, at their relative names.
+            Default next to the inputs.
+        jobs: Number of processes. Default the number of CPUs.
+        force: Convert even if the output is up to date.
+        manifest_path: Where to write the manifest. Default "manifest.json"
+            in `output_dir` (or the current directory).
+        resume: Keep the entries of an existing manifest, and skip inputs
+            which failed before and haven't changed since.
+        decompress: Write uncompressed copies of compressed volumetric data
+            next to the outputs, for VESTA to read.
+
+    Returns:
+        The manifest.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir or os.curdir, "manifest.json")
+    previous = {}
+    if resume and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f).get("files", {})
+    manifest = {"version": MANIFEST_VERSION,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "files": dict(previous)}
+    files = manifest["files"]
+    outputs = set()
+
+    def tasks() -> Iterator[tuple[str, str]]:
+        for fname, rel in inputs:
+            output = output_name(fname, rel, output_dir)
+            entry = {"output": output, "status": "skipped", "seconds": 0.0}
+            try:
+                entry["mtime"] = os.path.getmtime(fname)
+            except OSError as e:
+                files[fname] = dict(entry, status="error", error=str(e))
+                continue
+            old = previous.get(fname, {})
+            if output in outputs:
+                files[fname] = dict(entry, status="error",
+                                    error="Output collides with another "
+                                          "input's output.")
+            elif not force and _up_to_date(fname, output):
+                # Keep the time taken when it was converted.
+                if old.get("status") == "converted" and \
+                        old.get("output") == output:
+                    entry = dict(old, status="skipped")
+                files[fname] = entry
+            elif not force and old.get("status") == "error" and \
+                    old.get("mtime") == entry["mtime"]:
+                # Failed before, and unchanged; keep the old entry.
+                pass
+            else:
+                yield fname, output
+            outputs.add(output)
+
+    start = last_save = time.perf_counter()
+    try:
+        for fname, output, seconds, error in _run_tasks(tasks(), jobs,
+                                                        decompress):
+            entry = {"output": output, "status": "converted",
+                     "seconds": round(seconds, 6),
+                     "mtime": os.path.getmtime(fname)}
+            if error is not None:
+                entry["status"] = "error"
+                entry["error"] = error
+                logger.warning(f"Could not convert {fname}: {error}")
+            files[fname] = entry
+            if time.perf_counter() - last_save > MANIFEST_INTERVAL:
+                manifest["elapsed"] = time.perf_counter() - start
+                _write_manifest(manifest_path, manifest)
+                last_save = time.perf_counter()
+    finally:
+        manifest["elapsed"] = time.perf_counter() - start
+        _write_manifest(manifest_path, manifest)
+    return manifest
+
+
+def main():
+    """Command-line entry point for batch conversion to VESTA files."""
+    # We separate into main() for ease of unit testing.
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Convert POSCAR and CHGCAR (etc.) files to VESTA files.")
+    parser.add_argument("inputs", nargs="+",
+                        help="Files, globs, directories (searched "
+                             "recursively), or @file listing files.")
+    parser.add_argument("-o", "--output-dir",
+                        help="Output directory. Default: next to inputs.")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="Number of processes. Default: number of CPUs.")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Convert even if outputs are up to date.")
+    parser.add_argument("-m", "--manifest",
+                        help="Manifest file. Default: manifest.json in the "
+                             "output directory.")
+    parser.add_argument("-r", "--resume", action="store_true",
+                        help="Carry on from an existing manifest, skipping "
+                             "unchanged files which failed before.")
+    parser.add_argument("-p", "--pattern", action="append",
+                        help="File name pattern to find in directories "
+                             "(repeatable). Default: "
+                             + " ".join(DEFAULT_PATTERNS))
+    parser.add_argument("--no-decompress", dest="decompress",
+                        action="store_false",
+                        help="Refer to compressed volumetric data as it is, "
+                             "rather than writing uncompressed copies "
+                             "(which VESTA needs).")
+    args = parser.parse_args()
+
+    inputs = find_inputs(args.inputs, args.pattern)
+    manifest = batch_convert(inputs, output_dir=args.output_dir,
+                             jobs=args.jobs, force=args.force,
+                             manifest_path=args.manifest,
+                             resume=args.resume, decompress=args.decompress)
+    counts = manifest["counts"]
+    print(f"{counts['converted']} converted, {counts['skipped']} skipped, "
+          f"{counts['error']} failed in {manifest['elapsed']:.1f} s.")
+    if counts["error"]:
+        sys.exit(1)
+
+
 # Thoughts...
 # CIF will be tricky, because it contains symmetry and precision
 # information and is variable in the data it contains, so I can't simply
 # convert to Structure then use that.
 # pymatgen.io.cif supports reading CIF files with all data.
-# If pymatgen proves unreliable, could also attempt PyCifRW https://pypi.org/project/PyCifRW/
+# If pymatgen proves unreliable, could also attempt PyCifRW
+# https://pypi.org/project/PyCifRW/
 # In any case, CIF is hard, and I don't have much experience with CIF's.
+
+
+if __name__ == "__main__":
+    main()
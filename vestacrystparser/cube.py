@@ -0,0 +1,95 @@
+# Copyright 2025 Bernard Field
+"""
+Lightweight reader for Gaussian cube files, without requiring pymatgen.
+
+:func:`read_cube_header` reads the structure and grid shape at the top of a
+cube file, after which the grid values can be streamed with
+:func:`vestacrystparser.volumetric.iter_grid_chunks`.
+Compressed files can be opened with :func:`vestacrystparser.vasp.open_text`.
+"""
+
+from typing import TextIO
+
+from vestacrystparser.parser import load_elements_data
+from vestacrystparser.utilities import cartesian_to_fractional
+from vestacrystparser.vasp import PoscarData
+
+# Bohr radius in Angstrom.
+BOHR = 0.529177210903
+
+
+class CubeHeader:
+    """The header of a cube file.
+
+    Attributes:
+        structure (PoscarData): The structure. Fractional coordinates are
+            relative to the origin of the grid, and the lattice is the extent
+            of the grid.
+        shape (tuple[int, int, int]): Number of grid points along each axis.
+        nvalues (int): Number of values at each grid point (more than 1 if
+            the file holds several molecular orbitals).
+    """
+
+    def __init__(self, structure: PoscarData, shape: tuple[int, int, int],
+                 nvalues: int = 1):
+        self.structure = structure
+        self.shape = shape
+        self.nvalues = nvalues
+
+
+def read_cube_header(f: TextIO) -> CubeHeader:
+    """Read the header of a Gaussian cube file from an open text file.
+
+    Reads exactly the lines of the header, so the file is left at the start
+    of the grid values. Note that, unlike VASP files, the values are ordered
+    with the third axis varying fastest. Lines may hold fewer values at the
+    end of each row along the third axis.
+
+    Args:
+        f: Text file object, at the start of the file.
+
+    Returns:
+        The header.
+
+    Raises:
+        ValueError: The header is malformed.
+    """
+    def next_tokens() -> list[str]:
+        line = f.readline()
+        if not line:
+            raise ValueError("Cube file ended unexpectedly.")
+        return line.split()
+    title = f.readline().strip()
+    f.readline()  # Second comment line.
+    tokens = next_tokens()
+    natoms = int(tokens[0])
+    origin = [float(x) for x in tokens[1:4]]
+    shape = []
+    lattice = []
+    units = []
+    for _ in range(3):
+        tokens = next_tokens()
+        npoints = int(tokens[0])
+        # A negative number of points means the vectors are in Angstrom.
+        units.append(BOHR if npoints > 0 else 1.0)
+        shape.append(abs(npoints))
+        lattice.append([float(x) * units[-1] * abs(npoints)
+                        for x in tokens[1:4]])
+    # The origin and atoms are in the units of the first axis.
+    unit = units[0]
+    origin = [x * unit for x in origin]
+    species = []
+    coords = []
+    for _ in range(abs(natoms)):
+        tokens = next_tokens()
+        species.append(load_elements_data(int(float(tokens[0])))[1])
+        coords.append([float(x) * unit - o
+                       for x, o in zip(tokens[2:5], origin)])
+    nvalues = 1
+    if natoms < 0:
+        # Molecular orbital indices follow the atoms.
+        nvalues = int(next_tokens()[0])
+    return CubeHeader(
+        PoscarData(title, lattice, species,
+                   cartesian_to_fractional(coords, lattice)),
+        tuple(shape), nvalues)
@@ -10,9 +10,13 @@ used when making low-level API calls.
 
 The other functions and methods are primarily of use to developers.
 """
+import bisect
+import contextlib
 import logging
 import math
-from typing import Union, Iterator
+import numbers
+import os
+from typing import Union, Iterator, Callable, Iterable, Sequence
 import importlib.resources
 
 import vestacrystparser.resources
@@ -73,6 +77,9 @@ def load_elements_data(element: Union[int, str]) -> \
         raise ValueError("Unable to load default element from elements.csv.")
 
 
+_bond_styles = None
+
+
 def load_default_bond_style(A1: str, A2: str, hbond: bool = False) \
         -> Union[list[int, str, str, float, float, int, int, int, int, int], None]:
     """Loads default bond style for a pair of elements (if present).
@@ -101,21 +108,26 @@ def load_default_bond_style(A1: str, A2: str, hbond: bool = False) \
             - 0 (search by label = False),
             - style (normal (1) or H-bond (5))
     """
-    # Load sbond.csv file.
-    fn = importlib.resources.files(vestacrystparser.resources) / "sbond.csv"
-    first = True
-    with open(fn, 'r') as f:
-        # Parse this comma-separated-values file.
-        for line in f.readlines():
-            tokens = [parse_token(x) for x in line.split(',')]
-            if ((tokens[1] == A1 and tokens[2] == A2) or
-                    (tokens[1] == A2 and tokens[2] == A1)):
+    global _bond_styles
+    if _bond_styles is None:
+        # Load sbond.csv file, only once.
+        fn = importlib.resources.files(vestacrystparser.resources) / \
+            "sbond.csv"
+        table = {}
+        with open(fn, 'r') as f:
+            # Parse this comma-separated-values file.
+            for line in f.readlines():
+                tokens = [parse_token(x) for x in line.split(',')]
                 # A1 and A2 are interchangeable.
-                # We've found our match.
-                if not hbond or (hbond and not first):
-                    return tokens
-                else:
-                    first = False
+                table.setdefault((tokens[1], tokens[2]), []).append(tokens)
+                if tokens[1] != tokens[2]:
+                    table.setdefault((tokens[2], tokens[1]), []).append(tokens)
+        _bond_styles = table
+    matches = _bond_styles.get((A1, A2), [])
+    # The hydrogen bond is the second match.
+    i = 1 if hbond else 0
+    if len(matches) > i:
+        return list(matches[i])
     # No match found.
     return None
 
@@ -200,6 +212,20 @@ sections_that_are_global = [
     "HKLPM",
 ]
 
+# Colour maps for VestaFile.color_sites_by, as evenly spaced RGB stops.
+# The names follow the volumetric section colour schemes where they overlap.
+site_color_maps = {
+    "B-G-R": [(0, 0, 255), (0, 255, 0), (255, 0, 0)],
+    "R-G-B": [(255, 0, 0), (0, 255, 0), (0, 0, 255)],
+    "B-W-R": [(0, 0, 255), (255, 255, 255), (255, 0, 0)],
+    "Gray scale": [(0, 0, 0), (255, 255, 255)],
+    "Inverted gray scale": [(255, 255, 255), (0, 0, 0)],
+}
+
+# How far outside the boundary (in fractional coordinates) an atom may be
+# and still be drawn, e.g. 1.000000 in a VESTA file for an atom at 0.
+_BOUNDARY_TOLERANCE = 1e-5
+
 
 class VestaSection:
     """Section of a VestaFile.
@@ -300,18 +326,90 @@ class VestaSection:
 
 
 class VestaPhase:
-    """A collection of uniquely-named VestaSection's"""
+    """A collection of uniquely-named VestaSection's
+
+    A phase read from a file may hold its sections as unparsed text, which is
+    parsed the first time any of them is accessed.
+    """
 
     def __init__(self):
         self._sections = {}
         self._order = []
+        # Unparsed sections, as a list of (header line, data lines).
+        self._pending = None
+        # Shift of the phase LORIENT refers to, applied when parsed.
+        self._lorient_offset = 0
+        # Names of sections shared with other phases, copied before use.
+        self._shared = set()
+        # Lookup tables for sites and vectors, built on demand by VestaFile.
+        self._site_index = None
+        self._vector_index = None
+
+    def _add_unparsed(self, header_line: str, lines: list[str]):
+        """Record a section as text, to be parsed when first needed."""
+        if self._pending is None:
+            self._pending = []
+        self._pending.append((header_line, lines))
+
+    @property
+    def is_parsed(self) -> bool:
+        """Whether all sections have been parsed (read-only)"""
+        return self._pending is None
+
+    def _parse(self):
+        """Parse any sections still held as text."""
+        if self._pending is None:
+            return
+        pending = self._pending
+        self._pending = None
+        for header_line, lines in pending:
+            section = VestaSection(header_line)
+            for line in lines:
+                section.add_line(line)
+            self.append(section)
+        if self._lorient_offset and "LORIENT" in self._sections:
+            row = self._sections["LORIENT"].data[0]
+            if row[0] >= 0:
+                row[0] += self._lorient_offset
+        self._lorient_offset = 0
+
+    def _lorient_reference(self) -> int:
+        """Index of the phase LORIENT orients this one relative to, as
+        stored (0-based, -1 for the Cartesian axes).
+
+        Reads the unparsed text if need be, so neither parses the phase nor
+        copies a shared LORIENT.
+        """
+        if self._pending is None:
+            if "LORIENT" not in self._sections:
+                return -1
+            return self._sections["LORIENT"].data[0][0]
+        for header_line, lines in self._pending:
+            if header_line.split()[0] == "LORIENT":
+                reference = int(lines[0].split()[0])
+                if reference >= 0:
+                    reference += self._lorient_offset
+                return reference
+        return -1
 
     def __getitem__(self, name: str) -> VestaSection:
         """Return item by name of section. Raise KeyError if not present."""
+        self._parse()
+        if name in self._shared:
+            # We might be about to modify it, so take our own copy.
+            self._sections[name] = self._sections[name].copy()
+            self._shared.discard(name)
+        return self._sections[name]
+
+    def _peek(self, name: str) -> VestaSection:
+        """Return a section for reading only, without copying it if it is
+        shared. Raise KeyError if not present."""
+        self._parse()
         return self._sections[name]
 
     def __contains__(self, name: str) -> bool:
         """Return True if VestaPhase contains a section with `name`."""
+        self._parse()
         return name in self._sections
 
     def append(self, section: VestaSection, before: str = None):
@@ -328,6 +426,7 @@ class VestaPhase:
             KeyError: section with the same header is already present.
             KeyError: `before` is not a header in this Phase.
         """
+        self._parse()
         header = section.header
         if header in self:
             raise KeyError(
@@ -345,19 +444,26 @@ class VestaPhase:
 
     def __len__(self) -> int:
         """Number of sections."""
+        if self._pending is not None:
+            return len(self._sections) + len(self._pending)
         return len(self._sections)
 
     def __iter__(self) -> Iterator[VestaSection]:
         """Iterate over each section."""
+        self._parse()
         for header in self._order:
             yield self._sections[header]
 
     def remove(self, name: str):
         """Deletes the given VestaSection."""
+        self._parse()
         if name not in self:
             raise KeyError(f"{name} is not in this VestaPhase! Cannot remove.")
         del self._order[self._order.index(name)]
         del self._sections[name]
+        self._shared.discard(name)
+        self._site_index = None
+        self._vector_index = None
 
     @property
     def title(self) -> str:
@@ -369,14 +475,614 @@ class VestaPhase:
         """Number of sites (read-only)"""
         return len(self["SITET"].data) - 1
 
-    def copy(self) -> "VestaPhase":
-        """Creates a copy of the VestaPhase"""
+    def copy(self, shared: bool = False) -> "VestaPhase":
+        """Creates a copy of the VestaPhase
+
+        Unparsed sections stay unparsed in the copy.
+
+        Args:
+            shared: If True, the sections are shared between this phase and
+                the copy, and each phase only copies a section when it is
+                accessed by name (copy-on-write). Iterating over the phase
+                does not copy, so sections from iteration must not be
+                modified.
+        """
         new = VestaPhase()
+        if self._pending is not None:
+            # The text is never modified, so can be shared.
+            new._pending = self._pending.copy()
+            new._lorient_offset = self._lorient_offset
         new._order = self._order.copy()
-        new._sections = {k: self[k].copy() for k in self._order}
+        if shared:
+            new._sections = self._sections.copy()
+            new._shared = set(self._sections)
+            self._shared = set(self._sections)
+        else:
+            new._sections = {k: self[k].copy() for k in self._order}
         return new
 
 
+class _SiteIndex:
+    """Hash lookup tables for the sites of a single :class:`VestaPhase`.
+
+    Maps site indices to their STRUC and SITET rows, and site labels and
+    element symbols to lists of site indices.
+    The rows are held by reference, so edits to them are seen here.
+
+    The index is built on first use and then kept up to date by the
+    :class:`VestaFile` methods which add, remove or move sites.
+    Accessing STRUC or SITET through :meth:`VestaFile.__getitem__` (which
+    hands them out for editing) discards the index. If they are replaced or
+    change length behind our back anyway, :meth:`is_current` reports it and
+    the index gets rebuilt.
+    """
+
+    def __init__(self, phase: VestaPhase):
+        self.struc = phase["STRUC"].data
+        self.sitet = phase["SITET"].data
+        self.struc_rows = {}
+        self.sitet_rows = {}
+        self.labels = {}
+        self.elements = {}
+        for row in self.struc:
+            # Only the first of the two rows of each site has 9 entries.
+            if len(row) == 9:
+                self._add_struc_row(row)
+        for row in self.sitet[:-1]:
+            self.sitet_rows[row[0]] = row
+        self._record_lengths()
+        self._grid = None
+
+    def _record_lengths(self):
+        self._nstruc = len(self.struc)
+        self._nsitet = len(self.sitet)
+
+    def _add_struc_row(self, row: list):
+        index = row[0]
+        self.struc_rows[index] = row
+        self.elements.setdefault(row[1], []).append(index)
+        self.labels.setdefault(row[2], []).append(index)
+
+    def is_current(self, phase: VestaPhase) -> bool:
+        """Whether the index still matches the sections of `phase`."""
+        return (phase["STRUC"].data is self.struc
+                and phase["SITET"].data is self.sitet
+                and len(self.struc) == self._nstruc
+                and len(self.sitet) == self._nsitet)
+
+    @property
+    def grid(self) -> "_SpatialGrid":
+        """Spatial grid of the sites, built on first use."""
+        if self._grid is None:
+            self._grid = _SpatialGrid(self.struc_rows.values())
+        return self._grid
+
+    def append(self, struc_row: list, sitet_row: list):
+        """Record a site which has just been added to STRUC and SITET."""
+        self._add_struc_row(struc_row)
+        self.sitet_rows[sitet_row[0]] = sitet_row
+        self._record_lengths()
+        if self._grid is not None:
+            if self._grid.crowded:
+                # Rebuild with finer bins next time it is needed.
+                self._grid = None
+            else:
+                self._grid.insert(struc_row)
+
+    def delete(self, rows: list[list]):
+        """Forget sites which have just been removed from STRUC and SITET.
+
+        Call after the surviving rows have been renumbered.
+
+        Args:
+            rows: The removed STRUC rows.
+        """
+        if self._grid is not None:
+            try:
+                for row in rows:
+                    self._grid.remove(row)
+            except KeyError:
+                # A site was moved by direct edits. Rebuild when needed.
+                self._grid = None
+        # Site indices have shifted, so the tables are remade in one pass.
+        survivors = [row for row in self.struc if len(row) == 9]
+        self.struc_rows = {}
+        self.labels = {}
+        self.elements = {}
+        for row in survivors:
+            self._add_struc_row(row)
+        self.sitet_rows = {row[0]: row for row in self.sitet[:-1]}
+        self._record_lengths()
+
+    def sites_with_element(self, element: str) -> list[int]:
+        """Site indices of sites with element symbol `element`."""
+        return self.elements.get(element, [])
+
+    def sites_with_label(self, label: str) -> list[int]:
+        """Site indices of sites with site label `label`."""
+        return self.labels.get(label, [])
+
+
+def _vector_type_style(polar: bool = False, radius: float = 0.5,
+                       r: int = 255, g: int = 0, b: int = 0,
+                       penetrate_atoms: bool = True,
+                       add_atom_radius: bool = False) -> tuple[int, tuple]:
+    """Polar flag (:ref:`VECTR`) and formatting (:ref:`VECTT`, after the
+    index) written by :meth:`VestaFile.add_vector_type` for these
+    arguments."""
+    return int(polar), (radius, r, g, b,
+                        penetrate_atoms + 2 * add_atom_radius)
+
+
+class _VectorIndex:
+    """Positions of the vector type blocks in :ref:`VECTR`.
+
+    Each block is a row defining the vector type, then rows attaching it to
+    sites, then a row of 0's. Rows are never 0-indexed otherwise, so a row
+    starting with 0 ends a block.
+    """
+
+    def __init__(self, data: list[list]):
+        self.data = data
+        # Vector type -> [row of definition, row of block end]
+        self.blocks = {}
+        start = None
+        for i, row in enumerate(data):
+            if row[0] == 0:
+                if start is not None:
+                    self.blocks[data[start][0]] = [start, i]
+                start = None
+            elif start is None:
+                start = i
+        # A block missing its end is malformed. Record it without an end.
+        if start is not None:
+            self.blocks[data[start][0]] = [start, None]
+        self.length = len(data)
+
+    def is_current(self, data: list[list]) -> bool:
+        """Whether the index still matches `data`."""
+        return data is self.data and len(data) == self.length
+
+    def find(self, type: int) -> Union[list[int], None]:
+        """[start, end] rows of block `type`, or None if not present.
+
+        Returns None as well if the block has moved (VECTR was edited
+        directly).
+        """
+        block = self.blocks.get(type)
+        if block is None:
+            return None
+        start, end = block
+        if self.data[start][0] != type or \
+                (end is not None and self.data[end][0] != 0):
+            return None
+        return block
+
+    def append_block(self, type: int):
+        """Record that a new two-row block was inserted before the last row."""
+        start = self.length - 1
+        self.blocks[type] = [start, start + 1]
+        self.length += 2
+
+    def grow(self, type: int, count: int):
+        """Record that `count` rows were inserted at the end of block `type`.
+
+        Negative `count` records rows removed from the block.
+        """
+        start = self.blocks[type][0]
+        for block in self.blocks.values():
+            if block[0] > start:
+                block[0] += count
+                block[1] += count
+        self.blocks[type][1] += count
+        self.length += count
+
+
+def _periodic_distance(cell: list[list[float]], p1: list[float],
+                       p2: list[float]) -> float:
+    """Cartesian distance between two points in fractional coordinates,
+    taking the nearest image along each lattice vector."""
+    # Difference vector, in fractional coordinates.
+    diff = [p1[i] - p2[i] for i in range(3)]
+    # Round to nearest integer for number of images
+    diff_min = [x - round(x) for x in diff]
+    # Convert from fractional to Cartesian.
+    diff_c = [sum(diff_min[i] * cell[i][j] for i in range(3))
+              for j in range(3)]
+    # Get the Euclidean distance
+    return math.sqrt(sum(x**2 for x in diff_c))
+
+
+class _SpatialGrid:
+    """Bins STRUC rows on a regular grid of fractional coordinates.
+
+    Coordinates are wrapped periodically into [0, 1) to find their bin, while
+    queries test the coordinates as stored.
+    Supports box queries (non-periodic, like :meth:`VestaFile.find_sites`)
+    and periodic sphere and slab queries, each visiting only the bins which
+    can hold matches.
+
+    Rows are binned by their coordinates at the time of insertion.
+    """
+
+    def __init__(self, rows, n: int = None):
+        """
+        Args:
+            rows: STRUC rows (the first row of each site).
+            n: Number of bins along each axis. By default, chosen to give
+                about two sites per bin.
+        """
+        rows = list(rows)
+        if n is None:
+            n = max(1, round((len(rows) / 2) ** (1 / 3)))
+        self.n = n
+        self.bins = {}
+        self.count = 0
+        for row in rows:
+            self.insert(row)
+
+    @property
+    def crowded(self) -> bool:
+        """Whether the bins have become too full to be efficient."""
+        return self.count > 16 * self.n**3
+
+    def _cell(self, row: list) -> tuple[int, int, int]:
+        n = self.n
+        return tuple(math.floor(x * n) % n for x in row[4:7])
+
+    def insert(self, row: list):
+        """Adds a site to the grid."""
+        self.bins.setdefault(self._cell(row), []).append(row)
+        self.count += 1
+
+    def remove(self, row: list):
+        """Removes a site from the grid (matched by identity)."""
+        cell = self._cell(row)
+        rows = self.bins[cell]
+        for i, other in enumerate(rows):
+            if other is row:
+                del rows[i]
+                break
+        else:
+            raise KeyError("Site not in grid.")
+        if not rows:
+            del self.bins[cell]
+        self.count -= 1
+
+    def _axis_bins(self, lo: float, hi: float) -> list[int]:
+        """Bins along one axis which overlap [lo, hi] (after wrapping)."""
+        n = self.n
+        first = math.floor(lo * n)
+        last = math.floor(hi * n)
+        if last - first + 1 >= n:
+            return list(range(n))
+        return [i % n for i in range(first, last + 1)]
+
+    def _rows_in(self, cells: Iterator[tuple[int, int, int]],
+                 ncells: int) -> Iterator[list]:
+        """Yields the rows in the given bins.
+
+        If there are more bins to look at than bins with sites in them, we
+        instead go through the latter.
+        """
+        if ncells >= len(self.bins):
+            cells = set(cells)
+            for cell, rows in self.bins.items():
+                if cell in cells:
+                    yield from rows
+        else:
+            for cell in cells:
+                yield from self.bins.get(cell, ())
+
+    def box(self, xmin: float, xmax: float, ymin: float, ymax: float,
+            zmin: float, zmax: float) -> Iterator[list]:
+        """Yields rows with coordinates in the box (not periodic)."""
+        if xmin > xmax or ymin > ymax or zmin > zmax:
+            return
+        xs = self._axis_bins(xmin, xmax)
+        ys = self._axis_bins(ymin, ymax)
+        zs = self._axis_bins(zmin, zmax)
+        cells = ((i, j, k) for i in xs for j in ys for k in zs)
+        for row in self._rows_in(cells, len(xs) * len(ys) * len(zs)):
+            if xmin <= row[4] <= xmax and ymin <= row[5] <= ymax and \
+                    zmin <= row[6] <= zmax:
+                yield row
+
+    def sphere(self, centre: list[float], radius: float,
+               cell: list[list[float]]) -> Iterator[list]:
+        """Yields rows with a periodic image within `radius` of `centre`.
+
+        Args:
+            centre: Fractional coordinates.
+            radius: Cartesian radius.
+            cell: Lattice vectors, as rows of a 3x3 matrix.
+        """
+        inverse = invert_matrix(cell)
+        # Half-width of the sphere along each fractional axis.
+        extent = [radius * math.sqrt(sum(inverse[j][i]**2 for j in range(3)))
+                  for i in range(3)]
+        axes = [self._axis_bins(c - e, c + e) for c, e in zip(centre, extent)]
+        cells = ((i, j, k) for i in axes[0] for j in axes[1] for k in axes[2])
+        ncells = len(axes[0]) * len(axes[1]) * len(axes[2])
+        eps = 1e-9
+        r2 = radius**2 + eps
+        for row in self._rows_in(cells, ncells):
+            diff = [row[4 + i] - centre[i] for i in range(3)]
+            # Lattice translations which could bring the site close enough.
+            shifts = [range(math.ceil(-e - d - eps),
+                            math.floor(e - d + eps) + 1)
+                      for d, e in zip(diff, extent)]
+            found = False
+            for s0 in shifts[0]:
+                for s1 in shifts[1]:
+                    for s2 in shifts[2]:
+                        f = (diff[0] + s0, diff[1] + s1, diff[2] + s2)
+                        d2 = sum(sum(f[i] * cell[i][j] for i in range(3))**2
+                                 for j in range(3))
+                        if d2 <= r2:
+                            found = True
+                            break
+                    if found:
+                        break
+                if found:
+                    break
+            if found:
+                yield row
+
+    def slab(self, hkl: list[int], lo: float, hi: float) -> Iterator[list]:
+        """Yields rows with h*x + k*y + l*z in [lo, hi] (modulo integers).
+
+        Args:
+            hkl: Integer Miller indices, not all zero.
+            lo, hi: Bounds of the slab, in units of the interplanar spacing.
+        """
+        n = self.n
+        eps = 1e-9
+        # Solve for the bins along the axis with the largest Miller index,
+        # for each column of bins along the other two.
+        a = max(range(3), key=lambda i: abs(hkl[i]))
+        b, c = [i for i in range(3) if i != a]
+        ma, mb, mc = hkl[a], hkl[b], hkl[c]
+        umin, umax = min(0, ma), max(0, ma)
+        cells = set()
+        for ib in range(n):
+            tb = (mb * ib / n, mb * (ib + 1) / n)
+            for ic in range(n):
+                tc = (mc * ic / n, mc * (ic + 1) / n)
+                t0 = min(tb) + min(tc)
+                t1 = max(tb) + max(tc)
+                # Need ma * x_a in [lo - t1 + m, hi - t0 + m], integer m.
+                found = set()
+                for m in range(math.ceil(umin - (hi - t0) - eps),
+                               math.floor(umax - (lo - t1) + eps) + 1):
+                    ends = sorted([(lo - t1 + m) / ma, (hi - t0 + m) / ma])
+                    first = math.floor(max(ends[0], 0) * n)
+                    last = min(math.floor(min(ends[1], 1) * n), n - 1)
+                    found.update(range(first, last + 1))
+                    if len(found) == n:
+                        break
+                for ia in found:
+                    key = [0, 0, 0]
+                    key[a], key[b], key[c] = ia, ib, ic
+                    cells.add(tuple(key))
+        for row in self._rows_in(cells, len(cells)):
+            s = sum(m * x for m, x in zip(hkl, row[4:7]))
+            if math.ceil(lo - s - eps) <= math.floor(hi - s + eps):
+                yield row
+
+
+class Site:
+    """Read-only view of a site, backed by its row in :ref:`STRUC`.
+
+    Reading an attribute reads the underlying row, so the view tracks
+    changes to the site. Use :meth:`copy` for a snapshot.
+
+    Also behaves as the sequence (index, element, label, x, y, z),
+    matching the entries of :meth:`VestaFile.get_structure`.
+
+    Attributes:
+        index (int): Site index (1-based).
+        element (str): Element symbol.
+        label (str): Site label.
+        occupancy (float): Site occupancy.
+        x, y, z (float): Fractional coordinates.
+    """
+    __slots__ = ("_row",)
+    # Columns of STRUC in the sequence form.
+    _columns = (0, 1, 2, 4, 5, 6)
+
+    def __init__(self, row: list):
+        self._row = row
+
+    index = property(lambda self: self._row[0])
+    element = property(lambda self: self._row[1])
+    label = property(lambda self: self._row[2])
+    occupancy = property(lambda self: self._row[3])
+    x = property(lambda self: self._row[4])
+    y = property(lambda self: self._row[5])
+    z = property(lambda self: self._row[6])
+
+    @property
+    def coords(self) -> tuple[float, float, float]:
+        """Fractional coordinates (x, y, z)."""
+        row = self._row
+        return row[4], row[5], row[6]
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self._row[j] for j in self._columns[i]]
+        return self._row[self._columns[i]]
+
+    def __len__(self) -> int:
+        return 6
+
+    def __iter__(self) -> Iterator:
+        row = self._row
+        for j in self._columns:
+            yield row[j]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Site):
+            other = other.copy()
+        return self.copy() == list(other)
+
+    def __repr__(self) -> str:
+        return f"<Site {self.index} {self.label} ({self.element}) " \
+            f"at {self.x}, {self.y}, {self.z}>"
+
+    def copy(self) -> list:
+        """Return [index, element, label, x, y, z] as a new list."""
+        row = self._row
+        return [row[0], row[1], row[2], row[4], row[5], row[6]]
+
+
+class Bond:
+    """Read-only view of a bond type, backed by its row in :ref:`SBOND`.
+
+    Reading an attribute reads the underlying row. Use :meth:`copy` for a
+    snapshot.
+
+    Also behaves as a read-only mapping with the keys of
+    :meth:`VestaFile.get_bonds`, so `vfile.add_bond(**bond)` works.
+
+    Attributes:
+        index (int): Bond index (1-based).
+        A1, A2 (str): Element symbols or site labels.
+        min_length, max_length (float): Bond length range (Angstrom).
+        search_mode (int): 1-3, as in :meth:`VestaFile.add_bond`.
+        boundary_mode (int): 1-3, as in :meth:`VestaFile.add_bond`.
+        show_polyhedra (bool)
+        search_by_label (bool)
+        style (int): 1-6, as in :meth:`VestaFile.add_bond`.
+    """
+    __slots__ = ("_row",)
+    _keys = ("A1", "A2", "min_length", "max_length", "search_mode",
+             "boundary_mode", "show_polyhedra", "search_by_label", "style")
+
+    def __init__(self, row: list):
+        self._row = row
+
+    index = property(lambda self: self._row[0])
+    A1 = property(lambda self: self._row[1])
+    A2 = property(lambda self: self._row[2])
+    min_length = property(lambda self: self._row[3])
+    max_length = property(lambda self: self._row[4])
+    search_mode = property(lambda self: self._row[5] + 1)
+    boundary_mode = property(lambda self: self._row[6] + 1)
+    show_polyhedra = property(lambda self: bool(self._row[7]))
+    search_by_label = property(lambda self: bool(self._row[8]))
+    style = property(lambda self: self._row[9] + 1)
+
+    def keys(self) -> tuple[str, ...]:
+        return self._keys
+
+    def __getitem__(self, key: str):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"<Bond {self.index} {self.A1}-{self.A2} " \
+            f"{self.min_length}-{self.max_length}>"
+
+    def copy(self) -> dict:
+        """Return the bond as a new dict, as in :meth:`VestaFile.get_bonds`."""
+        return {key: getattr(self, key) for key in self._keys}
+
+
+class SiteView:
+    """Read-only sequence of :class:`Site`'s, backed by :ref:`STRUC`.
+
+    Indexed from 0, like a list. Use :meth:`copy` for a snapshot.
+    """
+    __slots__ = ("_data",)
+
+    def __init__(self, section: VestaSection):
+        self._data = section.data
+
+    def __len__(self) -> int:
+        return (len(self._data) - 1) // 2
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("Site index out of range.")
+        # Each site takes two rows.
+        row = self._data[2 * i]
+        if len(row) != 9:
+            raise RuntimeError("Malformed STRUC.")
+        return Site(row)
+
+    def __iter__(self) -> Iterator[Site]:
+        for row in self._data:
+            if len(row) == 9:
+                yield Site(row)
+
+    def copy(self) -> list[list]:
+        """Return the sites as new lists, as in
+        :meth:`VestaFile.get_structure`."""
+        return [site.copy() for site in self]
+
+
+class BondView:
+    """Read-only sequence of :class:`Bond`'s, backed by :ref:`SBOND`.
+
+    Indexed from 0, like a list. Use :meth:`copy` for a snapshot.
+    """
+    __slots__ = ("_data",)
+
+    def __init__(self, section: VestaSection):
+        self._data = section.data
+
+    def __len__(self) -> int:
+        return len(self._data) - 1
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("Bond index out of range.")
+        return Bond(self._data[i])
+
+    def __iter__(self) -> Iterator[Bond]:
+        data = self._data
+        for i in range(len(data) - 1):
+            yield Bond(data[i])
+
+    def copy(self) -> list[dict]:
+        """Return the bonds as new dicts, as in :meth:`VestaFile.get_bonds`."""
+        return [bond.copy() for bond in self]
+
+
+_default_template = None
+
+
+def _default_vestafile() -> "VestaFile":
+    """Return the parsed default (empty) VESTA file, loading it only once.
+
+    This is a template to copy from, and must not be modified.
+    """
+    global _default_template
+    if _default_template is None:
+        template = VestaFile(importlib.resources.files(
+            vestacrystparser.resources) / "default.vesta")
+        for phase in template._phases:
+            phase._parse()
+        _default_template = template
+    return _default_template
+
+
 class VestaFile:
     """Representation of a VESTA file, with methods to manipulate it.
 
@@ -397,24 +1103,34 @@ class VestaFile:
         self._globalsections = VestaPhase()
         self.current_phase = 1
         self._vesta_format_version = None
+        # Lookup table for ATOMT, built on demand.
+        self._atomt_index = None
+        # Phases awaiting LMATRIX evaluation, in batch_update.
+        self._deferred_lmatrix = None
         if filename:
             self._load(filename)
         else:
-            # Initialise the empty VESTA file.
-            filename = importlib.resources.files(
-                vestacrystparser.resources) / "default.vesta"
-            self._load(filename)
+            # Initialise the empty VESTA file from the cached default.
+            template = _default_vestafile()
+            self._phases = [phase.copy(shared=True)
+                            for phase in template._phases]
+            self._globalsections = template._globalsections.copy()
+            self._vesta_format_version = template._vesta_format_version
 
     def _load(self, filename):
         """Load and parse a VESTA file into this instance.
 
+        Global sections are parsed immediately. The sections of each phase
+        are only split apart, and are parsed when the phase is first used.
+
         Args:
             filename (str): Path to the VESTA file.
         """
         with open(filename, 'r') as f:
             lines = f.readlines()
 
-        section = None
+        # Split into sections, as [header, header line, data lines].
+        chunks = []
         for raw_line in lines:
             # Remove only the newline character.
             line = raw_line.rstrip("\n")
@@ -426,41 +1142,56 @@ class VestaFile:
             tokens = stripped.split(maxsplit=1)
             # If we are in the line immediately after TITLE, record it
             # The title might be uppercase, and that's allowed.
-            if section is not None and section.header == "TITLE" \
-                    and len(section.data) == 0:
-                section.add_line(line)
+            if chunks and chunks[-1][0] == "TITLE" \
+                    and len(chunks[-1][2]) == 0:
+                chunks[-1][2].append(line)
             # Otherwise, an all-uppercase word is a section header.
             elif tokens and tokens[0].isupper():
                 # New section.
-                section = VestaSection(line)
-                # Identify where we are to put this section.
-                if section.header == "#VESTA_FORMAT_VERSION":
-                    self._vesta_format_version = section
-                elif section.header == "CRYSTAL":
-                    # New phase.
-                    self._phases.append(VestaPhase())
-                    self._phases[-1].append(section)
-                elif section.header in sections_that_are_global:
-                    # This section belongs outside the phase information
-                    self._globalsections.append(section)
-                else:
-                    # This section belongs in the currently active phase
-                    self._phases[-1].append(section)
+                chunks.append([tokens[0], line, []])
             else:
                 # Continuation of the current section.
-                if section is None:
+                if not chunks:
                     # This shouldn't happen. We probably have malformed data.
                     raise ValueError(
                         "Data without section header found! Line:\n"+line)
-                section.add_line(line)
+                chunks[-1][2].append(line)
+
+        for header, header_line, data in chunks:
+            # Identify where we are to put this section.
+            if header == "CRYSTAL":
+                # New phase.
+                self._phases.append(VestaPhase())
+            if header in sections_that_are_global or \
+                    header == "#VESTA_FORMAT_VERSION":
+                section = VestaSection(header_line)
+                for line in data:
+                    section.add_line(line)
+                if header == "#VESTA_FORMAT_VERSION":
+                    self._vesta_format_version = section
+                else:
+                    # This section belongs outside the phase information
+                    self._globalsections.append(section)
+            else:
+                # This section belongs in the currently active phase
+                self._phases[-1]._add_unparsed(header_line, data)
+
+    def copy(self, shared: bool = False) -> "VestaFile":
+        """Creates a copy of the VestaFile
 
-    def copy(self) -> "VestaFile":
-        """Creates a copy of the VestaFile"""
+        Args:
+            shared: If True, sections are shared with the copy and only
+                copied when accessed by name (copy-on-write), as in
+                :meth:`VestaPhase.copy`. Cheap for making many files which
+                differ in only a few sections.
+        """
         new = VestaFile.__new__(VestaFile)
-        new._phases = [x.copy() for x in self._phases]
+        new._phases = [x.copy(shared=shared) for x in self._phases]
         new._globalsections = self._globalsections.copy()
         new.current_phase = self.current_phase
         new._vesta_format_version = self._vesta_format_version
+        new._atomt_index = None
+        new._deferred_lmatrix = None
         return new
 
     def __getitem__(self, name: Union[str, tuple[str, int]]) \
@@ -477,20 +1208,40 @@ class VestaFile:
                 Some sections are global rather than tied to a phase. In such
                 cases, the phase is ignored.
 
+        As the section may then be edited, any lookup tables built from it
+        (of STRUC, SITET or ATOMT) are discarded, to be rebuilt when next
+        needed.
+
         Raises:
             IndexError: Invalid phase given.
             KeyError: Invalid name given.
         """
         # Parse a multi-argument call, because getitem is special.
         if isinstance(name, tuple):
-            phase = name[1]
+            name, phase = name
+        else:
+            phase = None
+        section = self._get_section(name, phase)
+        if name == "ATOMT":
+            self._atomt_index = None
+        elif name in ("STRUC", "SITET"):
+            if phase is None:
+                phase = self.current_phase
+            self._phases[phase - 1 if phase > 0 else phase]._site_index = None
+        return section
+
+    def _get_section(self, name: str, phase: Union[int, None] = None) \
+            -> VestaSection:
+        """Returns a section, as :meth:`__getitem__`, but keeps the lookup
+        tables.
+
+        For methods which keep the lookup tables up to date themselves.
+        """
+        if phase is not None:
             if phase == 0:
                 raise IndexError("Phases are 1-indexed, not 0.")
             if phase > 0:
                 phase -= 1
-            name = name[0]
-        else:
-            phase = None
         # Read the requested name, look for where we should grab the section
         if name == "#VESTA_FORMAT_VERSION":
             return self._vesta_format_version
@@ -511,9 +1262,13 @@ class VestaFile:
         Returns:
             True or False.       
         """
+        if isinstance(name, tuple):
+            name, phase = name
+        else:
+            phase = None
         try:
             # Why copy the __getitem__ logic when I can just do this?
-            self[name]
+            self._get_section(name, phase)
         except (KeyError, IndexError):
             return False
         else:
@@ -552,6 +1307,38 @@ class VestaFile:
             mystr += str(section)
         return mystr
 
+    @contextlib.contextmanager
+    def batch_update(self):
+        """Context manager deferring derived updates until the end.
+
+        Changing the orientation of several phases otherwise recomputes
+        the orientation matrices (LMATRIX) after each change. Inside
+        the batch, this is instead done once on exit.
+
+        e.g.
+
+        .. code-block:: python
+
+            with vfile.batch_update():
+                for i in range(2, vfile.nphases + 1):
+                    vfile.set_current_phase(i)
+                    vfile.set_phase_orientation(...)
+
+        Batches may be nested; work is done when the outermost exits.
+        """
+        if self._deferred_lmatrix is not None:
+            # Already in a batch.
+            yield self
+            return
+        self._deferred_lmatrix = set()
+        try:
+            yield self
+        finally:
+            pending = self._deferred_lmatrix
+            self._deferred_lmatrix = None
+            if pending:
+                self._evaluate_lmatrices(sorted(pending))
+
     def set_current_phase(self, phase: int):
         """Sets the currently active phase by 1-based index.
 
@@ -577,6 +1364,7 @@ class VestaFile:
             raise IndexError(
                 f"Index {phase} is out of range of a list of length {len(self._phases)}")
         self.current_phase = phase
+        self._phases[phase - 1]._parse()
 
     def __repr__(self) -> str:
         """Compact representation. Titles and number of sites of each phase."""
@@ -605,7 +1393,17 @@ class VestaFile:
     @property
     def nsites(self) -> int:
         """Number of sites in the current phase (read-only)"""
-        return len(self["SITET"].data) - 1
+        return len(self._get_section("SITET").data) - 1
+
+    @property
+    def sites(self) -> SiteView:
+        """Sites of the current phase, as a read-only view (no copying)."""
+        return SiteView(self._get_section("STRUC"))
+
+    @property
+    def bonds(self) -> BondView:
+        """Bond types of the current phase, as a read-only view (no copy)."""
+        return BondView(self["SBOND"])
 
     @property
     def nvectors(self) -> int:
@@ -642,7 +1440,7 @@ class VestaFile:
     def new_phase(self):
         """Inserts a new, empty phase at the end."""
         # Copy the empty Phase from the default VestaFile.
-        self.import_phases(VestaFile())
+        self._phases.append(_default_vestafile()._phases[0].copy(shared=True))
 
     def delete_phase(self, index: int):
         """
@@ -669,27 +1467,109 @@ class VestaFile:
     def copy_phase(self, index: int):
         """
         Copies the specified phase (1-based index) and appends at end.
+
+        If the phase has not been parsed yet, it is parsed first.
         """
         if index == 0:
             raise IndexError("Phases are 1-indexed, not 0.")
         if index > 0:
             # Convert to 0-based index for Python
             index -= 1
+        self._phases[index]._parse()
         self._phases.append(self._phases[index].copy())
 
-    def import_phases(self, vestafile: Union["VestaFile", str]):
+    def import_phases(self, vestafile: Union["VestaFile", str],
+                      phases: Union[list[int], None] = None):
         """
         Copies the phase(s) from another Vesta file (loaded or as a file).
 
         If vestafile is not a VestaFile, it will be passed to VestaFile(vestafile).
+
+        Phases which have not been parsed in `vestafile` are copied as text,
+        and only parsed when used.
+
+        Args:
+            vestafile: VestaFile or path to VESTA file to copy phases from.
+            phases: 1-based indices of the phases to copy (negative indices
+                allowed). Defaults to all of them.
+
+        Raises:
+            IndexError: Out-of-range phase given.
         """
         if not isinstance(vestafile, VestaFile):
             vestafile = VestaFile(vestafile)
-        # Restricting the range ensures we don't get memory leaks if we
-        # copy from self.
-        for phase in vestafile._phases[0:self.nphases]:
+        if phases is None:
+            phases = range(1, vestafile.nphases + 1)
+        # Check all indices first, so we don't half-import.
+        selected = []
+        for index in phases:
+            if index == 0:
+                raise IndexError("Phases are 1-indexed, not 0.")
+            if index > 0:
+                index -= 1
+            # Taking the phase now means we don't loop forever if we
+            # copy from self.
+            selected.append(vestafile._phases[index])
+        for phase in selected:
             self._phases.append(phase.copy())
 
+    def extend_phases(self, sources: list):
+        """
+        Appends many structures as new phases.
+
+        Sections are shared between the new phases and their sources until
+        either one is modified (copy-on-write), so appending is cheap.
+        Atom types (ATOMT) missing from this file are added.
+        Orientations relative to other phases of the same source are
+        re-pointed at the new phases. Their orientation matrices (LMATRIX)
+        need no update, as the phase they refer to is copied along with
+        them. Phases not yet parsed stay so; they are re-pointed when
+        parsed.
+
+        Args:
+            sources: List of things to add phases from. Each may be a
+                :class:`VestaFile` (all phases are added), a path to a VESTA
+                file, a :class:`VestaPhase`, or a pymatgen Structure (which is
+                converted with
+                :func:`vestacrystparser.convert.vesta_from_structure`).
+
+        Related sections: :ref:`ATOMT`, :ref:`LORIENT`, :ref:`LMATRIX`
+        """
+        for source in sources:
+            if isinstance(source, VestaPhase):
+                self._phases.append(source.copy(shared=True))
+                continue
+            if isinstance(source, (str, os.PathLike)):
+                source = VestaFile(source)
+            elif not isinstance(source, VestaFile):
+                # Import here, as convert depends on this module.
+                from vestacrystparser.convert import vesta_from_structure
+                source = vesta_from_structure(source)
+            offset = self.nphases
+            # Taking the list now means we don't loop forever if we
+            # copy from self.
+            for phase in list(source._phases):
+                new = phase.copy(shared=True)
+                self._phases.append(new)
+                # Re-point orientations relative to the source's phases.
+                if not new.is_parsed:
+                    new._lorient_offset += offset
+                    continue
+                if new._lorient_reference() >= 0:
+                    new["LORIENT"].data[0][0] += offset
+            if source is not self:
+                self._merge_atom_types(source)
+
+    def _merge_atom_types(self, other: "VestaFile"):
+        """Add the atom types of another VestaFile which are missing here.
+
+        Related sections: :ref:`ATOMT`
+        """
+        section = self._get_section("ATOMT")
+        for row in other._get_section("ATOMT").data[:-1]:
+            if self._find_atom_type(row[1]) is None:
+                section.data.insert(-1, [len(section.data)] + row[1:])
+
     def rearrange_phases(self, new_order: list[int]):
         """
         Re-orders phases to match the order given by new_order.
@@ -714,6 +1594,88 @@ class VestaFile:
         # Update current_phase
         self.current_phase = new_order.index(self.current_phase) + 1
 
+    # Lookup tables.
+    def _get_site_index(self, phase: int = None,
+                        rebuild: bool = False) -> _SiteIndex:
+        """Return the site lookup tables of a phase, building them if needed.
+
+        Args:
+            phase: 1-based index of phase. Defaults to current phase.
+            rebuild: Discard any existing tables and build them anew.
+        """
+        if phase is None:
+            phase = self.current_phase
+        if phase == 0:
+            raise IndexError("Phases are 1-indexed, not 0.")
+        if phase > 0:
+            phase -= 1
+        vphase = self._phases[phase]
+        index = vphase._site_index
+        if rebuild or index is None or not index.is_current(vphase):
+            index = _SiteIndex(vphase)
+            vphase._site_index = index
+        return index
+
+    def _sites_with_element(self, element: str) -> list[int]:
+        """Indices of sites in the current phase with the given element."""
+        return self._get_site_index().sites_with_element(element)
+
+    def _sites_with_label(self, label: str) -> list[int]:
+        """Indices of sites in the current phase with the given label."""
+        return self._get_site_index().sites_with_label(label)
+
+    def _get_vector_index(self, rebuild: bool = False) -> _VectorIndex:
+        """Return the VECTR block positions of the current phase."""
+        vphase = self._phases[self.current_phase - 1]
+        data = self["VECTR"].data
+        index = vphase._vector_index
+        if rebuild or index is None or not index.is_current(data):
+            index = _VectorIndex(data)
+            vphase._vector_index = index
+        return index
+
+    def _find_vector_block(self, type: int) -> list[int]:
+        """Return the [start, end] rows of a block in VECTR.
+
+        Raises:
+            IndexError: Vector of type `type` does not exist.
+            RuntimeError: Block has no end.
+        """
+        block = self._get_vector_index().find(type)
+        if block is None:
+            block = self._get_vector_index(rebuild=True).find(type)
+        if block is None:
+            raise IndexError(f"Vector of type {type} does not exist.")
+        if block[1] is None:
+            raise RuntimeError(
+                "Malformed VECTR; no block termination detected.")
+        return block
+
+    def _find_atom_type(self, element: Union[str, int]) -> Union[list, None]:
+        """Return the ATOMT row for an element (by symbol or index), or None.
+
+        The row is returned by reference.
+        """
+        data = self._get_section("ATOMT").data
+        if isinstance(element, int):
+            # Rows are numbered sequentially.
+            if 0 < element < len(data) and data[element - 1][0] == element:
+                return data[element - 1]
+            for row in data[:-1]:
+                if row[0] == element:
+                    return row
+            return None
+        cache = self._atomt_index
+        # Rebuild if ATOMT was replaced or changed length.
+        if cache is None or cache[0] is not data or cache[1] != len(data):
+            table = {}
+            for row in data[:-1]:
+                # Keep the first match, as a linear search would.
+                table.setdefault(row[1], row)
+            cache = (data, len(data), table)
+            self._atomt_index = cache
+        return cache[2].get(element)
+
     # Methods for modifying the system.
     def set_site_color(self, index: Union[int, list[int]],
                        r: int, g: int, b: int):
@@ -736,21 +1698,21 @@ class VestaFile:
         if 0 in index:
             raise IndexError(
                 "Illegal site index 0 given! Remember VESTA is 1-based.")
-        atom_section = self["SITET"]
-        if atom_section is None:
+        if "SITET" not in self:
             # TODO: Custom Error type for improper format?
             raise TypeError("No SITET section found!")
-        for i, line in enumerate(atom_section.data):
-            if isinstance(line, list) and len(line) >= 6:
-                # Check for matching index:
-                if line[0] in index:
-                    changed = True
-                    # Update the color tokens.
-                    line[3] = r
-                    line[4] = g
-                    line[5] = b
-            else:
-                raise TypeError(f"Unexpected format in SITET line {i}: {line}")
+        site_index = self._get_site_index()
+        for i in index:
+            line = site_index.sitet_rows.get(i)
+            if line is None:
+                continue
+            if len(line) < 6:
+                raise TypeError(f"Unexpected format in SITET line: {line}")
+            changed = True
+            # Update the color tokens.
+            line[3] = r
+            line[4] = g
+            line[5] = b
         # Issue a warning to the user if no atoms were changed,
         # which can happen if you specify invalid indices.
         if not changed:
@@ -770,40 +1732,135 @@ class VestaFile:
 
         Related sections: :ref:`ATOMT`, :ref:`SITET`.
         """
-        section = self["ATOMT"]
         # Are we matching by index or symbol?
-        if isinstance(element, str):
-            col = 1
-        elif isinstance(element, int):
-            col = 0
-        else:
+        if not isinstance(element, (str, int)):
             raise TypeError(
                 "Expected element to be int or str, got " + str(type(element)))
         if element == 0:
             raise IndexError(
                 "Illegal site index 0 given! Remember VESTA is 1-based.")
         # Find the row with the matching element
-        found = False
-        for row in section.data:
-            if row[col] == element:
-                found = True
-                break
-        if not found:
+        row = self._find_atom_type(element)
+        if row is None:
             logger.warning(f"No elements of type {element} found!")
             return
         # Set the colour
         row[3:6] = r, g, b
         # If required, find the sites with this element and edit them too.
         if overwrite_site_colors:
-            # Grab the element symbol
-            element = row[1]
-            # Search through the structure
-            section = self["STRUC"]
-            # Grab the site indices of entries with a matching element symbol.
-            for row in section.data:
-                if row[1] == element:
-                    # Found a matching element. Edit the site colour
-                    self.set_site_color(row[0], r, g, b)
+            sites = self._sites_with_element(row[1])
+            if sites:
+                self.set_site_color(sites, r, g, b)
+
+    def set_site_colors(self, indices: Union[list[int], None], rgb: list):
+        """Set the RGB colours of many sites at once.
+
+        Args:
+            indices: Site indices (1-based), or None for all sites in order.
+            rgb: One (r, g, b) triplet (0-255) per entry of `indices`.
+                May be any nested sequence, such as an (N,3) numpy array.
+
+        Raises:
+            IndexError: Site index not found.
+            ValueError: `rgb` and `indices` differ in length, or an entry of
+                `rgb` is not three numbers.
+
+        Related sections: :ref:`SITET`.
+        """
+        site_index = self._get_site_index()
+        if indices is None:
+            indices = sorted(site_index.sitet_rows)
+        if len(indices) != len(rgb):
+            raise ValueError(
+                f"Got {len(rgb)} colours for {len(indices)} sites.")
+        # Check everything before changing anything.
+        rows = []
+        for i in indices:
+            row = site_index.sitet_rows.get(i)
+            if row is None:
+                raise IndexError(f"No site with index {i} found.")
+            rows.append(row)
+        colors = []
+        for color in rgb:
+            if len(color) != 3:
+                raise ValueError(f"Expected (r, g, b), got {color}.")
+            colors.append([int(x) for x in color])
+        for row, color in zip(rows, colors):
+            row[3:6] = color
+
+    def color_sites_by(self, values: list[float],
+                       colormap: Union[str, list, Callable] = "B-W-R",
+                       vmin: float = None, vmax: float = None,
+                       indices: list[int] = None):
+        """Colour sites according to a per-site scalar, such as charge.
+
+        Args:
+            values: One number per site (in site order), or per entry of
+                `indices`. NaN values leave the site colour unchanged.
+            colormap: How to turn values into colours. One of
+
+                - The name of a colour map in :data:`site_color_maps`.
+                - A list of (r, g, b) stops (0-255), spaced evenly from
+                  `vmin` to `vmax`.
+                - A callable taking a number from 0 to 1 and returning
+                  (r, g, b) or (r, g, b, a), with either int (0-255) or
+                  float (0-1) components, e.g. a matplotlib colormap.
+
+            vmin, vmax: Values mapped to either end of the colour map.
+                Default to the minimum and maximum of `values`.
+                Values outside this range are clipped.
+            indices: Site indices (1-based) matching `values`.
+                Defaults to all sites.
+
+        Related sections: :ref:`SITET`.
+        """
+        if indices is None:
+            indices = sorted(self._get_site_index().sitet_rows)
+        if len(indices) != len(values):
+            raise ValueError(
+                f"Got {len(values)} values for {len(indices)} sites.")
+        # Drop NaNs.
+        pairs = [(i, float(v)) for i, v in zip(indices, values) if v == v]
+        if not pairs:
+            return
+        # Get the range of the colour map.
+        if vmin is None:
+            vmin = min(v for _, v in pairs)
+        if vmax is None:
+            vmax = max(v for _, v in pairs)
+        span = vmax - vmin
+        # Configure the colour map.
+        if isinstance(colormap, str):
+            colormap = site_color_maps[colormap]
+        if callable(colormap):
+            def lookup(t):
+                color = colormap(t)[0:3]
+                # Any non-integer (e.g. numpy float32) means 0-1 components.
+                if any(isinstance(x, numbers.Real) and
+                       not isinstance(x, numbers.Integral) for x in color):
+                    return [round(x * 255) for x in color]
+                return color
+        else:
+            stops = colormap
+            nstops = len(stops)
+            if nstops < 2:
+                raise ValueError("A colour map needs at least two stops.")
+
+            def lookup(t):
+                # Linear interpolation between the stops.
+                pos = t * (nstops - 1)
+                k = min(int(pos), nstops - 2)
+                frac = pos - k
+                return [round(c1 + (c2 - c1) * frac)
+                        for c1, c2 in zip(stops[k], stops[k+1])]
+        colors = []
+        for _, v in pairs:
+            if span > 0:
+                t = min(max((v - vmin) / span, 0.0), 1.0)
+            else:
+                t = 0.5
+            colors.append(lookup(t))
+        self.set_site_colors([i for i, _ in pairs], colors)
 
     def add_lattice_plane(self, h: float, k: float, l: float, distance: float,
                           r: int = 255, g: int = 0, b: int = 255,
@@ -849,7 +1906,7 @@ class VestaFile:
                 line[0] = i + 1
 
     def add_isosurface(self,
-                       level: float,
+                       level: Union[float, list[float]],
                        mode: int = 0,
                        r: int = 255,
                        g: int = 255,
@@ -862,7 +1919,8 @@ class VestaFile:
         Mimics Properties > Isosurfaces > Isosurfaces.
 
         Args:
-            level: isosurface threshold.
+            level: isosurface threshold. If a list, adds an isosurface at
+                each level, all with the same style.
             mode: flag. 0=Positive and Negative, 1=Positive, 2=Negative.
             r, g, b: Colour of isosurface (0-255).
             opacity1: Opacity of polygons parallel to the screen (0-255).
@@ -874,12 +1932,15 @@ class VestaFile:
         # Validate inputs
         if mode not in [0, 1, 2]:
             raise ValueError(f"Mode is expected to be 0, 1, or 2, not {mode}.")
-        # What is the new index?
-        index = len(section)
-        # Construct the new row
-        row = [index, mode, level, r, g, b, opacity1, opacity2]
-        # Append the new row
-        section.data.insert(index-1, row)
+        if not isinstance(level, (list, tuple)):
+            level = [level]
+        for x in level:
+            # What is the new index?
+            index = len(section)
+            # Construct the new row
+            row = [index, mode, x, r, g, b, opacity1, opacity2]
+            # Append the new row
+            section.data.insert(index-1, row)
 
     def edit_isosurface(self,
                         index: int,
@@ -1198,7 +2259,7 @@ class VestaFile:
         """Unhides all hidden polyhedra (DLPLY)"""
         self["DLPLY"].data = [[-1]]
 
-    def _reset_hidden(self):
+    def _reset_hidden(self, atoms: bool = True):
         """Handles DLATM, DLBND, and DLPLY, reverting them to null if not null.
 
         You should call this when your function potentially changes the number
@@ -1208,20 +2269,51 @@ class VestaFile:
         add bonds that can connect to older atoms.
         But I also note that VESTA's default behaviour seems to be to reset
         hidden flags as well if the visible atoms change.
+
+        Args:
+            atoms: Reset DLATM too. (If False, only bonds and polyhedra.)
         """
-        if self["DLATM"].data != [[-1]]:
+        # Only read, so sections shared with copies stay shared unless they
+        # need resetting.
+        phase = self._phases[self.current_phase - 1]
+        if atoms and phase._peek("DLATM").data != [[-1]]:
             logger.warning(
                 "Reseting atom visibility (computing hidden atoms not supported).")
             self.unhide_atoms()
-        if self["DLBND"].data != [[-1]]:
+        if phase._peek("DLBND").data != [[-1]]:
             logger.warning(
                 "Reseting bond visibility (computing hidden bonds not supported).")
             self.unhide_bonds()
-        if self["DLPLY"].data != [[-1]]:
+        if phase._peek("DLPLY").data != [[-1]]:
             logger.warning(
                 "Reseting polyhedra visibility (computing hidden polyhedra not supported).")
             self.unhide_polyhedra()
 
+    def _drawn_atom_counts(self) -> Union[list[int], None]:
+        """Number of atoms drawn for each site, or None if not known.
+
+        DLATM indexes the drawn atoms, which are numbered site by site. Only
+        counted without symmetry (P1) and without bonds which draw atoms
+        beyond the boundary, when each site is drawn at each of its periodic
+        images within the boundary (BOUND).
+        """
+        if self["GROUP"].data != [[1, 1, "P", 1]]:
+            return None
+        for bond in self["SBOND"].data[:-1]:
+            # Boundary mode 1 (stored as 0) searches within the boundary only.
+            if len(bond) > 6 and bond[6] != 0:
+                return None
+        bound = self["BOUND"].data[0]
+        counts = []
+        for site in self.sites:
+            count = 1
+            for x, lo, hi in zip(site.coords, bound[0:6:2], bound[1:6:2]):
+                # Images x + n within [lo, hi], including those on the edges.
+                count *= max(0, math.floor(hi - x + _BOUNDARY_TOLERANCE)
+                             - math.ceil(lo - x - _BOUNDARY_TOLERANCE) + 1)
+            counts.append(count)
+        return counts
+
     def set_boundary(self, xmin: float = None, xmax: float = None,
                      ymin: float = None, ymax: float = None,
                      zmin: float = None, zmax: float = None):
@@ -1427,151 +2519,361 @@ class VestaFile:
                 While not the default behaviour in VESTA, this is provided as a
                 convenience function.
 
-        Related sections: :ref:`STRUC`, :ref:`THERI`, :ref:`THERM`, :ref:`ATOMT`,
-        :ref:`SITET`, :ref:`ATOMS`, :ref:`SBOND`
-        """
-        # Add to structure parameters.
-        section = self["STRUC"]
-        new_idx = (len(section.data) - 1) // 2 + 1
-        section.data.insert(-1, [new_idx, symbol, label,
-                            occupation, x, y, z, '1a', 1])
-        section.data.insert(-1, [dx, dy, dz, charge])
-        # Add the uncertainty entry
-        section = self["THERI"]
-        section.data.insert(-1, [new_idx, label, U])
-        # If applicable, add anisotropic uncertainty entry
-        if "THERM" in self:
-            section = self["THERM"]
-            section.data.insert(-1, [new_idx, label] + [0.0]*6)
-        # Add new element if applicable.
-        # Otherwise find defaults
-        section = self["ATOMT"]
-        found = False
-        for element in section.data:
-            if element[1] == symbol:
-                found = True
-                break
-        if not found:
-            # Create a new element
-            element_data = load_elements_data(symbol)
-            # Figure out which radius to use
-            radii_type = self["ATOMS"].inline[0]
-            # 0=atomic, 1=ionic, 2=vdW.
-            # elements_data has 2=atomic, 3=vdW, 4=ionic.
-            radii_type = {0: 2, 1: 4, 2: 3}[radii_type]
-            element = [len(section.data), symbol, element_data[radii_type]] + \
-                element_data[5:] + element_data[5:] + [204]
-            section.data.insert(-1, element)
+        Related sections: :ref:`STRUC`, :ref:`THERI`, :ref:`THERM`,
+        :ref:`ATOMT`, :ref:`SITET`, :ref:`ATOMS`, :ref:`SBOND`
+        """
+        self.add_sites([(symbol, label, x, y, z, dx, dy, dz, occupation,
+                         charge, U)], add_bonds=add_bonds)
+
+    def add_sites(self, sites: Iterable[Sequence],
+                  add_bonds: bool = False) -> list[int]:
+        """Adds many sites at once.
+
+        Gives exactly the same result as calling :meth:`add_site` for each
+        site in turn, but is much faster for many sites. Lookup tables are
+        built once rather than per site, and when looking for sites in range
+        of new default bonds, only nearby sites are checked (using a spatial
+        grid) rather than every site of the element.
+
+        Args:
+            sites: Sequences of the arguments of :meth:`add_site`, in order:
+                (symbol, label, x, y, z), optionally followed by dx, dy, dz,
+                occupation, charge and U.
+            add_bonds: Create new bonds if applicable, as in
+                :meth:`add_site`.
+
+        Returns:
+            Indices (1-based) of the new sites.
+
+        Related sections: :ref:`STRUC`, :ref:`THERI`, :ref:`THERM`,
+        :ref:`ATOMT`, :ref:`SITET`, :ref:`ATOMS`, :ref:`SBOND`
+        """
+        # Grab the site lookup tables before we modify anything.
+        site_index = self._get_site_index()
+        struc = self._get_section("STRUC").data
+        theri = self["THERI"].data
+        therm = self["THERM"].data if "THERM" in self else None
+        atomt = self._get_section("ATOMT").data
+        sitet = self._get_section("SITET").data
+        # 0=atomic, 1=ionic, 2=vdW.
+        # elements_data has 2=atomic, 3=vdW, 4=ionic.
+        radii_type = {0: 2, 1: 4, 2: 3}[self["ATOMS"].inline[0]]
+        defaults = [0.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+        # Things only needed for adding bonds.
+        cell = self.get_cell_matrix() if add_bonds else None
+        grids = {}  # Spatial grids of the sites of each element.
+        bonded = None  # Element pairs which have bonds (or H-bonds).
+        reset = False
+        new_indices = []
+        for site in sites:
+            if not 5 <= len(site) <= 11:
+                raise ValueError("Sites need between 5 and 11 parameters, "
+                                 f"not {len(site)}.")
+            symbol, label, x, y, z, dx, dy, dz, occupation, charge, U = \
+                list(site) + defaults[len(site) - 5:]
+            # Add to structure parameters.
+            new_idx = (len(struc) - 1) // 2 + 1
+            struc_row = [new_idx, symbol, label, occupation, x, y, z, '1a', 1]
+            struc.insert(-1, struc_row)
+            struc.insert(-1, [dx, dy, dz, charge])
+            # Add the uncertainty entry
+            theri.insert(-1, [new_idx, label, U])
+            # If applicable, add anisotropic uncertainty entry
+            if therm is not None:
+                therm.insert(-1, [new_idx, label] + [0.0]*6)
+            # Add new element if applicable.
+            # Otherwise find defaults
+            element = self._find_atom_type(symbol)
+            if element is None:
+                # Create a new element
+                element_data = load_elements_data(symbol)
+                element = [len(atomt), symbol, element_data[radii_type]] + \
+                    element_data[5:] + element_data[5:] + [204]
+                atomt.insert(-1, element)
             # If requested, create new bonds.
-        if add_bonds:
-            # Get the atomic symbols of the other elements.
-            # (Also this element.)
-            # Read from ATOMT
-            other_symbols = [section.data[i][1]
-                             for i in range(len(section.data)-1)]
-            for A2 in other_symbols:
-                # Check if we already have a bond for this set of elements.
-                current_bonds = self.get_bonds()
-                found = False
-                for b in current_bonds:
-                    if ([symbol, A2] == [b["A1"], b["A2"]]
-                            or [A2, symbol] == [b["A1"], b["A2"]]) \
-                            and b["min_length"] == 0:
-                        found = True
-                        break
-                if not found:
-                    # If not, load it.
-                    bond = load_default_bond_style(symbol, A2)
-                    # Then check if we are under the maximum bond length.
-                    if bond is not None:
-                        structure = self.get_structure()
-                        found = False
-                        # Look over all by the last site (which we just added)
-                        for site in structure[:-1]:
-                            if site[1] == A2:
-                                if self.distance(x, y, z, site[3], site[4], site[5]) <= bond[4]:
-                                    found = True
-                                    break
-                        if not found:
-                            bond = None
-                else:
+            if add_bonds:
+                if bonded is None:
+                    bonded = self._bonded_pairs()
+                # Get the atomic symbols of the other elements.
+                # (Also this element.)
+                for A2 in [row[1] for row in atomt[:-1]]:
                     bond = None
-                # If there is a hydrogen bond, load it.
-                if symbol == "H" or A2 == "H":
-                    # Check that we don't already have a hydrogen bond.
-                    found = False
-                    for b in current_bonds:
-                        if ([symbol, A2] == [b["A1"], b["A2"]]
-                                or [A2, symbol] == [b["A1"], b["A2"]]) \
-                                and b["min_length"] > 0:
-                            found = True
-                            break
-                    if not found:
+                    hbond = None
+                    # Check if we already have a bond for this set of elements.
+                    if (symbol, A2) not in bonded[0]:
                         # If not, load it.
-                        hbond = load_default_bond_style(symbol, A2, hbond=True)
-                        # Then check if we are at the right bond length.
+                        bond = load_default_bond_style(symbol, A2)
+                        # Then check if we are under the maximum bond length.
+                        # Look over all but the site we just added (which
+                        # isn't in site_index yet).
+                        if bond is not None and not self._any_site_within(
+                                site_index, grids, A2, [x, y, z], bond[4],
+                                cell):
+                            bond = None
+                    # If there is a hydrogen bond, load it.
+                    # Check that we don't already have a hydrogen bond.
+                    if (symbol == "H" or A2 == "H") and \
+                            (symbol, A2) not in bonded[1]:
                         # (Ooh, this will be tricky. Because I don't
                         # necessarily want the minimum lengths...)
-                    else:
-                        hbond = None
+                        hbond = load_default_bond_style(symbol, A2,
+                                                        hbond=True)
+                    for b in [bond, hbond]:
+                        if b is not None:
+                            self.add_bond(b[1], b[2],
+                                          min_length=b[3],
+                                          max_length=b[4],
+                                          search_mode=b[5]+1,
+                                          boundary_mode=b[6]+1,
+                                          show_polyhedra=bool(b[7]),
+                                          search_by_label=bool(b[8]),
+                                          style=b[9]+1,
+                                          )
+                            bonded = self._bonded_pairs()
+            # Use found data to set-up a new site
+            params = element[2:10]  # Radius, RGB, RGB, 204
+            sitet_row = [new_idx, label] + params + [0]
+            sitet.insert(-1, sitet_row)
+            site_index.append(struc_row, sitet_row)
+            if symbol in grids:
+                grids[symbol].insert(struc_row)
+            new_indices.append(new_idx)
+            # Correct the hidden atoms, bonds, polyhedra if required.
+            # If this site might bond to other sites outside the boundary, we
+            # need to reset. Or if it might draw new bonds from older bonds,
+            # we'd also need to reset.
+            # (Really, we're doing better than VESTA, because VESTA doesn't
+            # even track this.)
+            if not reset:
+                for bond in self.bonds:
+                    # Check if we have matching elements.
+                    if bond.A1 == "XX" or bond.A2 == "XX" or \
+                            bond.search_by_label and \
+                            (bond.A1 == label or bond.A2 == label) or \
+                            not bond.search_by_label and \
+                            (bond.A1 == element or bond.A2 == element):
+                        reset = True
+                        break
+        if reset:
+            self._reset_hidden()
+        return new_indices
+
+    def _bonded_pairs(self) -> tuple[set, set]:
+        """Element pairs (in both orders) with bonds, and with H-bonds
+        (bonds with a minimum length)."""
+        pairs = (set(), set())
+        for b in self.bonds:
+            if b.min_length == 0:
+                which = pairs[0]
+            elif b.min_length > 0:
+                which = pairs[1]
+            else:
+                continue
+            which.add((b.A1, b.A2))
+            which.add((b.A2, b.A1))
+        return pairs
+
+    def _any_site_within(self, site_index: _SiteIndex, grids: dict,
+                         element: str, point: list[float], cutoff: float,
+                         cell: list[list[float]]) -> bool:
+        """Whether any site of an element is within `cutoff` of `point`,
+        by :meth:`distance`.
+
+        Candidates come from a spatial grid of the sites of the element,
+        kept in `grids` for re-use, so only nearby sites are checked.
+        """
+        grid = grids.get(element)
+        if grid is None or grid.crowded:
+            rows = [site_index.struc_rows[i]
+                    for i in site_index.sites_with_element(element)]
+            grid = _SpatialGrid(rows)
+            grids[element] = grid
+        for row in grid.sphere(point, cutoff, cell):
+            if _periodic_distance(cell, point, row[4:7]) <= cutoff:
+                return True
+        return False
+
+    def set_site_coordinates(self, coords: list[list[float]]):
+        """Sets the positions of all sites at once.
+
+        Everything else about the sites is unchanged.
+        Hidden atoms, bonds and polyhedra are reset, as with adding sites.
+
+        Args:
+            coords: Fractional coordinates of each site, in order.
+
+        Raises:
+            ValueError: Number of coordinates does not match number of sites.
+
+        Related sections: :ref:`STRUC`
+        """
+        # Only the first of the two rows of each site has 9 entries.
+        rows = [row for row in self._get_section("STRUC").data[:-1]
+                if len(row) == 9]
+        if len(coords) != len(rows):
+            raise ValueError(f"Got {len(coords)} coordinates for "
+                             f"{len(rows)} sites.")
+        for row, (x, y, z) in zip(rows, coords):
+            row[4:7] = [x, y, z]
+        # The spatial grid of the sites is out of date.
+        phase = self._phases[self.current_phase - 1]
+        phase._site_index = None
+        self._reset_hidden()
+
+    def delete_sites(self, sites: Union[list[int], int, Callable]) \
+            -> list[int]:
+        """Deletes sites, renumbering the remaining sites.
+
+        All sections which refer to sites by index are updated together, so
+        deleting many sites at once costs about the same as deleting one.
+        Vectors attached to deleted sites are removed.
+
+        Hidden atoms (DLATM) of the remaining sites are renumbered, if the
+        number of atoms drawn for each site is known (see
+        :meth:`_drawn_atom_counts`); otherwise they are reset. Hidden bonds
+        and polyhedra are reset, as with adding sites.
+
+        Args:
+            sites: Site index (1-based), list of site indices, or a function
+                which takes a site (as returned by :meth:`get_structure`)
+                and returns True if the site is to be deleted. (The site is
+                passed as a :class:`Site`.)
+                Accepts negative indices, counting from the end.
+
+        Returns:
+            Sorted list of the (old) indices of the deleted sites.
+
+        Raises:
+            IndexError: Site index out of range.
+
+        Related sections: :ref:`STRUC`, :ref:`THERI`, :ref:`THERM`,
+        :ref:`SITET`, :ref:`VECTR`, :ref:`DLATM`
+        """
+        site_index = self._get_site_index()
+        nsites = self.nsites
+        # Work out which sites to delete.
+        if callable(sites):
+            doomed = set(site.index for site in self.sites if sites(site))
+        else:
+            if isinstance(sites, int):
+                sites = [sites]
+            doomed = set()
+            for i in sites:
+                if i == 0:
+                    raise IndexError(
+                        "VESTA indices are 1-based; 0 is invalid index.")
+                if i < 0:
+                    i += nsites + 1
+                if i <= 0 or i > nsites:
+                    raise IndexError(f"Site index {i} is out of range.")
+                doomed.add(i)
+        if not doomed:
+            return []
+        # New index of each old index (0 for deleted sites).
+        new_index = [0] * (nsites + 1)
+        count = 0
+        for i in range(1, nsites + 1):
+            if i not in doomed:
+                count += 1
+                new_index[i] = count
+        # Renumber hidden atoms before the deleted sites' positions are lost.
+        hidden = self._renumbered_hidden_atoms(new_index)
+        # STRUC has two rows per site.
+        section = self._get_section("STRUC")
+        removed = []
+        new_data = []
+        keep = True
+        for row in section.data[:-1]:
+            if len(row) == 9:
+                keep = new_index[row[0]] > 0
+                if keep:
+                    row[0] = new_index[row[0]]
                 else:
-                    hbond = None
-                if bond is not None:
-                    self.add_bond(bond[1], bond[2],
-                                  min_length=bond[3],
-                                  max_length=bond[4],
-                                  search_mode=bond[5]+1,
-                                  boundary_mode=bond[6]+1,
-                                  show_polyhedra=bool(bond[7]),
-                                  search_by_label=bool(bond[8]),
-                                  style=bond[9]+1,
-                                  )
-                if hbond is not None:
-                    self.add_bond(hbond[1], hbond[2],
-                                  min_length=hbond[3],
-                                  max_length=hbond[4],
-                                  search_mode=hbond[5]+1,
-                                  boundary_mode=hbond[6]+1,
-                                  show_polyhedra=bool(hbond[7]),
-                                  search_by_label=bool(hbond[8]),
-                                  style=hbond[9]+1,
-                                  )
-        # Use found data to set-up a new site
-        params = element[2:10]  # Radius, RGB, RGB, 204
-        section = self["SITET"]
-        section.data.insert(-1, [new_idx, label] + params + [0])
-        # Correct the hidden atoms, bonds, polyhedra if required.
-        # If this site might bond to other sites outside the boundary, we
-        # need to reset. Or if it might draw new bonds from older bonds,
-        # we'd also need to reset.
-        # (Really, we're doing better than VESTA, because VESTA doesn't
-        # even track this.)
-        bonds = self.get_bonds()
-        for bond in bonds:
-            # Check if we have matching elements.
-            if bond["A1"] == "XX" or bond["A2"] == "XX":
-                self._reset_hidden()
-                break
-            elif bond["search_by_label"] and (bond["A1"] == label or bond["A2"] == label) or \
-                    not bond["search_by_label"] and (bond["A1"] == element or bond["A2"] == element):
-                self._reset_hidden()
-                break
+                    removed.append(row)
+            if keep:
+                new_data.append(row)
+        new_data.append(section.data[-1])
+        section.data[:] = new_data
+        # Sections with one row per site.
+        for name in ["THERI", "THERM", "SITET"]:
+            if name not in self:
+                continue
+            section = self._get_section(name)
+            new_data = []
+            for row in section.data[:-1]:
+                if new_index[row[0]] > 0:
+                    row[0] = new_index[row[0]]
+                    new_data.append(row)
+            new_data.append(section.data[-1])
+            section.data[:] = new_data
+        # Vector attachments.
+        section = self["VECTR"]
+        new_data = []
+        block_start = True
+        for row in section.data:
+            if row[0] == 0:
+                # End of block.
+                block_start = True
+            elif block_start:
+                # Row defining the vector type.
+                block_start = False
+            elif new_index[row[0]] > 0:
+                row[0] = new_index[row[0]]
+            else:
+                continue
+            new_data.append(row)
+        section.data[:] = new_data
+        # Update lookup tables.
+        site_index.delete(removed)
+        if hidden is not None:
+            self["DLATM"].data = [hidden + [-1]]
+        self._reset_hidden(atoms=hidden is None)
+        return sorted(doomed)
+
+    def _renumbered_hidden_atoms(self, new_index: list[int]) \
+            -> Union[list[int], None]:
+        """Hidden atoms (DLATM) after renumbering sites, or None if unknown.
+
+        Hidden atoms of deleted sites are dropped, and the rest are shifted
+        down past the drawn atoms of deleted sites before them.
+
+        Args:
+            new_index: New index of each old site index (0 for deleted
+                sites), with an unused entry at 0.
+        """
+        hidden = [i for row in self["DLATM"].data for i in row if i != -1]
+        if not hidden:
+            return []
+        counts = self._drawn_atom_counts()
+        if counts is None:
+            return None
+        # Index of the first drawn atom of each site, and after the last.
+        starts = [0]
+        # Drawn atoms of deleted sites up to and including each site.
+        shifts = []
+        shift = 0
+        for site, count in enumerate(counts, start=1):
+            starts.append(starts[-1] + count)
+            if new_index[site] == 0:
+                shift += count
+            shifts.append(shift)
+        renumbered = []
+        for i in hidden:
+            if i >= starts[-1]:
+                # Not one of the atoms we know of.
+                return None
+            site = bisect.bisect_right(starts, i)
+            if new_index[site] > 0:
+                renumbered.append(i - shifts[site - 1])
+        return renumbered
 
     def distance(self, x1: float, y1: float, z1: float,
                  x2: float, y2: float, z2: float) -> float:
         """Return the Cartesian distance between two points
         (given in fractional coordinates).
         """
-        cell = self.get_cell_matrix()
-        # Difference vector, in fractional coordinates.
-        diff = [x1 - x2, y1 - y2, z1 - z2]
-        # Round to nearest integer for number of images
-        diff_min = [x - round(x) for x in diff]
-        # Convert from fractional to Cartesian.
-        diff_c = [sum(diff_min[i] * cell[i][j] for i in range(3))
-                  for j in range(3)]
-        # Get the Euclidean distance
-        return math.sqrt(sum(x**2 for x in diff_c))
+        return _periodic_distance(self.get_cell_matrix(), [x1, y1, z1],
+                                  [x2, y2, z2])
 
     def add_bond(self, A1: str, A2: str, min_length: float = 0.0,
                  max_length: float = 1.6, search_mode: int = 1,
@@ -1798,10 +3100,9 @@ class VestaFile:
             raise ValueError(
                 f"unmatching_bonds should be 'before' or 'after', not {unmatching_bonds}")
         # Go over all the element pairs that appear in bonds.
-        all_bonds = self.get_bonds()
         style_index = []
-        for bond in all_bonds:
-            A1, A2 = bond["A1"], bond["A2"]
+        for bond in self.bonds:
+            A1, A2 = bond.A1, bond.A2
             # Find the matching bond.
             style_bond = load_default_bond_style(A1, A2)
             if style_bond is None:
@@ -1836,7 +3137,7 @@ class VestaFile:
         Each element is a dictionary, which can be used directly as keyword
         arguments for :meth:`add_bond`.
 
-        Data is a copy.
+        Data is a copy. For a view without copying, use :attr:`bonds`.
 
         Returns:
             List of dictionaries.
@@ -1854,27 +3155,12 @@ class VestaFile:
 
         Related sections: :ref:`SBOND`
         """
-        section = self["SBOND"]
-        bonds = []
-        for row in section.data[:-1]:
-            # Unpack each row, converting data type if requried.
-            bonds.append(dict(
-                A1=row[1],
-                A2=row[2],
-                min_length=row[3],
-                max_length=row[4],
-                search_mode=row[5] + 1,
-                boundary_mode=row[6] + 1,
-                show_polyhedra=bool(row[7]),
-                search_by_label=bool(row[8]),
-                style=row[9] + 1,
-            ))
-        return bonds
+        return self.bonds.copy()
 
     def get_structure(self) -> list[list]:
         """Return a list of the key site structure parameters.
 
-        Returned data is a copy.
+        Returned data is a copy. For a view without copying, use :attr:`sites`.
 
         Returns:
             List of lists, with each sub-list being a site.
@@ -1884,12 +3170,7 @@ class VestaFile:
 
         Related sections: :ref:`STRUC`
         """
-        section = self["STRUC"]
-        my_list = []
-        for row in section.data:
-            if len(row) == 9:
-                my_list.append((row[0:3] + row[4:7]).copy())
-        return my_list
+        return self.sites.copy()
 
     def get_cell(self) -> list[float, float, float, float, float, float]:
         """Return a copy of the cell parameters: a,b,c,alpha,beta,gamma
@@ -2034,24 +3315,93 @@ class VestaFile:
 
         Fractional coordinates of sites are probably in the interval [0,1).
         """
-        stru = self.get_structure()  # List of (index, element, label, x, y, z)
+        site_index = self._get_site_index()
+        if elements is None:
+            rows = site_index.grid.box(xmin, xmax, ymin, ymax, zmin, zmax)
+            return sorted(row[0] for row in rows)
         # Configure the elements list.
-        if elements is not None:
-            if isinstance(elements, str):
-                elements = [elements]
+        if isinstance(elements, str):
+            elements = [elements]
+        candidates = []
+        for element in set(elements):
+            candidates.extend(site_index.sites_with_element(element))
         # Search
         indices = []
-        for site in stru:
-            # If no element specified or element symbol matches.
-            if elements is None or site[1] in elements:
-                # If coordinates are within range
-                if xmin <= site[3] <= xmax and \
-                   ymin <= site[4] <= ymax and \
-                   zmin <= site[5] <= zmax:
-                    # Record the index.
-                    indices.append(site[0])
+        for index in sorted(candidates):
+            site = site_index.struc_rows[index]
+            # If coordinates are within range
+            if xmin <= site[4] <= xmax and \
+               ymin <= site[5] <= ymax and \
+               zmin <= site[6] <= zmax:
+                # Record the index.
+                indices.append(index)
         return indices
 
+    def _filter_elements(self, rows: Iterator[list],
+                         elements: Union[list[str], str, None]) -> list[int]:
+        """Sorted site indices of STRUC rows, optionally of some elements."""
+        if elements is None:
+            return sorted(row[0] for row in rows)
+        if isinstance(elements, str):
+            elements = [elements]
+        elements = set(elements)
+        return sorted(row[0] for row in rows if row[1] in elements)
+
+    def find_sites_in_sphere(self, x: float, y: float, z: float,
+                             radius: float,
+                             elements: Union[list[str], str, None] = None) \
+            -> list[int]:
+        """Return the site indices within a distance of a point.
+
+        Periodic images are accounted for, so a site matches if any of its
+        images is within `radius`.
+
+        Args:
+            x, y, z: Centre of the sphere (fractional coordinates).
+            radius: Radius of the sphere (Angstrom).
+            elements: Optional. Element symbol(s) of the sites to find.
+                If not provided, find all elements.
+
+        Related sections: :ref:`STRUC`, :ref:`CELLP`
+        """
+        if radius < 0:
+            raise ValueError(f"radius must be non-negative, not {radius}.")
+        grid = self._get_site_index().grid
+        rows = grid.sphere([x, y, z], radius, self.get_cell_matrix())
+        return self._filter_elements(rows, elements)
+
+    def find_sites_in_slab(self, h: int, k: int, l: int,
+                           dmin: float, dmax: float,
+                           elements: Union[list[str], str, None] = None) \
+            -> list[int]:
+        """Return the site indices between two lattice planes.
+
+        Sites are matched periodically, so a site matches if any of its
+        images lies in the slab.
+
+        Args:
+            h, k, l: Integer Miller indices of the planes.
+            dmin, dmax: Distances of the bounding planes from the origin
+                (Angstrom), as in :meth:`add_lattice_plane`.
+            elements: Optional. Element symbol(s) of the sites to find.
+                If not provided, find all elements.
+
+        Related sections: :ref:`STRUC`, :ref:`CELLP`
+        """
+        hkl = [h, k, l]
+        if any(int(m) != m for m in hkl):
+            raise ValueError(f"Miller indices must be integers, not {hkl}.")
+        hkl = [int(m) for m in hkl]
+        if hkl == [0, 0, 0]:
+            raise ValueError("Miller indices cannot all be 0.")
+        # The interplanar spacing is 1/|G|, with G = h a* + k b* + l c*.
+        inverse = invert_matrix(self.get_cell_matrix())
+        gnorm = math.sqrt(sum(sum(hkl[i] * inverse[j][i] for i in range(3))**2
+                              for j in range(3)))
+        grid = self._get_site_index().grid
+        rows = grid.slab(hkl, dmin * gnorm, dmax * gnorm)
+        return self._filter_elements(rows, elements)
+
     def set_title(self, title: str):
         """Sets the :ref:`TITLE` field. No newlines allowed."""
         # Verify that title is one line.
@@ -2134,13 +3484,15 @@ class VestaFile:
         section = self["VECTT"]
         # Index of the new vector.
         idx = len(section.data)
-        # Exploit Python converting bools to ints. True = 1.
-        flag = penetrate_atoms + 2 * add_atom_radius
-        section.data.insert(-1, [idx, radius, r, g, b, flag])
+        polar, style = _vector_type_style(polar, radius, r, g, b,
+                                          penetrate_atoms, add_atom_radius)
+        section.data.insert(-1, [idx, *style])
         # Add the new vector block
+        vector_index = self._get_vector_index()
         section = self["VECTR"]
-        section.data.insert(-1, [idx, x, y, z, int(polar)])
+        section.data.insert(-1, [idx, x, y, z, polar])
         section.data.insert(-1, [0, 0, 0, 0, 0])  # Block termination.
+        vector_index.append_block(idx)
 
     def edit_vector_type(self,
                          index: int,
@@ -2226,12 +3578,9 @@ class VestaFile:
                 section.data[index-1][5] &= ~2
         section = self["VECTR"]
         # Find the row that has the target index.
-        idx = None
-        for i, row in enumerate(section.data):
-            if row[0] == index:
-                idx = i
-                break
-        if idx is None:
+        try:
+            idx = self._find_vector_block(index)[0]
+        except (IndexError, RuntimeError):
             raise RuntimeError(
                 "VECTR malformed? Could not find entry with index ", index)
         # Update data
@@ -2267,26 +3616,16 @@ class VestaFile:
         for i, line in enumerate(section.data):
             if line[0] > 0:
                 line[0] = i + 1
-        # Now delete the row in VECTR
+        # Now delete the block in VECTR, including its end row.
         section = self["VECTR"]
-        for i, line in enumerate(section.data):
-            # Find the relevant row
-            if line[0] == index and (i == 0 or section.data[i-1] == [0]*5):
-                # We have found the matching index.
-                # Now delete lines until we delete the block-end line.
-                while section.data.pop(i) != [0]*5:
-                    pass
-                # We're done deleting things
-                break
-        # Re-index.
-        if nvec > 1:
-            idx = 1
-            for i, line in enumerate(section.data):
-                # Find the starting line of each block
-                if (i == 0 or section.data[i-1] == [0]*5) and line != [0]*5:
-                    # Re-write the index.
-                    line[0] = idx
-                    idx += 1
+        start, end = self._find_vector_block(index)
+        del section.data[start:end+1]
+        # Re-index the later blocks.
+        vector_index = self._get_vector_index(rebuild=True)
+        for type, (start, _) in sorted(vector_index.blocks.items()):
+            if type > index:
+                section.data[start][0] = type - 1
+        self._get_vector_index(rebuild=True)
 
     def set_vector_to_site(self, type: int, site: int):
         """Attach a vector of type `type` to atomic `site`.
@@ -2310,28 +3649,37 @@ class VestaFile:
             raise IndexError("type should be positive, but got ", type)
         if site <= 0:
             raise IndexError("site should be positive, but got ", site)
-        section = self["VECTR"]
-        # Find the relevant block matching the type.
-        idx = 0
-        while idx < len(section.data):
-            # Start of a block has the end of a block before it.
-            if (section.data[idx][0] == type) and (idx == 0 or section.data[idx-1] == 5*[0]):
-                break
-            idx += 1
-        if idx == len(section.data):
-            raise IndexError("Vector of type ", type, " does not exist.")
-        # Now that we've found the start of the block, let's go to the end of the block.
-        while idx < len(section.data):
-            # If I want to, check for duplicates here.
-            # But I think duplicates are allowed.
-            if section.data[idx] == 5*[0]:
-                break
-            idx += 1
-        if idx == len(section.data):
-            raise RuntimeError(
-                "Malformed VECTR; no block termination detected.")
-        # Insert
-        section.data.insert(idx, [site, 0, 0, 0, 0])
+        self.attach_vectors(type, [site])
+
+    def attach_vectors(self, type: int, sites: list[int]):
+        """Attach a vector of type `type` to many atomic sites at once.
+
+        As for :meth:`set_vector_to_site`, but all attachments are inserted
+        in a single operation.
+
+        Args:
+            type: Index (1-based) of vector.
+            sites: Indices (1-based) of sites.
+
+        Raises:
+            IndexError: `type` or a site are out of bounds.
+
+        Related sections: :ref:`VECTR`
+        """
+        # Validate inputs
+        if type <= 0:
+            raise IndexError("type should be positive, but got ", type)
+        rows = []
+        for site in sites:
+            if site <= 0:
+                raise IndexError("site should be positive, but got ", site)
+            rows.append([site, 0, 0, 0, 0])
+        if not rows:
+            return
+        # Insert at the end of the block.
+        end = self._find_vector_block(type)[1]
+        self["VECTR"].data[end:end] = rows
+        self._get_vector_index().grow(type, len(rows))
 
     def remove_vector_from_site(self, type: int, site: int):
         """Removes vectors of type `type` from atomic site `site`.
@@ -2353,28 +3701,95 @@ class VestaFile:
             raise IndexError("type should be positive, but got ", type)
         section = self["VECTR"]
         # Find the relevant block matching the type.
-        idx = 0
-        while idx < len(section.data):
-            # Start of a block has the end of a block before it.
-            if (section.data[idx][0] == type) and (idx == 0 or section.data[idx-1] == 5*[0]):
-                break
-            idx += 1
-        if idx == len(section.data):
-            raise IndexError("Vector of type ", type, " does not exist.")
-        # Now that we've found the start of the block, let's go through the
-        # block and delete matching rows.
-        # Get past the first row of the block which defines the vector.
-        idx += 1
-        while idx < len(section.data):
-            # If hit end of block, exit.
-            if section.data[idx] == 5*[0]:
-                break
-            # If this entry matches the site, delete it.
-            if section.data[idx][0] == site:
-                del section.data[idx]
-                # Do not increment, index, because the next row moved to us.
-            else:
-                idx += 1
+        start, end = self._find_vector_block(type)
+        # Keep the rows of the block (after the row defining the vector)
+        # which don't match the site.
+        rows = [row for row in section.data[start+1:end] if row[0] != site]
+        removed = end - start - 1 - len(rows)
+        if removed:
+            section.data[start+1:end] = rows
+            self._get_vector_index().grow(type, -removed)
+
+    def set_site_vectors(self, vectors: list[list[float]],
+                         coord_type: str = "xyz", tol: float = 1e-4,
+                         indices: list[int] = None, **kwargs) -> list[int]:
+        """Attach a vector to every site, such as magnetic moments or forces.
+
+        Vectors which agree to within `tol` share a vector type, so only as
+        many types are created as there are distinct vectors.
+        Existing vector types with the same vector and formatting are
+        reused, so calling this again (e.g. on each frame of a trajectory
+        copied from one template) doesn't duplicate types.
+        Zero vectors (to within `tol`) and vectors containing NaN are not
+        attached.
+
+        Args:
+            vectors: One (x, y, z) vector per site (in site order), or per
+                entry of `indices`. May be an (N,3) numpy array.
+            coord_type ("xyz", "uvw", "modulus"): Coordinate basis of
+                `vectors`, as in :meth:`add_vector_type`.
+            tol: Vectors are rounded to multiples of `tol` (in the units of
+                `coord_type`) to decide which are the same.
+            indices: Site indices (1-based) matching `vectors`.
+                Defaults to all sites.
+            **kwargs: Formatting for the new vector types (e.g. `radius`,
+                `r`, `g`, `b`, `polar`), passed to :meth:`add_vector_type`.
+
+        Returns:
+            The vector type (1-based) attached to each site, or 0 if none.
+
+        Related sections: :ref:`VECTR`, :ref:`VECTT`.
+        """
+        if tol <= 0:
+            raise ValueError(f"tol must be positive, not {tol}.")
+        if indices is None:
+            indices = range(1, self.nsites + 1)
+        if len(indices) != len(vectors):
+            raise ValueError(
+                f"Got {len(vectors)} vectors for {len(indices)} sites.")
+        # Group the sites by rounded vector.
+        groups = {}
+        vector_of_group = {}
+        keys = []
+        for site, vector in zip(indices, vectors):
+            x, y, z = (float(v) for v in vector)
+            if x != x or y != y or z != z:
+                keys.append(None)
+                continue
+            key = (round(x / tol), round(y / tol), round(z / tol))
+            if key == (0, 0, 0):
+                keys.append(None)
+                continue
+            keys.append(key)
+            if key not in groups:
+                groups[key] = []
+                vector_of_group[key] = (x, y, z)
+            groups[key].append(site)
+        # Existing vector types, by rounded vector (in the internal modulus
+        # basis) and formatting.
+        polar, style = _vector_type_style(**kwargs)
+        vectt = {row[0]: tuple(row[1:]) for row in self["VECTT"].data
+                 if row[0] > 0}
+        vectr = self["VECTR"].data
+        existing = {}
+        for type, (start, _) in self._get_vector_index().blocks.items():
+            _, x, y, z, row_polar = vectr[start]
+            key = (round(x / tol), round(y / tol), round(z / tol),
+                   row_polar, vectt.get(type))
+            existing.setdefault(key, type)
+        # Reuse or create one vector type per group and attach it.
+        types = {}
+        for key, sites in groups.items():
+            x, y, z = self._convert_vector_coords(*vector_of_group[key],
+                                                  coord_type)
+            modulus_key = (round(x / tol), round(y / tol), round(z / tol),
+                           polar, style)
+            if modulus_key not in existing:
+                self.add_vector_type(x, y, z, coord_type="modulus", **kwargs)
+                existing[modulus_key] = self.nvectors
+            types[key] = existing[modulus_key]
+            self.attach_vectors(types[key], sites)
+        return [0 if key is None else types[key] for key in keys]
 
     def set_vector_scale(self, scale: float):
         """Sets global vector scale factor (VECTS)"""
@@ -2443,7 +3858,65 @@ class VestaFile:
         self._evaluate_lmatrix(self.current_phase)
 
     def _evaluate_lmatrix(self, phase: int = 1):
-        """Re-computes the LMATRIX entry of this and following phases based on LORIENT and LTRANSL."""
+        """Re-computes the LMATRIX entry of this phase and the phases which
+        depend on it, based on LORIENT and LTRANSL.
+
+        Phases are oriented relative to a reference phase (LORIENT), so
+        changing one phase's LMATRIX changes those referencing it, and so on.
+        Only these phases are recomputed, each after its reference phase.
+
+        Inside :meth:`batch_update`, the recomputation is deferred until the
+        end of the batch.
+        """
+        if self._deferred_lmatrix is not None:
+            self._deferred_lmatrix.add(phase)
+            return
+        self._evaluate_lmatrices([phase])
+
+    def _evaluate_lmatrices(self, phases: list[int]):
+        """Re-computes LMATRIX for the given phases and their dependents.
+
+        Phases are processed iteratively in dependency order. Only the
+        phases recomputed are parsed.
+        """
+        # Build the graph of which phases reference which.
+        dependents = {}
+        for i, phase in enumerate(self._phases, start=1):
+            reference = phase._lorient_reference() + 1
+            dependents.setdefault(reference, []).append(i)
+        # Find all phases affected.
+        affected = set()
+        stack = [p for p in phases if 1 <= p <= self.nphases]
+        while stack:
+            p = stack.pop()
+            if p not in affected:
+                affected.add(p)
+                stack.extend(dependents.get(p, []))
+        # Topological ordering of the affected phases (Kahn's algorithm).
+        # A phase waits on its reference if the reference is also affected.
+        waiting = {}
+        for p in affected:
+            reference = self._phases[p - 1]._lorient_reference() + 1
+            waiting[p] = 1 if reference in affected and reference != p else 0
+        ready = sorted(p for p, n in waiting.items() if n == 0)
+        done = set()
+        while ready:
+            p = ready.pop(0)
+            self._compute_lmatrix(p)
+            done.add(p)
+            for q in dependents.get(p, []):
+                if q in affected and q not in done and q != p:
+                    waiting[q] -= 1
+                    if waiting[q] == 0:
+                        ready.append(q)
+        if len(done) < len(affected):
+            logger.warning(
+                "Circular references between phases in LORIENT: "
+                f"{sorted(affected - done)}. Their LMATRIX was not updated.")
+
+    def _compute_lmatrix(self, phase: int):
+        """Re-computes the LMATRIX entry of one phase from LORIENT, assuming
+        its reference phase is up to date."""
         # Pop data
         section = self["LORIENT", phase]
         reference_phase = section.data[0][0] + 1
@@ -2500,9 +3973,6 @@ class VestaFile:
             # TODO: Call set_phase_position to recalculate data[4].
             # section = self["LTRANSL"]
             # self.set_phase_position(...)
-        # Update all LMATRIX entries up the stack
-        if phase < self.nphases:
-            self._evaluate_lmatrix(phase + 1)
 
     # This function is incomplete. I'm setting it aside for future me to deal
     # with, as it turns out to require some fairly advanced computation to
@@ -0,0 +1,270 @@
+# Copyright 2025 Bernard Field
+"""
+Lightweight streaming readers for molecular dynamics trajectories, without
+third-party dependencies.
+
+:func:`iter_lammps_dump` reads LAMMPS text dump files and
+:func:`iter_extxyz` reads extended XYZ files, one frame at a time.
+Both yield the frame number, the structure (as a
+:class:`vestacrystparser.vasp.PoscarData`) and the other per-atom columns,
+for colouring sites or drawing vectors.
+Compressed files can be opened with :func:`vestacrystparser.vasp.open_text`.
+"""
+
+import itertools
+import re
+from typing import Iterator, TextIO, Union
+
+from vestacrystparser.parser import load_elements_data
+from vestacrystparser.utilities import cartesian_to_fractional
+from vestacrystparser.vasp import PoscarData
+
+
+def _next_line(f: TextIO) -> str:
+    """Read a line, raising ValueError at the end of the file."""
+    line = f.readline()
+    if not line:
+        raise ValueError("Trajectory ended unexpectedly.")
+    return line
+
+
+def _number(token: str) -> Union[int, float, str]:
+    """Parse a per-atom value, leaving it as a string if not a number."""
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return token
+
+
+# Coordinate columns of LAMMPS dumps, in order of preference, and whether
+# they are scaled (fractional).
+_LAMMPS_COORDS = [(("x", "y", "z"), False), (("xu", "yu", "zu"), False),
+                  (("xs", "ys", "zs"), True), (("xsu", "ysu", "zsu"), True)]
+
+
+def _lammps_box(f: TextIO, header: str) \
+        -> tuple[list[list[float]], list[float]]:
+    """Read the BOX BOUNDS of a LAMMPS dump.
+
+    Returns:
+        Lattice vectors (rows) and the origin of the box.
+    """
+    bounds = [[float(x) for x in _next_line(f).split()] for _ in range(3)]
+    if "xy" in header.split():
+        # Triclinic: bounds are of the bounding box, plus the tilts.
+        xy, xz, yz = (bounds[i][2] for i in range(3))
+        xlo = bounds[0][0] - min(0.0, xy, xz, xy + xz)
+        xhi = bounds[0][1] - max(0.0, xy, xz, xy + xz)
+        ylo = bounds[1][0] - min(0.0, yz)
+        yhi = bounds[1][1] - max(0.0, yz)
+    else:
+        xy = xz = yz = 0.0
+        xlo, xhi = bounds[0][:2]
+        ylo, yhi = bounds[1][:2]
+    zlo, zhi = bounds[2][:2]
+    lattice = [[xhi - xlo, 0.0, 0.0], [xy, yhi - ylo, 0.0],
+               [xz, yz, zhi - zlo]]
+    return lattice, [xlo, ylo, zlo]
+
+
+def iter_lammps_dump(f: TextIO,
+                     type_map: Union[dict[int, str], list[str], None] = None,
+                     stride: int = 1) \
+        -> Iterator[tuple[int, PoscarData, dict[str, list]]]:
+    """Read the frames of a LAMMPS text dump file one at a time.
+
+    Handles orthogonal and triclinic boxes, and any of the x/y/z, xu/yu/zu,
+    xs/ys/zs or xsu/ysu/zsu coordinate columns. Atoms are sorted by id (if
+    there is an id column), so sites are in the same order in every frame.
+    The atom lines of frames skipped by `stride` are not parsed.
+
+    Args:
+        f: Text file object, at the start of the dump.
+        type_map: Element symbol of each atom type, as a dict from type or a
+            list (type 1 first). Not needed if there is an element column.
+        stride: Only read every `stride`-th frame, starting with the first.
+
+    Yields:
+        Timestep, structure (titled with the timestep), and the other
+        per-atom columns (e.g. q, vx, fx), by column name.
+
+    Raises:
+        ValueError: The file is malformed, or atom elements are unknown.
+    """
+    if stride < 1:
+        raise ValueError(f"stride must be at least 1, not {stride}.")
+    if isinstance(type_map, (list, tuple)):
+        type_map = {i + 1: symbol for i, symbol in enumerate(type_map)}
+    count = 0
+    timestep = natoms = lattice = origin = None
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        if not line.startswith("ITEM:"):
+            if line.strip():
+                raise ValueError(f"Expected ITEM line, found: {line}")
+            continue
+        item = line[len("ITEM:"):].strip()
+        if item.startswith("TIMESTEP"):
+            timestep = int(_next_line(f).split()[0])
+        elif item.startswith("NUMBER OF ATOMS"):
+            natoms = int(_next_line(f))
+        elif item.startswith("BOX BOUNDS"):
+            lattice, origin = _lammps_box(f, item)
+        elif item.startswith("ATOMS"):
+            columns = item.split()[1:]
+            skip = count % stride
+            count += 1
+            if skip:
+                for _ in itertools.islice(f, natoms):
+                    pass
+                continue
+            yield (timestep,) + _lammps_atoms(f, columns, natoms, lattice,
+                                              origin, type_map, timestep)
+        else:
+            # Other items (e.g. UNITS, TIME from dump_modify) have a single
+            # value line.
+            _next_line(f)
+
+
+def _lammps_atoms(f: TextIO, columns: list[str], natoms: int,
+                  lattice: list[list[float]], origin: list[float],
+                  type_map: Union[dict[int, str], None], timestep: int) \
+        -> tuple[PoscarData, dict[str, list]]:
+    """Read the atom lines of a LAMMPS dump frame."""
+    for names, scaled in _LAMMPS_COORDS:
+        if all(name in columns for name in names):
+            break
+    else:
+        raise ValueError(f"No coordinate columns in dump: {columns}")
+    rows = [_next_line(f).split() for _ in range(natoms)]
+    if "id" in columns:
+        i = columns.index("id")
+        rows.sort(key=lambda row: int(row[i]))
+    xyz = [columns.index(name) for name in names]
+    coords = [[float(row[j]) for j in xyz] for row in rows]
+    # Scaled coordinates are already fractional, relative to the box origin.
+    if not scaled:
+        coords = cartesian_to_fractional(
+            [[x - o for x, o in zip(r, origin)] for r in coords], lattice)
+    if "element" in columns:
+        i = columns.index("element")
+        species = [row[i] for row in rows]
+    elif "type" in columns and type_map is not None:
+        i = columns.index("type")
+        try:
+            species = [type_map[int(row[i])] for row in rows]
+        except KeyError as e:
+            raise ValueError(f"Atom type {e} not in type_map.") from None
+    else:
+        raise ValueError("Dump has no element column; please give "
+                         "type_map.")
+    properties = {}
+    for j, name in enumerate(columns):
+        if name not in names and name not in ["id", "element"]:
+            properties[name] = [_number(row[j]) for row in rows]
+    return (PoscarData(f"Timestep {timestep}", lattice, species, coords),
+            properties)
+
+
+# key=value pairs of an extended XYZ comment line, with optional quotes.
+_EXTXYZ_PAIR = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|(\S+))')
+
+# Parsers of extended XYZ property types: real, integer, logical, string.
+_EXTXYZ_TYPES = {"R": float, "I": int, "L": lambda x: x[:1] in ["T", "t"],
+                 "S": str}
+
+# Empty space around non-periodic extended XYZ structures, in Angstrom.
+EXTXYZ_PADDING = 5.0
+
+
+def _extxyz_element(token: str) -> str:
+    """Element symbol from an extended XYZ species, or atomic number."""
+    if token.isdigit():
+        return load_elements_data(int(token))[1]
+    return token
+
+
+def iter_extxyz(f: TextIO, stride: int = 1) \
+        -> Iterator[tuple[int, PoscarData, dict[str, list]]]:
+    """Read the frames of an extended XYZ file one at a time.
+
+    The comment line of each frame gives the Lattice (if periodic) and the
+    Properties (columns) of the atom lines. Plain XYZ files are also read.
+    Frames without a Lattice are put in a box around the atoms, with
+    :data:`EXTXYZ_PADDING` of empty space each side.
+    The atom lines of frames skipped by `stride` are not parsed.
+
+    Args:
+        f: Text file object, at the start of the file.
+        stride: Only read every `stride`-th frame, starting with the first.
+
+    Yields:
+        Frame number (0-based), structure (titled with the comment line),
+        and the other per-atom properties (e.g. forces, charges) by name.
+        Properties with several components have a list per atom.
+
+    Raises:
+        ValueError: The file is malformed.
+    """
+    if stride < 1:
+        raise ValueError(f"stride must be at least 1, not {stride}.")
+    count = 0
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        if not line.strip():
+            continue
+        natoms = int(line)
+        comment = _next_line(f).strip()
+        if count % stride:
+            for _ in itertools.islice(f, natoms):
+                pass
+            count += 1
+            continue
+        info = {m.group(1): m.group(2) if m.group(2) is not None
+                else m.group(3) for m in _EXTXYZ_PAIR.finditer(comment)}
+        # Columns, as (name, type, number of columns).
+        spec = info.get("Properties", "species:S:1:pos:R:3").split(":")
+        columns = [(spec[i], spec[i + 1], int(spec[i + 2]))
+                   for i in range(0, len(spec) - 2, 3)]
+        rows = [_next_line(f).split() for _ in range(natoms)]
+        properties = {}
+        species = positions = None
+        start = 0
+        for name, kind, width in columns:
+            cols = slice(start, start + width)
+            start += width
+            if name == "species":
+                species = [_extxyz_element(row[cols.start]) for row in rows]
+            elif name == "pos":
+                positions = [[float(x) for x in row[cols]] for row in rows]
+            else:
+                convert = _EXTXYZ_TYPES.get(kind, str)
+                values = [[convert(x) for x in row[cols]] for row in rows]
+                if width == 1:
+                    values = [v[0] for v in values]
+                properties[name] = values
+        if species is None or positions is None:
+            raise ValueError("Extended XYZ frame needs species and pos.")
+        if "Lattice" in info:
+            v = [float(x) for x in info["Lattice"].split()]
+            lattice = [v[0:3], v[3:6], v[6:9]]
+        else:
+            # Orthogonal box around the atoms.
+            lo = [min(r[i] for r in positions) - EXTXYZ_PADDING
+                  for i in range(3)]
+            hi = [max(r[i] for r in positions) + EXTXYZ_PADDING
+                  for i in range(3)]
+            lattice = [[hi[0] - lo[0], 0.0, 0.0], [0.0, hi[1] - lo[1], 0.0],
+                       [0.0, 0.0, hi[2] - lo[2]]]
+            positions = [[x - o for x, o in zip(r, lo)] for r in positions]
+        coords = cartesian_to_fractional(positions, lattice)
+        yield count, PoscarData(comment, lattice, species, coords), \
+            properties
+        count += 1
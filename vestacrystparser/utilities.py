@@ -125,3 +125,40 @@ def transpose(mat: list[list]) -> list[list]:
     for j in range(len(mat[0])):
         answer.append([mat[i][j] for i in range(len(mat))])
     return answer
+
+
+def cartesian_to_fractional(coords: list[list[float]],
+                            lattice: list[list[float]]) -> list[list[float]]:
+    """Converts Cartesian coordinates to fractional.
+
+    Args:
+        coords: Cartesian coordinates, one row per point.
+        lattice: Lattice vectors, as rows.
+
+    Returns:
+        Fractional coordinates, one row per point.
+    """
+    inverse = invert_matrix(lattice)
+    return [[sum(r[j] * inverse[j][i] for j in range(3)) for i in range(3)]
+            for r in coords]
+
+
+class RecordedLines:
+    """Wraps a text file so the lines read by :meth:`readline` are kept.
+
+    Lets a header be parsed from a stream and also copied verbatim.
+
+    Attributes:
+        f: The wrapped file.
+        lines: The lines read so far, in order.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.lines = []
+
+    def readline(self) -> str:
+        """Reads a line from the file and records it."""
+        line = self.f.readline()
+        self.lines.append(line)
+        return line
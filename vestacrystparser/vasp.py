@@ -0,0 +1,528 @@
+# Copyright 2025 Bernard Field
+"""
+Lightweight readers for VASP files, without requiring pymatgen.
+
+Compressed files (gzip, bzip2, xz) are read as a stream. VESTA itself can't
+read these, so :func:`decompress_file` makes an uncompressed copy.
+
+:func:`read_poscar` reads the structure at the top of a POSCAR, CONTCAR,
+CHGCAR, PARCHG, LOCPOT or similar file (VASP 4 or 5 format),
+:func:`iter_xdatcar` the frames of an XDATCAR, and :func:`iter_vasprun` the
+ionic steps of a vasprun.xml.
+:func:`read_grid_shape` then reads the size of the volumetric grid which
+follows it in volumetric files, after which the grid values can be streamed
+with :func:`vestacrystparser.volumetric.iter_grid_chunks`.
+"""
+
+import bz2
+import gzip
+import itertools
+import lzma
+import math
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator, TextIO, Union
+
+from vestacrystparser.utilities import cartesian_to_fractional
+
+
+# Compression formats, by their suffix and the magic bytes their files
+# start with.
+_COMPRESSION = [(".gz", b"\x1f\x8b", gzip),
+                (".bz2", b"BZh", bz2),
+                (".xz", b"\xfd7zXZ\x00", lzma)]
+COMPRESSED_SUFFIXES = tuple(suffix for suffix, _, _ in _COMPRESSION)
+# Added to compressed files without a compression suffix.
+UNCOMPRESSED_SUFFIX = ".uncompressed"
+
+
+def _compression(filename: str):
+    """Return the module to decompress a file with, or None.
+
+    Identifies compression by the start of the file, so it works whatever
+    the file is named.
+    """
+    with open(filename, "rb") as f:
+        start = f.read(6)
+    for _, magic, module in _COMPRESSION:
+        if start.startswith(magic):
+            return module
+    return None
+
+
+def is_compressed(filename: str) -> bool:
+    """Whether the file is compressed (gzip, bzip2 or xz)."""
+    return _compression(filename) is not None
+
+
+def open_text(filename: str) -> TextIO:
+    """Open a text file for reading, decompressing if needed.
+
+    gzip, bzip2 and xz files are decompressed as they are read.
+
+    Args:
+        filename: Path to the file.
+
+    Returns:
+        Text file object.
+    """
+    module = _compression(filename)
+    if module is None:
+        return open(filename, "r")
+    return module.open(filename, "rt")
+
+
+def uncompressed_name(filename: str) -> str:
+    """Name for the uncompressed copy of a compressed file.
+
+    Removes the compression suffix (e.g. CHGCAR.gz becomes CHGCAR), or adds
+    ".uncompressed" if there isn't one.
+    """
+    name = str(filename)
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name + UNCOMPRESSED_SUFFIX
+
+
+def compressed_source(filename: str) -> Union[str, None]:
+    """The compressed file `filename` is the uncompressed copy of, if any.
+
+    The inverse of :func:`uncompressed_name`: looks for `filename` with a
+    compression suffix, or, if `filename` ends in ".uncompressed", for the
+    file without it.
+
+    Returns:
+        Path to the compressed file, or None if there isn't one.
+    """
+    name = str(filename)
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(name + suffix):
+            return name + suffix
+    if name.endswith(UNCOMPRESSED_SUFFIX):
+        source = name[:-len(UNCOMPRESSED_SUFFIX)]
+        if os.path.exists(source) and is_compressed(source):
+            return source
+    return None
+
+
+def decompress_file(filename: str, destination: str = None,
+                    force: bool = False) -> str:
+    """Write an uncompressed copy of a compressed file, if not up to date.
+
+    The file is decompressed in a stream, never held in memory.
+
+    Args:
+        filename: Path to compressed file.
+        destination: Path to write to. Defaults to
+            :func:`uncompressed_name`.
+        force: Write even if the destination is newer than the source.
+
+    Returns:
+        Path to uncompressed file.
+    """
+    if destination is None:
+        destination = uncompressed_name(filename)
+    if not force and os.path.exists(destination) and \
+            os.path.getmtime(destination) >= os.path.getmtime(filename):
+        return destination
+    module = _compression(filename)
+    if module is None:
+        raise ValueError(f"{filename} is not compressed.")
+    # Write then rename, so a partial file is never left behind.
+    with module.open(filename, "rb") as fin, \
+            open(destination + ".tmp", "wb") as fout:
+        shutil.copyfileobj(fin, fout, 2**22)
+    os.replace(destination + ".tmp", destination)
+    return destination
+
+
+class PoscarData:
+    """A crystal structure, as read from a POSCAR.
+
+    Attributes:
+        title (str): The comment line.
+        lattice (list[list[float]]): Lattice vectors (rows), in Angstrom.
+        species (list[str]): Element symbol of each site.
+        frac_coords (list[list[float]]): Fractional coordinates of each site.
+    """
+
+    def __init__(self, title: str, lattice: list[list[float]],
+                 species: list[str], frac_coords: list[list[float]]):
+        self.title = title
+        self.lattice = lattice
+        self.species = species
+        self.frac_coords = frac_coords
+
+    def __len__(self) -> int:
+        """Number of sites."""
+        return len(self.species)
+
+    @property
+    def abc(self) -> tuple[float, float, float]:
+        """Lattice vector lengths (read-only)"""
+        return tuple(math.sqrt(sum(x*x for x in v)) for v in self.lattice)
+
+    @property
+    def angles(self) -> tuple[float, float, float]:
+        """Lattice angles alpha, beta, gamma in degrees (read-only)"""
+        a, b, c = self.lattice
+        abc = self.abc
+        angles = []
+        for v1, v2, l1, l2 in [(b, c, abc[1], abc[2]), (a, c, abc[0], abc[2]),
+                               (a, b, abc[0], abc[1])]:
+            cosine = sum(x*y for x, y in zip(v1, v2)) / (l1 * l2)
+            # Guard against rounding pushing us out of range.
+            angles.append(math.degrees(math.acos(max(-1.0, min(1.0, cosine)))))
+        return tuple(angles)
+
+    @property
+    def volume(self) -> float:
+        """Unit cell volume in cubic Angstrom (read-only)"""
+        a, b, c = self.lattice
+        return abs(a[0] * (b[1]*c[2] - b[2]*c[1])
+                   - a[1] * (b[0]*c[2] - b[2]*c[0])
+                   + a[2] * (b[0]*c[1] - b[1]*c[0]))
+
+
+def _element_from_potcar_label(label: str) -> str:
+    """Element symbol from a POSCAR species label, e.g. Fe_pv or Fe/1234."""
+    return label.split("_")[0].split("/")[0]
+
+
+def read_poscar(f: TextIO, species: list[str] = None) -> PoscarData:
+    """Read a structure in POSCAR format from an open text file.
+
+    Reads both VASP 5 (with a line of element symbols) and VASP 4 (without)
+    formats, with or without selective dynamics, in Direct or Cartesian
+    coordinates. CONTCAR files are read the same way.
+
+    Reads exactly the lines of the structure, so the file is left at the
+    start of whatever follows (e.g. the volumetric data of a CHGCAR, or the
+    velocities of a CONTCAR).
+
+    Args:
+        f: Text file object, at the start of the POSCAR.
+        species: Element symbols of each species, for VASP 4 files. If not
+            given, VASP 4 files take them from the comment line (as
+            pymatgen does), if it starts with as many element symbols as
+            there are species. Ignored for VASP 5 files.
+
+    Returns:
+        The structure.
+
+    Raises:
+        ValueError: The POSCAR is malformed, or is VASP 4 format without
+            element symbols.
+    """
+    title = _next_line(f).strip()
+    lattice, scale, species = _read_cell(f, title, species)
+    mode = _next_line(f).strip()
+    if mode[:1].lower() == "s":
+        # Selective dynamics.
+        mode = _next_line(f).strip()
+    cartesian = mode[:1].lower() in ["c", "k"]
+    coords = _read_coords(f, len(species), cartesian, scale, lattice)
+    return PoscarData(title, lattice, species, coords)
+
+
+def _next_line(f: TextIO) -> str:
+    """Read a line, raising ValueError at the end of the file."""
+    line = f.readline()
+    if not line:
+        raise ValueError("POSCAR ended unexpectedly.")
+    return line
+
+
+def _read_cell(f: TextIO, title: str, species: list[str] = None) \
+        -> tuple[list[list[float]], float, list[str]]:
+    """Read the lines of a POSCAR from the scale to the species counts.
+
+    Returns:
+        The scaled lattice, the scale factor, and the element of each site.
+    """
+    scale = float(_next_line(f).split()[0])
+    lattice = [[float(x) for x in _next_line(f).split()[:3]]
+               for _ in range(3)]
+    tokens = _next_line(f).split()
+    if tokens and all(x.isdigit() for x in tokens):
+        # VASP 4: counts only.
+        counts = [int(x) for x in tokens]
+        symbols = species
+        if symbols is None:
+            symbols = _symbols_from_comment(title, len(counts))
+        if symbols is None or len(symbols) < len(counts):
+            raise ValueError(
+                "POSCAR has no element symbols (VASP 4 format). "
+                "Please provide them.")
+    else:
+        # VASP 5: element symbols, then counts.
+        symbols = [_element_from_potcar_label(x) for x in tokens]
+        counts = [int(x) for x in _next_line(f).split()]
+    species = []
+    for symbol, count in zip(symbols, counts):
+        species += [symbol] * count
+    # Scale the lattice. A negative scale is the target volume.
+    if scale < 0:
+        volume = PoscarData(title, lattice, [], []).volume
+        scale = (-scale / volume) ** (1/3)
+    lattice = [[x * scale for x in v] for v in lattice]
+    return lattice, scale, species
+
+
+def _read_coords(f: TextIO, n: int, cartesian: bool, scale: float,
+                 lattice: list[list[float]]) -> list[list[float]]:
+    """Read `n` lines of coordinates, returning fractional coordinates."""
+    coords = [[float(x) for x in _next_line(f).split()[:3]]
+              for _ in range(n)]
+    if cartesian:
+        coords = cartesian_to_fractional(
+            [[x * scale for x in v] for v in coords], lattice)
+    return coords
+
+
+def iter_xdatcar(f: TextIO, stride: int = 1) \
+        -> Iterator[tuple[int, PoscarData]]:
+    """Read the frames of an XDATCAR one at a time.
+
+    Handles both fixed-cell runs (one header, then each configuration) and
+    variable-cell runs (a header before every configuration), in VASP 5
+    format. Only one frame is held in memory at a time, and the coordinates
+    of skipped frames are not parsed.
+
+    Args:
+        f: Text file object, at the start of the XDATCAR.
+        stride: Only read every `stride`-th frame, starting with the first.
+
+    Yields:
+        Configuration number (as given in the file) and structure.
+        For fixed-cell runs, the frames share the same `lattice` and
+        `species` lists, which must not be modified.
+
+    Raises:
+        ValueError: The file is malformed.
+    """
+    if stride < 1:
+        raise ValueError(f"stride must be at least 1, not {stride}.")
+    title = lattice = species = None
+    count = 0
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        tokens = line.split()
+        if not tokens:
+            continue
+        if title is None or "configuration" not in line.lower():
+            # A header (repeated before each frame for variable cells).
+            title = line.strip()
+            lattice, scale, species = _read_cell(f, title)
+            continue
+        # e.g. "Direct configuration=     1"
+        number = int(line.split("=")[-1]) if "=" in line else count + 1
+        if count % stride:
+            for _ in range(len(species)):
+                _next_line(f)
+        else:
+            cartesian = tokens[0][:1].lower() in ["c", "k"]
+            coords = _read_coords(f, len(species), cartesian, scale, lattice)
+            yield number, PoscarData(title, lattice, species, coords)
+        count += 1
+
+
+def _symbols_from_comment(title: str, n: int) -> Union[list[str], None]:
+    """Element symbols from the start of a POSCAR comment line, or None if
+    it doesn't start with `n` of them."""
+    tokens = title.split()[:n]
+    symbols = [_element_from_potcar_label(x) for x in tokens]
+    if len(symbols) < n or not all(
+            x.isalpha() and x[:1].isupper() and len(x) <= 2 for x in symbols):
+        return None
+    return symbols
+
+
+def read_potcar_species(filename: str) -> list[str]:
+    """Read the element of each POTCAR in a (concatenated) POTCAR file.
+
+    For supplying the element symbols of VASP 4 POSCARs.
+
+    Args:
+        filename: Path to POTCAR (may be compressed).
+
+    Returns:
+        Element symbols, in order.
+    """
+    species = []
+    with open_text(filename) as f:
+        for line in f:
+            # e.g. "   TITEL  = PAW_PBE Fe_pv 06Sep2000"
+            tokens = line.split()
+            if tokens[:1] == ["TITEL"] and len(tokens) >= 4:
+                species.append(_element_from_potcar_label(tokens[3]))
+    return species
+
+
+def _vectors(varray: ET.Element) -> list[list[float]]:
+    """Rows of a vasprun.xml <varray>."""
+    return [[float(x) for x in v.text.split()] for v in varray.iter("v")]
+
+
+def _kept_in_vasprun(elem: ET.Element) -> bool:
+    """Whether :func:`iter_vasprun` needs an element's contents."""
+    return elem.tag in ["structure", "atominfo", "incar"] or \
+        (elem.tag == "varray" and elem.get("name") == "forces")
+
+
+def iter_vasprun(f, steps: Union[slice, Iterable[int], None] = None,
+                 forces: bool = False) \
+        -> Iterator[tuple[int, PoscarData, Union[list[list[float]], None]]]:
+    """Read the structure of each ionic step of a vasprun.xml.
+
+    The XML is parsed incrementally, and everything except the structures
+    (and forces) is discarded as soon as it has been read, so the full
+    document is never held in memory. Eigenvalues, DOS and the like are
+    never even turned into Python objects. Reading stops once past the last
+    step asked for.
+
+    Args:
+        f: File object (text or binary), at the start of the vasprun.xml.
+        steps: Which ionic steps (0-based) to read. Either a slice (with
+            non-negative bounds) or a collection of step indices.
+            Defaults to all.
+        forces: Also read the forces on each atom.
+
+    Yields:
+        Step index, structure (titled with SYSTEM from the INCAR), and the
+        Cartesian forces on each atom (eV/Angstrom) or None if not
+        requested or not present.
+
+    Raises:
+        ValueError: `steps` has negative bounds.
+    """
+    # Steps to read, and the last of them (None if there is no end).
+    if steps is None:
+        wanted = itertools.count()
+        last = None
+    elif isinstance(steps, slice):
+        start, step = steps.start or 0, steps.step or 1
+        if start < 0 or step < 1 or \
+                (steps.stop is not None and steps.stop < 0):
+            raise ValueError("steps cannot be negative when streaming.")
+        if steps.stop is None:
+            wanted = itertools.count(start, step)
+            last = None
+        else:
+            wanted = range(start, steps.stop, step)
+            last = wanted[-1] if wanted else -1
+    else:
+        wanted = sorted(set(steps))
+        if wanted and wanted[0] < 0:
+            raise ValueError("steps cannot be negative when streaming.")
+        last = wanted[-1] if wanted else -1
+    wanted = iter(wanted)
+    next_wanted = next(wanted, None)
+    if last is not None and last < 0:
+        return
+
+    title = ""
+    species = []
+    step = 0
+    pos = None
+    step_forces = None
+    stack = []
+    keeping = 0
+    for event, elem in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if _kept_in_vasprun(elem):
+                keeping += 1
+            continue
+        stack.pop()
+        parent = stack[-1].tag if stack else None
+        if _kept_in_vasprun(elem):
+            keeping -= 1
+            if elem.tag == "incar":
+                for item in elem.iter("i"):
+                    if item.get("name") == "SYSTEM":
+                        title = (item.text or "").strip()
+            elif elem.tag == "atominfo":
+                for array in elem.iter("array"):
+                    if array.get("name") == "atoms":
+                        species = [rc.find("c").text.strip()
+                                   for rc in array.iter("rc")]
+            elif parent == "calculation" and step == next_wanted:
+                if elem.tag == "structure":
+                    for varray in elem.iter("varray"):
+                        if varray.get("name") == "basis":
+                            lattice = _vectors(varray)
+                        elif varray.get("name") == "positions":
+                            coords = _vectors(varray)
+                    pos = PoscarData(title, lattice, species, coords)
+                elif forces:
+                    step_forces = _vectors(elem)
+        elif elem.tag == "calculation":
+            if step == next_wanted:
+                if pos is not None:
+                    yield step, pos, step_forces
+                pos = None
+                step_forces = None
+                if step == last:
+                    return
+                next_wanted = next(wanted, None)
+            step += 1
+        if keeping == 0 and stack:
+            # Done with this element. Removing each element as soon as it
+            # ends keeps the tree from growing.
+            stack[-1].remove(elem)
+
+
+class _DecodedLines:
+    """Wrap a binary file so :meth:`readline` gives strings."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def readline(self) -> str:
+        return self.f.readline().decode()
+
+
+def read_volumetric_header(filename: str) \
+        -> tuple[PoscarData, tuple[int, int, int], int]:
+    """Read the structure and grid shape of an uncompressed volumetric file.
+
+    Args:
+        filename: Path to CHGCAR or similar.
+
+    Returns:
+        The structure, the grid shape, and the byte offset at which the
+        grid values start.
+    """
+    with open(filename, "rb") as f:
+        lines = _DecodedLines(f)
+        pos = read_poscar(lines)
+        shape = read_grid_shape(lines)
+        return pos, shape, f.tell()
+
+
+def read_grid_shape(f: TextIO) -> tuple[int, int, int]:
+    """Read the grid dimensions preceding a block of volumetric data.
+
+    Blank lines before the dimensions are skipped.
+
+    Args:
+        f: Text file object, positioned after the structure.
+
+    Returns:
+        Number of grid points along each lattice vector.
+
+    Raises:
+        ValueError: File ended before the dimensions.
+    """
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("File ended before the grid dimensions.")
+        tokens = line.split()
+        if tokens:
+            return tuple(int(x) for x in tokens[:3])
@@ -0,0 +1,1017 @@
+# Copyright 2025 Bernard Field
+"""
+Streaming statistics of volumetric data (e.g. CHGCAR), for choosing
+isosurface and saturation levels without loading the whole grid.
+
+Requires numpy.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import math
+import mmap
+import os
+import tempfile
+from typing import Iterator, TextIO, Union
+
+import numpy as np
+
+from vestacrystparser.utilities import RecordedLines
+from vestacrystparser.vasp import open_text, read_poscar, read_grid_shape, \
+    is_compressed, uncompressed_name
+from vestacrystparser.cube import read_cube_header
+from vestacrystparser.xsf import read_xsf_header
+
+logger = logging.getLogger(__name__)
+
+# Angstom^3 to Bohr^3, for converting volumetric data to VESTA's units.
+# See Section 17.4.3 of the VESTA Manual
+A2B = 0.148185
+
+
+class LogHistogram:
+    """Histogram of absolute values, in logarithmically-spaced bins.
+
+    The bins are fixed (:attr:`PER_DECADE` per factor of 10, from
+    10^:attr:`LOG_MIN` to 10^:attr:`LOG_MAX`), so histograms of different
+    chunks can be merged by adding counts.
+    Values below the range (including 0) go in the first bin, values above
+    the range in the last bin.
+
+    Attributes:
+        counts (numpy.ndarray): Number of values in each bin.
+        scale (float): Factor the values have been scaled by since binning
+            (see :meth:`scaled`).
+    """
+
+    LOG_MIN = -12
+    LOG_MAX = 12
+    PER_DECADE = 64
+    NBINS = (LOG_MAX - LOG_MIN) * PER_DECADE + 2
+
+    def __init__(self):
+        self.counts = np.zeros(self.NBINS, dtype=np.int64)
+        self.scale = 1.0
+
+    @property
+    def count(self) -> int:
+        """Total number of values (read-only)"""
+        return int(self.counts.sum())
+
+    def update(self, absvalues):
+        """Add a chunk of absolute values.
+
+        Args:
+            absvalues: Array of non-negative values (NaN is ignored).
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            position = (np.log10(absvalues) - self.LOG_MIN) * self.PER_DECADE
+        position = position[~np.isnan(position)]
+        index = np.clip(position, -1, self.NBINS - 2).astype(np.intp) + 1
+        self.counts += np.bincount(index, minlength=self.NBINS)
+
+    def merge(self, other: "LogHistogram"):
+        """Add the counts of another histogram to this one.
+
+        Raises:
+            ValueError: The histograms have different scales.
+        """
+        if not math.isclose(self.scale, other.scale):
+            raise ValueError("Cannot merge histograms of different scales.")
+        self.counts += other.counts
+
+    def scaled(self, factor: float) -> "LogHistogram":
+        """Return the histogram of the values multiplied by a factor."""
+        new = LogHistogram()
+        new.counts = self.counts.copy()
+        new.scale = self.scale * abs(factor)
+        return new
+
+    def quantile(self, q: float) -> float:
+        """Estimate the value below which a fraction `q` of the values lie.
+
+        Interpolates geometrically within the bin, so the relative error
+        is at most the bin width (about 4%).
+
+        Args:
+            q: Fraction between 0 and 1.
+
+        Raises:
+            ValueError: `q` out of range, or histogram is empty.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile must be between 0 and 1, not {q}.")
+        total = self.count
+        if total == 0:
+            raise ValueError("Cannot take quantile of empty histogram.")
+        cumulative = np.cumsum(self.counts)
+        target = q * total
+        i = int(np.searchsorted(cumulative, target))
+        i = min(i, self.NBINS - 1)
+        if self.counts[i] == 0:
+            # Only happens for q == 0. Move to the first non-empty bin.
+            i = int(np.nonzero(self.counts)[0][0])
+        below = cumulative[i] - self.counts[i]
+        fraction = float((target - below) / self.counts[i])
+        fraction = min(max(fraction, 0.0), 1.0)
+        if i == 0:
+            # Underflow bin, from 0.
+            value = fraction * 10.0 ** self.LOG_MIN
+        else:
+            low = 10.0 ** (self.LOG_MIN + (i - 1) / self.PER_DECADE)
+            value = low * 10.0 ** (fraction / self.PER_DECADE)
+        return value * self.scale
+
+    def to_dict(self) -> dict:
+        """Return a JSON-serialisable representation."""
+        nonzero = np.nonzero(self.counts)[0]
+        start = int(nonzero[0]) if nonzero.size else 0
+        end = int(nonzero[-1]) + 1 if nonzero.size else 0
+        return {"scale": self.scale, "start": start,
+                "counts": self.counts[start:end].tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        """Create from the output of :meth:`to_dict`."""
+        new = cls()
+        new.scale = data["scale"]
+        start = data["start"]
+        new.counts[start:start + len(data["counts"])] = data["counts"]
+        return new
+
+
+class VolumetricStats:
+    """Running statistics of a volumetric grid.
+
+    Tracks the mean and (population) standard deviation of the absolute
+    values, as used for the default isosurface level, and the minimum and
+    maximum of the values, as used for the saturation levels.
+
+    Values are added in chunks with :meth:`update`, and partial statistics
+    (e.g. of different chunks) are combined with :meth:`merge`, using the
+    parallel algorithm of Chan et al. This is numerically stable, so needs no
+    second pass.
+
+    Attributes:
+        count (int): Number of values seen.
+        mean (float): Mean of the absolute values.
+        m2 (float): Sum of squared deviations of the absolute values from
+            their mean.
+        min (float): Smallest value.
+        max (float): Largest value.
+        histogram (LogHistogram): Histogram of the absolute values.
+        shape (tuple[int, int, int]): Shape of the grid, if known.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = LogHistogram()
+        self.shape = None
+
+    def __repr__(self) -> str:
+        return (f"<VolumetricStats: count={self.count}, mean={self.mean}, "
+                f"std={self.std}, min={self.min}, max={self.max}>")
+
+    @property
+    def std(self) -> float:
+        """Standard deviation of the absolute values (read-only)"""
+        if self.count == 0:
+            return 0.0
+        return math.sqrt(self.m2 / self.count)
+
+    def update(self, values):
+        """Add a chunk of values.
+
+        Args:
+            values: Array-like of values.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        absvalues = np.abs(values)
+        chunk = VolumetricStats()
+        chunk.count = values.size
+        chunk.mean = float(absvalues.mean())
+        self.histogram.update(absvalues)
+        absvalues -= chunk.mean
+        chunk.m2 = float(np.dot(absvalues, absvalues))
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        self.merge(chunk)
+
+    def merge(self, other: "VolumetricStats"):
+        """Combine the statistics of another set of values into this one.
+
+        Args:
+            other: Statistics of the other values.
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram.merge(other.histogram)
+
+    def scaled(self, factor: float) -> "VolumetricStats":
+        """Return the statistics of the values multiplied by a factor.
+
+        Args:
+            factor: Number to multiply by.
+        """
+        new = VolumetricStats()
+        new.count = self.count
+        new.mean = self.mean * abs(factor)
+        new.m2 = self.m2 * factor * factor
+        if factor >= 0:
+            new.min, new.max = self.min * factor, self.max * factor
+        else:
+            new.min, new.max = self.max * factor, self.min * factor
+        new.histogram = self.histogram.scaled(factor)
+        new.shape = self.shape
+        return new
+
+    def percentile_level(self, percentile: float) -> float:
+        """Isosurface level at a percentile of the absolute values.
+
+        Estimated from :attr:`histogram`, so needs no extra pass over the
+        data.
+
+        Args:
+            percentile: Percentage (0-100) of absolute values below the level.
+        """
+        level = self.histogram.quantile(percentile / 100)
+        # The histogram is coarser than the true extremes.
+        return min(level, max(abs(self.min), abs(self.max)))
+
+    def volume_fraction_level(self, fraction: float) -> float:
+        """Isosurface level enclosing a fraction of the volume.
+
+        That is, the level which `fraction` of the grid points have absolute
+        values above.
+
+        Args:
+            fraction: Fraction (0-1) of the volume to enclose.
+        """
+        return self.percentile_level(100 * (1 - fraction))
+
+    def to_dict(self) -> dict:
+        """Return a JSON-serialisable representation."""
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min, "max": self.max,
+                "shape": list(self.shape) if self.shape else None,
+                "histogram": self.histogram.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VolumetricStats":
+        """Create from the output of :meth:`to_dict`."""
+        new = cls()
+        new.count = data["count"]
+        new.mean = data["mean"]
+        new.m2 = data["m2"]
+        new.min = data["min"]
+        new.max = data["max"]
+        new.shape = tuple(data["shape"]) if data["shape"] else None
+        new.histogram = LogHistogram.from_dict(data["histogram"])
+        return new
+
+    def isosurface_level(self, n: float = 2) -> float:
+        """Isosurface level of mean + n standard deviations of the absolute
+        values (VESTA Manual section 16.7).
+
+        Args:
+            n: Number of standard deviations.
+        """
+        return self.mean + n * self.std
+
+
+def array_stats(data, chunk_size: int = 2**20) -> VolumetricStats:
+    """Return the statistics of an array, processed a chunk at a time.
+
+    Only one chunk-sized temporary array exists at any time, rather than
+    full-size copies of the array.
+
+    Args:
+        data: Array of values (any shape). If not C-contiguous, it is copied.
+        chunk_size: Number of values per chunk.
+    """
+    flat = np.asarray(data).reshape(-1)
+    stats = VolumetricStats()
+    for start in range(0, flat.size, chunk_size):
+        stats.update(flat[start:start + chunk_size])
+    return stats
+
+
+def iter_grid_chunks(f: TextIO, count: int,
+                     chunk_size: int = 2**20) -> Iterator[np.ndarray]:
+    """Read a block of grid values from a text file, a chunk at a time.
+
+    The values are whitespace-separated with the same number on each line
+    (except maybe the last), as in VASP volumetric files. Exactly the lines
+    of the block are read, so the file is left at whatever follows.
+
+    Args:
+        f: Text file object, at the start of the values.
+        count: Total number of values in the block.
+        chunk_size: Approximate number of values per chunk.
+
+    Yields:
+        1D float64 arrays of consecutive values.
+
+    Raises:
+        ValueError: File ended before `count` values were read.
+    """
+    if count <= 0:
+        return
+    first = f.readline()
+    values = np.array(first.split(), dtype=np.float64)
+    per_line = values.size
+    if per_line == 0:
+        raise ValueError("Expected grid values, found blank line.")
+    remaining = count - per_line
+    lines_per_chunk = max(1, chunk_size // per_line)
+    while remaining > 0:
+        nlines = min(lines_per_chunk, -(-remaining // per_line))
+        lines = list(itertools.islice(f, nlines))
+        chunk = np.array(" ".join(lines).split(), dtype=np.float64)
+        if len(lines) < nlines:
+            raise ValueError(
+                f"File ended with {remaining - chunk.size} grid values "
+                "still to read.")
+        remaining -= chunk.size
+        if values is not None:
+            chunk = np.concatenate([values, chunk])
+            values = None
+        yield chunk
+    if values is not None:
+        yield values
+
+
+def grid_stats(f: TextIO, count: int,
+               chunk_size: int = 2**20) -> VolumetricStats:
+    """Read a block of grid values and return their statistics.
+
+    See :func:`iter_grid_chunks` for the arguments.
+    """
+    stats = VolumetricStats()
+    for chunk in iter_grid_chunks(f, count, chunk_size):
+        stats.update(chunk)
+    return stats
+
+
+def grid_format(filename: str) -> str:
+    """Format of a volumetric data file, by its name.
+
+    Returns:
+        "cube" for Gaussian cube files (.cube, .cub), "xsf" for XCrySDen
+        files (.xsf), otherwise "vasp". Compression suffixes are ignored.
+    """
+    name = uncompressed_name(filename) if is_compressed(filename) \
+        else str(filename)
+    suffix = os.path.splitext(name)[1].lower()
+    if suffix in [".cube", ".cub"]:
+        return "cube"
+    if suffix == ".xsf":
+        return "xsf"
+    return "vasp"
+
+
+def _drop_periodic_images(chunks: Iterator[np.ndarray],
+                          shape: tuple[int, int, int]) -> Iterator[np.ndarray]:
+    """Remove the last grid point along each axis from a stream of values
+    (first axis fastest), where a periodic general grid repeats the first."""
+    position = 0
+    for chunk in chunks:
+        index = np.arange(position, position + chunk.size)
+        position += chunk.size
+        keep = (index % shape[0] < shape[0] - 1) & \
+            (index // shape[0] % shape[1] < shape[1] - 1) & \
+            (index // (shape[0] * shape[1]) < shape[2] - 1)
+        yield chunk[keep]
+
+
+class GridFile:
+    """A volumetric data file, opened to stream its first block of values.
+
+    VASP (CHGCAR and similar), Gaussian cube and XSF files are read, by
+    :func:`grid_format`.
+
+    Use as a context manager:
+
+    .. code-block:: python
+
+        with GridFile("CHGCAR") as grid:
+            for chunk in grid.chunks():
+                ...
+
+    Attributes:
+        structure (PoscarData): Structure from the header.
+        shape (tuple[int, int, int]): Number of grid points along each axis.
+            For periodic XSF files, excludes the points repeating the first.
+        scale (float): Factor converting the values in the file to the units
+            VESTA uses for levels. For VASP files, divides out the volume and
+            converts to Bohr. Cube and XSF values are used as they are.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.format = grid_format(filename)
+        self._file = open_text(filename)
+        self._nvalues = 1
+        self._file_shape = None
+        try:
+            if self.format == "cube":
+                header = read_cube_header(self._file)
+                self.structure = header.structure
+                self.shape = header.shape
+                self._nvalues = header.nvalues
+            elif self.format == "xsf":
+                header = read_xsf_header(self._file)
+                self.structure = header.structure
+                self.shape = header.shape
+                if header.periodic:
+                    self._file_shape = header.shape
+                    self.shape = tuple(n - 1 for n in header.shape)
+            else:
+                self.structure = read_poscar(self._file)
+                self.shape = read_grid_shape(self._file)
+        except Exception:
+            self._file.close()
+            raise
+        self.scale = A2B / self.structure.volume \
+            if self.format == "vasp" else 1.0
+
+    @property
+    def count(self) -> int:
+        """Number of grid points (read-only)"""
+        return self.shape[0] * self.shape[1] * self.shape[2]
+
+    def chunks(self, chunk_size: int = 2**20) -> Iterator[np.ndarray]:
+        """Iterate over the values (unscaled), a chunk at a time.
+
+        For cube files with several molecular orbitals, gives the first.
+
+        Can only be called once.
+        """
+        if self._file_shape is not None:
+            shape = self._file_shape
+            return _drop_periodic_images(
+                iter_grid_chunks(self._file, shape[0] * shape[1] * shape[2],
+                                 chunk_size), shape)
+        if self._nvalues > 1:
+            # Orbitals are interleaved at each point.
+            n = self._nvalues
+            chunks = _fixed_chunks(
+                iter_grid_chunks(self._file, self.count * n, chunk_size),
+                n * max(1, chunk_size // n))
+            return (chunk[::n] for chunk in chunks)
+        return iter_grid_chunks(self._file, self.count, chunk_size)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "GridFile":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _fixed_chunks(chunks: Iterator[np.ndarray],
+                  size: int) -> Iterator[np.ndarray]:
+    """Re-cut a stream of arrays into arrays of a fixed size (except the
+    last)."""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += chunk.size
+        while buffered >= size:
+            values = np.concatenate(buffer)
+            yield values[:size]
+            buffer = [values[size:]]
+            buffered = buffer[0].size
+    if buffered:
+        yield np.concatenate(buffer)
+
+
+def combined_stats(entries: list[tuple[str, float, str]],
+                   chunk_size: int = 2**20) -> VolumetricStats:
+    """Statistics of a field combined from several volumetric data files.
+
+    Mirrors how VESTA combines the files listed in IMPORT_DENSITY.
+    All files are read at once, a chunk at a time, so no grid is ever held
+    in full. Values are converted to VESTA's units (:attr:`GridFile.scale`)
+    before combining.
+
+    Args:
+        entries: List of (operation, factor, filename). operation is "+"
+            (add factor times the data), "x" (multiply by it) or "/"
+            (divide by it). The first must be "+".
+        chunk_size: Number of values to process at a time.
+
+    Returns:
+        Statistics of the combined field. Points which are not finite
+        (e.g. from dividing by zero) are left out.
+
+    Raises:
+        ValueError: Grids of different shapes or orders, bad operation, or
+            no entries.
+    """
+    if not entries:
+        raise ValueError("No volumetric data to combine.")
+    if entries[0][0] != "+":
+        raise ValueError("First volumetric data must be added, not "
+                         f"'{entries[0][0]}'.")
+    stats = VolumetricStats()
+    with contextlib.ExitStack() as stack:
+        grids = [stack.enter_context(GridFile(fname))
+                 for _, _, fname in entries]
+        for grid in grids[1:]:
+            if grid.shape != grids[0].shape:
+                raise ValueError(
+                    f"Grid of {grid.filename} {grid.shape} does not match "
+                    f"{grids[0].filename} {grids[0].shape}.")
+            if (grid.format == "cube") != (grids[0].format == "cube"):
+                # Cube files have the third axis fastest, not the first.
+                raise ValueError(
+                    f"Grid points of {grid.filename} and "
+                    f"{grids[0].filename} are in different orders.")
+        streams = [_fixed_chunks(grid.chunks(chunk_size), chunk_size)
+                   for grid in grids]
+        skipped = 0
+        for chunks in zip(*streams):
+            result = None
+            for (op, factor, _), grid, chunk in zip(entries, grids, chunks):
+                chunk *= factor * grid.scale
+                if op == "+":
+                    result = chunk if result is None else result + chunk
+                elif op == "x":
+                    result *= chunk
+                elif op == "/":
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        result /= chunk
+                else:
+                    raise ValueError(f"Unknown operation '{op}'.")
+            finite = np.isfinite(result)
+            if not finite.all():
+                skipped += result.size - int(finite.sum())
+                result = result[finite]
+            stats.update(result)
+        if skipped:
+            logger.warning(f"{skipped} grid points were not finite (e.g. "
+                           "divided by zero) and were left out of the "
+                           "statistics.")
+    stats.shape = grids[0].shape
+    return stats
+
+
+def _skip_to_grid(f: TextIO, shape: tuple[int, int, int]):
+    """Read up to and including the next line giving the grid dimensions
+    `shape` (as precedes each data block of a VASP file).
+
+    Raises:
+        ValueError: There isn't one.
+    """
+    for line in iter(f.readline, ""):
+        tokens = line.split()
+        if len(tokens) == 3:
+            try:
+                if tuple(int(x) for x in tokens) == tuple(shape):
+                    return
+            except ValueError:
+                pass
+    raise ValueError("No further block of volumetric data found.")
+
+
+def spin_stats(filename: str, magnetization_destination: str,
+               spin_channels: bool = False,
+               chunk_size: int = 2**20) -> dict[str, VolumetricStats]:
+    """Statistics of both blocks of a spin-polarised VASP volumetric file,
+    reading it only once.
+
+    The first block is the total density, the second the magnetization
+    density (spin up - spin down). As VESTA reads only the first block, the
+    magnetization is also written as a volumetric file in its own right.
+
+    Optionally, also gives the statistics of the spin up, (total + mag)/2,
+    and spin down, (total - mag)/2, densities. As the blocks are one after
+    the other, this keeps the total density in a temporary binary file
+    (8 bytes per grid point) while reading the magnetization.
+
+    Args:
+        filename: Path to spin-polarised CHGCAR or similar.
+        magnetization_destination: Path to write the magnetization to.
+        spin_channels: Also compute the spin up and down statistics.
+        chunk_size: Number of values to process at a time.
+
+    Returns:
+        Statistics (of the raw, unscaled values) with keys "total" and
+        "magnetization", and "up" and "down" if `spin_channels`.
+
+    Raises:
+        ValueError: File is not spin-polarised.
+    """
+    result = {"total": VolumetricStats(), "magnetization": VolumetricStats()}
+    if spin_channels:
+        result["up"] = VolumetricStats()
+        result["down"] = VolumetricStats()
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open_text(filename))
+        header = RecordedLines(f)
+        read_poscar(header)
+        shape = read_grid_shape(header)
+        count = shape[0] * shape[1] * shape[2]
+        if spin_channels:
+            scratch = stack.enter_context(tempfile.TemporaryFile())
+            total = np.memmap(scratch, dtype=np.float64, mode="w+",
+                              shape=(count,))
+        position = 0
+        for chunk in iter_grid_chunks(f, count, chunk_size):
+            result["total"].update(chunk)
+            if spin_channels:
+                total[position:position + chunk.size] = chunk
+            position += chunk.size
+        _skip_to_grid(f, shape)
+
+        def magnetization() -> Iterator[np.ndarray]:
+            position = 0
+            for chunk in iter_grid_chunks(f, count, chunk_size):
+                result["magnetization"].update(chunk)
+                if spin_channels:
+                    part = total[position:position + chunk.size]
+                    result["up"].update((part + chunk) / 2)
+                    result["down"].update((part - chunk) / 2)
+                position += chunk.size
+                yield chunk
+        with open(magnetization_destination + ".tmp", "w") as out:
+            out.writelines(header.lines[:-1])
+            _write_grid(out, shape, magnetization())
+        os.replace(magnetization_destination + ".tmp",
+                   magnetization_destination)
+    for stats in result.values():
+        stats.shape = shape
+    return result
+
+
+# Parallel statistics.
+
+def _text_stats(text: str) -> VolumetricStats:
+    """Statistics of whitespace-separated values in a string."""
+    stats = VolumetricStats()
+    stats.update(np.array(text.split(), dtype=np.float64))
+    return stats
+
+
+def _byte_range_stats(filename: str, start: int, end: int,
+                      expected: int) -> VolumetricStats:
+    """Statistics of the values in a range of bytes of a file.
+
+    The range must consist of whole lines, and hold `expected` values.
+    """
+    with open(filename, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[start - 1:start] != b"\n" or mm[end - 1:end] != b"\n":
+            raise ValueError("Grid lines are not of fixed width.")
+        stats = _text_stats(mm[start:end].decode())
+    if stats.count != expected:
+        raise ValueError("Grid lines are not of fixed width.")
+    return stats
+
+
+def parallel_grid_stats(filename: str, offset: int, count: int,
+                        workers: Union[int, None] = None,
+                        chunk_size: int = 2**22) -> VolumetricStats:
+    """Compute statistics of a block of grid values with a process pool.
+
+    For uncompressed files with fixed-width lines, as VASP writes.
+    The block is split into byte ranges of whole lines, which each worker
+    reads directly from the file (memory-mapped), so only the statistics
+    are passed between processes.
+
+    Args:
+        filename: Path to the (uncompressed) file.
+        offset: Byte offset of the start of the values.
+        count: Total number of values in the block.
+        workers: Number of processes. Defaults to the number of CPUs.
+        chunk_size: Approximate number of values for each task.
+
+    Raises:
+        ValueError: Lines are not of fixed width, or the file is too short.
+    """
+    stats = VolumetricStats()
+    if count <= 0:
+        return stats
+    with open(filename, "rb") as f:
+        f.seek(offset)
+        first = f.readline()
+    line_length = len(first)
+    per_line = len(first.split())
+    if per_line == 0 or not first.endswith(b"\n"):
+        raise ValueError("Expected grid values, found blank line.")
+    nfull = count // per_line
+    lines_per_task = max(1, chunk_size // per_line)
+    tasks = []
+    for i in range(0, nfull, lines_per_task):
+        j = min(i + lines_per_task, nfull)
+        tasks.append((offset + i * line_length, offset + j * line_length,
+                      (j - i) * per_line))
+    if count % per_line:
+        # The last line is short.
+        start = offset + nfull * line_length
+        with open(filename, "rb") as f:
+            f.seek(start)
+            last = f.readline()
+        tasks.append((start, start + len(last), count % per_line))
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_byte_range_stats, filename, *task)
+                   for task in tasks]
+        # Merge in order, for reproducible round-off.
+        for future in futures:
+            stats.merge(future.result())
+    return stats
+
+
+def parallel_stream_stats(f: TextIO, count: int,
+                          workers: Union[int, None] = None,
+                          chunk_size: int = 2**20) -> VolumetricStats:
+    """Compute statistics of a block of grid values with a process pool,
+    reading from a stream (e.g. a compressed file).
+
+    This process reads the text, a chunk at a time, and the workers parse
+    it. A limited number of chunks are in flight at once, bounding memory.
+
+    See :func:`iter_grid_chunks` for the arguments.
+    """
+    stats = VolumetricStats()
+    if count <= 0:
+        return stats
+    first = f.readline()
+    per_line = len(first.split())
+    if per_line == 0:
+        raise ValueError("Expected grid values, found blank line.")
+    stats.merge(_text_stats(first))
+    remaining_lines = -(-count // per_line) - 1
+    lines_per_chunk = max(1, chunk_size // per_line)
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        max_pending = 2 * workers
+        pending = collections.deque()
+        while remaining_lines > 0:
+            nlines = min(lines_per_chunk, remaining_lines)
+            lines = list(itertools.islice(f, nlines))
+            if len(lines) < nlines:
+                raise ValueError("File ended before all grid values read.")
+            remaining_lines -= nlines
+            pending.append(executor.submit(_text_stats, "".join(lines)))
+            while len(pending) >= max_pending:
+                stats.merge(pending.popleft().result())
+        while pending:
+            stats.merge(pending.popleft().result())
+    if stats.count != count:
+        raise ValueError(f"Expected {count} grid values, read {stats.count}.")
+    return stats
+
+
+# Reduced-resolution copies.
+
+def _filter_offsets(factor: int, method: str) -> list[tuple[int, float]]:
+    """Grid offsets and weights for reducing resolution by `factor`.
+
+    "stride" keeps every `factor`-th point. "average" is a box filter of
+    width `factor` centred on the kept points (with half weights at the
+    ends for even `factor`), so the kept points don't move.
+    """
+    if method == "stride":
+        return [(0, 1.0)]
+    elif method == "average":
+        half = factor // 2
+        offsets = [(o, 1 / factor) for o in range(-half, half + 1)]
+        if factor % 2 == 0:
+            offsets[0] = (-half, 0.5 / factor)
+            offsets[-1] = (half, 0.5 / factor)
+        return offsets
+    else:
+        raise ValueError(f"Unknown method {method}. "
+                         "Use 'average' or 'stride'.")
+
+
+def _reduce_axis(data: np.ndarray, axis: int, factor: int,
+                 offsets: list[tuple[int, float]]) -> np.ndarray:
+    """Reduce the resolution of a periodic array along one axis."""
+    n = data.shape[axis]
+    kept = np.arange(0, n, factor)
+    result = None
+    for offset, weight in offsets:
+        term = weight * np.take(data, (kept + offset) % n, axis=axis)
+        result = term if result is None else result + term
+    return result
+
+
+def write_preview(filename: str, factor: int = 2, method: str = "average",
+                  destination: Union[str, None] = None) -> str:
+    """Write a reduced-resolution copy of a VASP volumetric file.
+
+    The copy has the same structure header and normalisation, with
+    `factor` times fewer grid points along each axis, so it can be used
+    in place of the original (e.g. for quick renders in VESTA) and later
+    swapped back with :meth:`VestaFile.add_volumetric_data` with
+    `mode="replace"`.
+    Only the first (total density) block of data is copied.
+
+    The original is read once, one plane of the grid at a time; only the
+    reduced grid is held in memory.
+
+    Args:
+        filename: Path to CHGCAR or similar (may be compressed).
+        factor: Factor to reduce resolution by along each axis. Must divide
+            the number of grid points along each axis.
+        method: "average" to average over blocks of grid points
+            (periodically, centred on the kept points), or "stride" to keep
+            every `factor`-th point.
+        destination: Path to write to. Defaults to :func:`preview_name`.
+
+    Returns:
+        Path of the reduced-resolution file.
+
+    Raises:
+        ValueError: `factor` does not divide the grid.
+    """
+    if destination is None:
+        destination = preview_name(filename, factor)
+    offsets = _filter_offsets(factor, method)
+    with open_text(filename) as f:
+        header = RecordedLines(f)
+        read_poscar(header)
+        shape = read_grid_shape(header)
+        nx, ny, nz = shape
+        if nx % factor or ny % factor or nz % factor:
+            raise ValueError(f"Grid {shape} cannot be reduced by {factor}.")
+        plane_size = nx * ny
+        reduced = np.zeros((nz // factor, ny // factor, nx // factor))
+        # Weights to give each plane, indexed by z % factor.
+        weights = {}
+        for offset, weight in offsets:
+            weights.setdefault(offset % factor, []).append((offset, weight))
+        # Cut the stream of values into planes (x fastest, then y, then z).
+        buffer = []
+        buffered = 0
+        z = 0
+        for chunk in iter_grid_chunks(f, nx * ny * nz):
+            buffer.append(chunk)
+            buffered += chunk.size
+            if buffered < plane_size:
+                continue
+            values = np.concatenate(buffer)
+            nplanes = values.size // plane_size
+            for i in range(nplanes):
+                plane = values[i * plane_size:(i + 1) * plane_size]
+                if z % factor in weights:
+                    plane = _reduce_axis(
+                        _reduce_axis(plane.reshape(ny, nx), 0, factor,
+                                     offsets),
+                        1, factor, offsets)
+                    for offset, weight in weights[z % factor]:
+                        # The kept plane this contributes to.
+                        k = ((z - offset) % nz) // factor
+                        reduced[k] += weight * plane
+                z += 1
+            buffer = [values[nplanes * plane_size:]]
+            buffered = buffer[0].size
+    # Write
+    with open(destination + ".tmp", "w") as f:
+        # Leave out the old grid shape.
+        f.writelines(header.lines[:-1])
+        _write_grid(f, reduced.shape[::-1], [reduced.reshape(-1)])
+    os.replace(destination + ".tmp", destination)
+    return destination
+
+
+def _write_grid(f: TextIO, shape: tuple[int, int, int],
+                chunks: Iterator[np.ndarray]):
+    """Write grid dimensions and values in the VASP format (5 per line,
+    fixed width)."""
+    f.write(f"{shape[0]:5d}{shape[1]:5d}{shape[2]:5d}\n")
+    for values in _fixed_chunks(chunks, 5 * 2**16):
+        full_rows = values.size // 5 * 5
+        np.savetxt(f, values[:full_rows].reshape(-1, 5), fmt="%19.11E",
+                   delimiter="")
+        if full_rows < values.size:
+            # Only the last chunk can be short.
+            f.write("".join(f"{x:19.11E}" for x in values[full_rows:]))
+            f.write("\n")
+
+
+def derived_name(filename: str, tag: str) -> str:
+    """Name for a VASP volumetric file derived from another, next to it.
+
+    e.g. CHGCAR.gz with tag "mag" becomes CHGCAR_mag.vasp (VESTA
+    recognises the .vasp extension).
+    """
+    name = uncompressed_name(filename) if is_compressed(filename) \
+        else str(filename)
+    if name.endswith(".vasp"):
+        name = name[:-len(".vasp")]
+    return f"{name}_{tag}.vasp"
+
+
+def preview_name(filename: str, factor: int) -> str:
+    """Default name of the reduced-resolution copy made by
+    :func:`write_preview`, e.g. CHGCAR.gz becomes CHGCAR_preview2.vasp
+    """
+    return derived_name(filename, f"preview{factor}")
+
+
+# Persistent cache of statistics, in a file next to the volumetric data.
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".vstats.json"
+
+
+def _file_key(filename: str) -> dict:
+    """Identify the current contents of a file cheaply.
+
+    Uses the size, modification time, and a hash of the first and last MiB
+    (so a large file isn't read in full).
+    """
+    info = os.stat(filename)
+    block = 2**20
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        digest.update(f.read(block))
+        if info.st_size > block:
+            f.seek(max(block, info.st_size - block))
+            digest.update(f.read(block))
+    return {"size": info.st_size, "mtime_ns": info.st_mtime_ns,
+            "hash": digest.hexdigest()}
+
+
+def read_stats_cache(filename: str) -> Union[dict[str, VolumetricStats],
+                                             None]:
+    """Read the cached statistics of a volumetric data file.
+
+    The cache is the file `filename` + ".vstats.json", written by
+    :func:`write_stats_cache`.
+
+    Args:
+        filename: Path to the volumetric data file (not the cache).
+
+    Returns:
+        Dictionary of statistics of each data block (e.g. "total"), or None
+        if there is no cache or it does not match the file's current
+        contents.
+    """
+    cache = str(filename) + CACHE_SUFFIX
+    try:
+        with open(cache, "r") as f:
+            data = json.load(f)
+        if data.get("version") != CACHE_VERSION or \
+                data.get("key") != _file_key(filename):
+            logger.debug(f"Statistics cache {cache} is out of date.")
+            return None
+        return {name: VolumetricStats.from_dict(block)
+                for name, block in data["blocks"].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_stats_cache(filename: str, blocks: dict[str, VolumetricStats]):
+    """Save the statistics of a volumetric data file to a cache next to it.
+
+    Failure to write (e.g. due to permissions) is logged and ignored.
+
+    Args:
+        filename: Path to the volumetric data file (not the cache).
+        blocks: Statistics of each data block (e.g. "total").
+    """
+    cache = str(filename) + CACHE_SUFFIX
+    try:
+        data = {"version": CACHE_VERSION, "key": _file_key(filename),
+                "blocks": {name: stats.to_dict()
+                           for name, stats in blocks.items()}}
+        # Write then rename, so readers never see a partial file. The
+        # temporary file is unique, so concurrent writers don't clash.
+        with tempfile.NamedTemporaryFile(
+                "w", dir=os.path.dirname(cache) or ".",
+                prefix=os.path.basename(cache) + ".", suffix=".tmp",
+                delete=False) as f:
+            json.dump(data, f)
+        try:
+            os.replace(f.name, cache)
+        except OSError:
+            os.remove(f.name)
+            raise
+    except OSError as e:
+        logger.warning(f"Could not write statistics cache {cache}: {e}")
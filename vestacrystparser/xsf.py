@@ -0,0 +1,116 @@
+# Copyright 2025 Bernard Field
+"""
+Lightweight reader for XCrySDen XSF files, without requiring pymatgen.
+
+:func:`read_xsf_header` reads the structure and the header of the first 3D
+data grid, after which the grid values can be streamed with
+:func:`vestacrystparser.volumetric.iter_grid_chunks`.
+Compressed files can be opened with :func:`vestacrystparser.vasp.open_text`.
+"""
+
+from typing import TextIO
+
+from vestacrystparser.parser import load_elements_data
+from vestacrystparser.utilities import cartesian_to_fractional
+from vestacrystparser.vasp import PoscarData
+
+
+class XsfHeader:
+    """The structure and first 3D data grid header of an XSF file.
+
+    Attributes:
+        structure (PoscarData): The structure, titled with the name of the
+            data block. The lattice is the primitive cell for periodic
+            structures, or the extent of the data grid for molecules.
+            Fractional coordinates are relative to the origin of the grid.
+        shape (tuple[int, int, int]): Number of grid points along each axis,
+            as in the file.
+        periodic (bool): Whether the structure is a (3D periodic) crystal,
+            in which case the last grid point along each axis repeats the
+            first.
+    """
+
+    def __init__(self, structure: PoscarData, shape: tuple[int, int, int],
+                 periodic: bool):
+        self.structure = structure
+        self.shape = shape
+        self.periodic = periodic
+
+
+def _element(token: str) -> str:
+    """Element symbol from an XSF atom label, which may be atomic number."""
+    if token.isdigit():
+        return load_elements_data(int(token))[1]
+    return token
+
+
+def read_xsf_header(f: TextIO) -> XsfHeader:
+    """Read an XSF file up to the values of its first 3D data grid.
+
+    Reads exactly the lines of the header, so the file is left at the start
+    of the grid values (ordered with the first axis varying fastest, as in
+    VASP files). Only the first structure of animated files is read.
+
+    Args:
+        f: Text file object, at the start of the file.
+
+    Returns:
+        The header.
+
+    Raises:
+        ValueError: The file is malformed or has no 3D data grid.
+    """
+    def next_tokens() -> list[str]:
+        # Skip comments and blank lines.
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError("XSF file has no 3D data grid.")
+            tokens = line.split("#")[0].split()
+            if tokens:
+                return tokens
+    title = ""
+    periodic = False
+    lattice = None
+    species = []
+    coords = []
+    tokens = next_tokens()
+    while True:
+        keyword = tokens[0].upper()
+        if keyword == "CRYSTAL":
+            periodic = True
+        elif keyword == "PRIMVEC" and lattice is None:
+            lattice = [[float(x) for x in next_tokens()[:3]]
+                       for _ in range(3)]
+        elif keyword in ["PRIMCOORD", "ATOMS"] and not species:
+            if keyword == "PRIMCOORD":
+                natoms = int(next_tokens()[0])
+                atoms = [next_tokens() for _ in range(natoms)]
+                tokens = next_tokens()
+            else:
+                # Atoms continue until the next keyword.
+                atoms = []
+                tokens = next_tokens()
+                while len(tokens) >= 4:
+                    atoms.append(tokens)
+                    tokens = next_tokens()
+            species = [_element(x[0]) for x in atoms]
+            coords = [[float(x) for x in atom[1:4]] for atom in atoms]
+            continue
+        elif keyword == "BEGIN_BLOCK_DATAGRID_3D":
+            # The name of the block.
+            title = " ".join(next_tokens())
+        elif keyword.startswith("BEGIN_DATAGRID_3D") or \
+                keyword.startswith("DATAGRID_3D_"):
+            break
+        tokens = next_tokens()
+    shape = tuple(int(x) for x in next_tokens()[:3])
+    origin = [float(x) for x in next_tokens()[:3]]
+    span = [[float(x) for x in next_tokens()[:3]] for _ in range(3)]
+    if lattice is None:
+        lattice = span
+    coords = [[x - o for x, o in zip(r, origin)] for r in coords]
+    return XsfHeader(
+        PoscarData(title, lattice, species,
+                   cartesian_to_fractional(coords, lattice)),
+        shape, periodic)